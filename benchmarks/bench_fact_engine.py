@@ -0,0 +1,149 @@
+"""
+Benchmark: agregación de fact_ventas en MySQL vs en proceso (FactEngine)
+
+Lee una vez los frames de staging, los replica k veces por factor de
+escala (rentas y pagos con IDs desplazados, mismas fechas, inventario y
+films) y mide para cada factor:
+- sql: el SELECT agregado de poblar_fact_ventas ejecutado en el servidor
+  sobre copias de las tablas en una base de datos de benchmark
+- pandas: FactEngine.agregar sobre los frames en memoria
+
+Requiere el Data Mart poblado (dim_film, dim_categoria, dim_tienda) y
+permiso para crear la base de datos de benchmark.
+
+Uso:
+    python benchmarks/bench_fact_engine.py --escalas 1 2 4 8 --workers 4
+"""
+
+import argparse
+import time
+import pandas as pd
+from sqlalchemy import create_engine, text
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.config import Config
+from src.fact_engine import FactEngine
+from src.transformer import DataMartTransformer
+
+def escalar_frames(frames: dict, factor: int) -> dict:
+    """
+    Replica rentas y pagos factor veces con rental_id desplazado
+    
+    Args:
+        frames: Frames de staging originales
+        factor: Factor de escala (1 = sin cambios)
+    
+    Returns:
+        Frames escalados (dimensiones sin cambios)
+    """
+    if factor == 1:
+        return frames
+    
+    desplazamiento = int(frames['stg_rental']['rental_id'].max()) + 1
+    rentas, pagos = [], []
+    for i in range(factor):
+        rentas.append(frames['stg_rental'].assign(
+            rental_id=frames['stg_rental']['rental_id'] + i * desplazamiento))
+        pagos.append(frames['stg_payment_rental'].assign(
+            rental_id=frames['stg_payment_rental']['rental_id'] + i * desplazamiento))
+    
+    escalados = dict(frames)
+    escalados['stg_rental'] = pd.concat(rentas, ignore_index=True)
+    escalados['stg_payment_rental'] = pd.concat(pagos, ignore_index=True)
+    return escalados
+
+def cargar_esquema_benchmark(frames: dict, engine_bench) -> None:
+    """Copia los frames a la base de benchmark con los índices de join de staging"""
+    for tabla, df in frames.items():
+        df.to_sql(tabla, engine_bench, if_exists='replace', index=False,
+                  chunksize=Config.ETL_BATCH_SIZE * 10, method='multi')
+    
+    with engine_bench.begin() as conn:
+        conn.execute(text("ALTER TABLE stg_rental ADD INDEX idx_rental (rental_id), ADD INDEX idx_inv (inventory_id), ADD INDEX idx_fecha_id (fecha_id)"))
+        conn.execute(text("ALTER TABLE stg_inventory ADD INDEX idx_inv (inventory_id)"))
+        conn.execute(text("ALTER TABLE stg_film ADD INDEX idx_film (film_id)"))
+        conn.execute(text("ALTER TABLE stg_film_category ADD INDEX idx_film (film_id)"))
+        conn.execute(text("ALTER TABLE stg_payment_rental ADD PRIMARY KEY (rental_id)"))
+
+def medir_sql(transformer: DataMartTransformer, esquema: str) -> tuple:
+    """Ejecuta el SELECT agregado en el servidor; retorna (segundos, filas)"""
+    query = text(f"SELECT COUNT(*) FROM ({transformer._select_fact_ventas(esquema_staging=esquema)}) t")
+    inicio = time.perf_counter()
+    with transformer.engine_dm.connect() as conn:
+        filas = conn.execute(query, {"etl_id": 0}).fetchone()[0]
+    return time.perf_counter() - inicio, filas
+
+def medir_pandas(motor: FactEngine, frames: dict) -> tuple:
+    """Ejecuta FactEngine.agregar sobre frames en memoria; retorna (segundos, filas)"""
+    inicio = time.perf_counter()
+    df_fact = motor.agregar(frames)
+    return time.perf_counter() - inicio, len(df_fact)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del motor de agregación de fact_ventas')
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Factores de escala de rentas y pagos')
+    parser.add_argument('--workers', type=int, default=Config.FACT_ENGINE_WORKERS,
+                        help='Hilos del motor en proceso')
+    parser.add_argument('--esquema', default='sakila_bench',
+                        help='Base de datos temporal para el camino SQL (no debe existir, se borra al final)')
+    parser.add_argument('--repeticiones', type=int, default=3,
+                        help='Repeticiones por medición (se reporta la mínima)')
+    args = parser.parse_args()
+    
+    transformer = DataMartTransformer(etl_id=0)
+    # Misma resolución de llaves que el SELECT (versión activa) para comparar filas
+    motor = FactEngine(transformer.engine_staging, transformer.engine_dm, workers=args.workers, asof=False)
+    
+    # La base de benchmark se borra al final: nunca reutilizar una existente
+    with transformer.engine_dm.connect() as conn:
+        existe = conn.execute(text(
+            "SELECT COUNT(*) FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = :esquema"
+        ), {'esquema': args.esquema}).scalar()
+        if existe:
+            transformer.cerrar_conexiones()
+            parser.error(f"La base de datos '{args.esquema}' ya existe; indicar otra con --esquema")
+        conn.execute(text(f"CREATE DATABASE {args.esquema}"))
+        conn.commit()
+    
+    cfg = Config.DM_CONFIG
+    engine_bench = create_engine(
+        f"mysql+pymysql://{cfg['user']}:{cfg['password']}@{cfg['host']}:{cfg['port']}/{args.esquema}")
+    
+    frames = motor.cargar_frames()
+    resultados = []
+    
+    try:
+        for factor in args.escalas:
+            escalados = escalar_frames(frames, factor)
+            cargar_esquema_benchmark(escalados, engine_bench)
+            
+            t_sql, filas_sql = min(medir_sql(transformer, args.esquema) for _ in range(args.repeticiones))
+            t_pandas, filas_pandas = min(medir_pandas(motor, escalados) for _ in range(args.repeticiones))
+            
+            resultados.append({
+                'escala': factor,
+                'rentas': len(escalados['stg_rental']),
+                'filas_fact': filas_sql,
+                'sql_s': round(t_sql, 3),
+                'pandas_s': round(t_pandas, 3),
+                'aceleracion': round(t_sql / t_pandas, 2) if t_pandas > 0 else None,
+                'coinciden': filas_sql == filas_pandas
+            })
+            print(resultados[-1])
+    finally:
+        with transformer.engine_dm.connect() as conn:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {args.esquema}"))
+            conn.commit()
+        engine_bench.dispose()
+        transformer.cerrar_conexiones()
+    
+    print()
+    print(pd.DataFrame(resultados).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
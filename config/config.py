@@ -32,12 +32,12 @@ class Config:
         'database': os.getenv('DM_DATABASE', 'sakila_dw')
     }
     
-    # Configuración Staging
+    # Configuración Staging (por defecto en el mismo servidor que el Data Mart)
     STAGING_CONFIG = {
-        'host': os.getenv('DM_HOST', 'localhost'),
-        'port': int(os.getenv('DM_PORT', 3306)),
-        'user': os.getenv('DM_USER'),
-        'password': os.getenv('DM_PASSWORD'),
+        'host': os.getenv('STAGING_HOST', os.getenv('DM_HOST', 'localhost')),
+        'port': int(os.getenv('STAGING_PORT', os.getenv('DM_PORT', 3306))),
+        'user': os.getenv('STAGING_USER', os.getenv('DM_USER')),
+        'password': os.getenv('STAGING_PASSWORD', os.getenv('DM_PASSWORD')),
         'database': os.getenv('STAGING_DATABASE', 'sakila_staging')
     }
     
@@ -45,6 +45,54 @@ class Config:
     ETL_BATCH_SIZE = int(os.getenv('ETL_BATCH_SIZE', 1000))
     ETL_LOG_LEVEL = os.getenv('ETL_LOG_LEVEL', 'INFO')
     ETL_LOG_PATH = BASE_DIR / os.getenv('ETL_LOG_PATH', 'logs/')
+    # Tareas simultáneas del planificador DAG (1 = una tras otra)
+    ETL_WORKERS = int(os.getenv('ETL_WORKERS', 1))
+    # Perfil de rendimiento por ejecución (JSON + línea de tiempo Chrome trace)
+    ETL_PROFILE = os.getenv('ETL_PROFILE', 'true').lower() == 'true'
+    ETL_PROFILE_PATH = BASE_DIR / os.getenv('ETL_PROFILE_PATH', 'logs/perfiles/')
+    
+    # Configuración de auditoría de calidad
+    AUDIT_BUFFER_SIZE = int(os.getenv('AUDIT_BUFFER_SIZE', 500))
+    
+    # Configuración de validación por muestreo
+    VALIDATION_MODE = os.getenv('VALIDATION_MODE', 'exacto')  # 'exacto' o 'muestreo'
+    VALIDATION_SAMPLING_STRATEGY = os.getenv('VALIDATION_SAMPLING_STRATEGY', 'estratificado')
+    VALIDATION_CONFIDENCE = float(os.getenv('VALIDATION_CONFIDENCE', 0.95))
+    VALIDATION_ERROR_MARGIN = float(os.getenv('VALIDATION_ERROR_MARGIN', 0.01))
+    VALIDATION_ESCALATION_THRESHOLD = float(os.getenv('VALIDATION_ESCALATION_THRESHOLD', 0.02))
+    
+    # Integridad referencial: 'sql' (anti-join en MySQL) o 'memoria' (conjuntos de llaves)
+    VALIDATION_FK_MODE = os.getenv('VALIDATION_FK_MODE', 'sql')
+    VALIDATION_FK_STRUCTURE = os.getenv('VALIDATION_FK_STRUCTURE', 'ordenado')  # 'ordenado' o 'bloom'
+    
+    # Caché de resultados de validación por huella de tablas
+    VALIDATION_CACHE = os.getenv('VALIDATION_CACHE', 'true').lower() == 'true'
+    
+    # Dimensión tiempo: rango base y festivos ('MM-DD' anual o 'YYYY-MM-DD' puntual)
+    DIM_TIEMPO_INICIO = os.getenv('DIM_TIEMPO_INICIO', '2005-01-01')
+    DIM_TIEMPO_FIN = os.getenv('DIM_TIEMPO_FIN', '2026-12-31')
+    DIM_TIEMPO_FESTIVOS = [f.strip() for f in os.getenv('DIM_TIEMPO_FESTIVOS', '01-01,05-01,12-25').split(',') if f.strip()]
+    
+    # Motor de agregación de fact_ventas: 'sql' (INSERT ... SELECT), 'pandas' (en proceso)
+    # o 'flujo' (pre-agregado en staging, transmitido por lotes al Data Mart)
+    FACT_ENGINE = os.getenv('FACT_ENGINE', 'sql')
+    FACT_ENGINE_WORKERS = int(os.getenv('FACT_ENGINE_WORKERS', os.cpu_count() or 1))
+    
+    FACT_STREAM_CHUNK = int(os.getenv('FACT_STREAM_CHUNK', 50000))
+    
+    # Llaves surrogadas de la versión vigente en rental_date (SCD2 as-of, motor pandas)
+    FACT_SCD_ASOF = os.getenv('FACT_SCD_ASOF', 'false').lower() == 'true'
+    
+    # Carga de fact_ventas por tramos de fechas: 'mes', 'semana' o 'dia'
+    FACT_SLICE_GRANULARITY = os.getenv('FACT_SLICE_GRANULARITY', 'mes')
+    FACT_PARALLEL_WORKERS = int(os.getenv('FACT_PARALLEL_WORKERS', 4))
+    
+    # Carga completa masiva: índices secundarios de fact_ventas recreados al final
+    FACT_BULK_LOAD = os.getenv('FACT_BULK_LOAD', 'true').lower() == 'true'
+    FACT_INDEX_BUILD_THREADS = int(os.getenv('FACT_INDEX_BUILD_THREADS', 4))
+    
+    # Carga completa en tablas sombra publicadas con RENAME TABLE atómico
+    DM_SHADOW_SWAP = os.getenv('DM_SHADOW_SWAP', 'true').lower() == 'true'
     
     # Rutas del proyecto
     PROJECT_ROOT = BASE_DIR
@@ -69,6 +117,12 @@ class Config:
         cfg = Config.STAGING_CONFIG
         return f"mysql+pymysql://{cfg['user']}:{cfg['password']}@{cfg['host']}:{cfg['port']}/{cfg['database']}"
     
+    @staticmethod
+    def staging_en_servidor_separado() -> bool:
+        """True si staging y Data Mart están en servidores distintos (sin joins entre esquemas)"""
+        staging, dm = Config.STAGING_CONFIG, Config.DM_CONFIG
+        return (staging['host'], staging['port']) != (dm['host'], dm['port'])
+    
     @staticmethod
     def validate_config():
         """Valida que las configuraciones críticas estén presentes"""
@@ -10,15 +10,29 @@ Ejecuta el flujo ETL completo:
 5. Transformación a modelo estrella (Data Mart)
 6. Reporte final de ejecución
 
+Las fases se ejecutan como un grafo de tareas finas (extraer rental,
+limpiar stg_film, validar inventory→film, cargar dim_tienda, fact mes
+2005-07...) que se lanzan en cuanto sus entradas están listas, de a
+--workers N tareas a la vez (1 = una tras otra).
+
+Cada tarea que modifica datos deja un checkpoint en etl_checkpoint:
+--resume retoma la última ejecución fallida desde la primera tarea sin
+terminar, y --phase/--tables vuelven a ejecutar solo una fase o tabla.
+
+Con ETL_PROFILE=true (default) cada ejecución deja en ETL_PROFILE_PATH un
+perfil JSON (tiempo por fase, tabla y sentencia SQL; espera de BD vs CPU;
+filas/s, bytes y RSS pico) y una línea de tiempo Chrome trace.
+
 Uso:
-    python main_etl.py [--incremental] [--skip-validation] [--force]
+    python main_etl.py [--incremental] [--skip-validation] [--stream-validation] [--workers N]
+                       [--resume] [--phase FASE ...] [--tables TABLA ...] [--force]
 """
 
 import sys
 import argparse
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
 
 # Agregar path del proyecto
 project_root = Path(__file__).resolve().parent
@@ -29,21 +43,46 @@ from src.extractor import SakilaExtractor
 from src.validator import DataValidator
 from src.staging import StagingProcessor
 from src.transformer import DataMartTransformer
+from src.scheduler import DAGScheduler
+from src.key_sets import KeySetCache
+from src.checkpoint import CheckpointStore, huella_tablas
+from src.profiler import ETLProfiler, medir
 from src.logger_config import ETLLogger
 
 class ETLOrchestrator:
     """Orquestador del proceso ETL completo"""
     
-    def __init__(self, incremental: bool = False, skip_validation: bool = False):
+    # Fases del grafo de tareas (para --phase)
+    FASES = ['extraccion', 'validacion_pre', 'limpieza', 'validacion_post',
+             'transformacion', 'reconciliacion']
+    
+    def __init__(self, incremental: bool = False, skip_validation: bool = False,
+                 stream_validation: bool = False, workers: int = None,
+                 resume: bool = False, fases: List[str] = None, tablas: List[str] = None):
         """
         Inicializa el orquestador
         
         Args:
             incremental: Si True, ejecuta extracción incremental
             skip_validation: Si True, omite validaciones (no recomendado)
+            stream_validation: Si True, la validación PRE se calcula durante la extracción
+            workers: Tareas simultáneas del planificador DAG; 1 ejecuta las
+                     tareas una tras otra (default: Config.ETL_WORKERS)
+            resume: Si True, retoma la última ejecución sin terminar
+            fases: Ejecutar solo estas fases (ver FASES)
+            tablas: Ejecutar solo las tareas de estas tablas ('film' o 'stg_film')
         """
         self.incremental = incremental
         self.skip_validation = skip_validation
+        self.stream_validation = stream_validation
+        self.workers = max(1, workers or Config.ETL_WORKERS)
+        self.resume = resume
+        self.fases = fases or None
+        self.tablas = [t if t.startswith('stg_') else f"stg_{t}" for t in tablas] if tablas else None
+        self.validador_stream = None
+        # Llaves padre de los checks de FK: compartidas por todos los validadores de
+        # la ejecución (la limpieza invalida las tablas que modifica)
+        self.cache_llaves = KeySetCache()
         
         # Logger principal
         self.etl_logger = ETLLogger('orchestrator', Config.ETL_LOG_PATH, Config.ETL_LOG_LEVEL)
@@ -52,6 +91,9 @@ class ETLOrchestrator:
         # ID de ejecución
         self.etl_id: Optional[int] = None
         
+        # Perfil de rendimiento (se crea al ejecutar)
+        self.perfil: Optional[ETLProfiler] = None
+        
         # Estadísticas
         self.stats = {
             'inicio': None,
@@ -64,7 +106,10 @@ class ETLOrchestrator:
             'validacion_pre': {},
             'limpieza': {},
             'validacion_post': {},
-            'transformacion': {}
+            'transformacion': {},
+            'reconciliacion': None,
+            'dag': None,
+            'perfil': None
         }
     
     def ejecutar(self) -> bool:
@@ -75,39 +120,27 @@ class ETLOrchestrator:
             True si exitoso, False si error
         """
         self.stats['inicio'] = datetime.now()
+        if Config.ETL_PROFILE:
+            self.perfil = ETLProfiler(Config.ETL_PROFILE_PATH).iniciar()
         
         self.logger.info("="*80)
         self.logger.info("🚀 INICIANDO PROCESO ETL COMPLETO")
         self.logger.info("="*80)
         self.logger.info(f"Modo: {'INCREMENTAL' if self.incremental else 'COMPLETO'}")
         self.logger.info(f"Validaciones: {'OMITIDAS' if self.skip_validation else 'ACTIVADAS'}")
+        self.logger.info(f"Ejecución: DAG con {self.workers} workers")
+        if self.resume or self.fases or self.tablas:
+            self.logger.info(f"Reanudar: {'SÍ' if self.resume else 'NO'} | Fases: {self.fases or 'todas'} | "
+                           f"Tablas: {self.tablas or 'todas'}")
         self.logger.info("="*80)
         
         try:
-            # FASE 1: Extracción
-            if not self._fase_extraccion():
-                return False
-            
-            # FASE 2: Validación PRE
-            if not self.skip_validation and not self._fase_validacion_pre():
-                return False
-            
-            # FASE 3: Limpieza
-            if not self._fase_limpieza():
-                return False
-            
-            # FASE 4: Validación POST
-            if not self.skip_validation and not self._fase_validacion_post():
-                return False
-            
-            # FASE 5: Transformación a Data Mart
-            if not self._fase_transformacion():
+            # Grafo de tareas (con checkpoints, también con un solo worker)
+            if not self._ejecutar_dag():
                 return False
             
-            # Éxito
             self.stats['exito'] = True
             self._generar_reporte_final()
-            
             return True
             
         except Exception as e:
@@ -121,203 +154,270 @@ class ETLOrchestrator:
             self.stats['fin'] = datetime.now()
             if self.stats['inicio']:
                 self.stats['duracion_total'] = (self.stats['fin'] - self.stats['inicio']).total_seconds()
+            self._cerrar_perfil()
     
-    def _fase_extraccion(self) -> bool:
-        """Fase 1: Extracción de datos"""
-        self.stats['fase_actual'] = 'EXTRACCION'
-        
-        self.etl_logger.log_etl_start("FASE 1: EXTRACCION", 
-                                     f"Extrayendo datos de Sakila ({'incremental' if self.incremental else 'completo'})")
+    @staticmethod
+    def _guardar_en(destino: Dict, clave: str, funcion: Callable) -> Callable[[], object]:
+        """Tarea que ejecuta funcion y guarda su resultado en destino[clave]"""
+        def tarea():
+            destino[clave] = funcion()
+            return destino[clave]
+        return tarea
+    
+    @staticmethod
+    def _restaurar_en(destino: Dict, clave: str) -> Callable[[object], None]:
+        """Guarda en destino[clave] el resultado de una tarea reanudada desde su checkpoint"""
+        return lambda resultado: destino.__setitem__(clave, resultado)
+    
+    def _agregar_validaciones(self, scheduler: DAGScheduler, validator: DataValidator,
+                              fase: str, listas: Dict[str, List[str]],
+                              previas: List[str]) -> tuple:
+        """
+        Agrega una fase de validaciones sobre staging como una tarea por validación
         
-        try:
-            extractor = SakilaExtractor()
-            
-            # Determinar fecha desde para incremental
-            fecha_desde = None
-            if self.incremental:
-                fecha_desde = extractor.obtener_ultima_extraccion()
-                if not fecha_desde:
-                    self.logger.warning("⚠️  No hay extracción previa, cambiando a modo COMPLETO")
-                    self.incremental = False
-            
-            # Ejecutar extracción
-            stats = extractor.extraer_todas_las_tablas(
-                incremental=self.incremental,
-                fecha_desde=fecha_desde
-            )
-            
-            # Guardar ETL ID
-            self.etl_id = extractor.etl_id
-            
-            # Guardar estadísticas
-            self.stats['extraccion'] = stats
-            
-            # Calcular totales
-            total_leidos = sum(s['leidos'] for s in stats.values() if 'leidos' in s)
-            total_errores = sum(1 for s in stats.values() if 'error' in s)
-            
-            extractor.cerrar_conexiones()
-            
-            self.etl_logger.log_etl_end("FASE 1: EXTRACCION", exito=True, detalles={
-                'Total registros': f"{total_leidos:,}",
-                'Tablas procesadas': len(stats),
-                'Errores': total_errores
-            })
-            
-            if total_errores > 0:
-                self.logger.warning(f"⚠️  Extracción completada con {total_errores} errores")
-            
-            return True
+        Args:
+            scheduler: Planificador
+            validator: Validador de la fase
+            fase: 'validacion_pre' o 'validacion_post'
+            listas: Tabla de staging -> tareas tras las cuales está lista
+            previas: Tareas que deben terminar antes de abrir la fase
             
-        except Exception as e:
-            self.logger.error(f"❌ Error en fase de extracción: {e}")
-            self.etl_logger.log_etl_end("FASE 1: EXTRACCION", exito=False)
-            return False
-    
-    def _fase_validacion_pre(self) -> bool:
-        """Fase 2: Validaciones PRE-limpieza"""
-        self.stats['fase_actual'] = 'VALIDACION_PRE'
+        Returns:
+            (tabla -> validaciones que la leen, nombre de la tarea de cierre)
+        """
+        resultados = {}
+        lectores: Dict[str, List[str]] = {}
+        inicio = scheduler.agregar(f"{fase}:inicio", validator.iniciar_validaciones, previas, fase)
         
-        self.etl_logger.log_etl_start("FASE 2: VALIDACION PRE", 
-                                     "Validando calidad de datos crudos")
+        tareas = []
+        for clave, tablas, validacion in validator.definir_validaciones_staging():
+            dependencias = [inicio] + [t for tabla in tablas for t in listas.get(tabla, [])]
+            nombre = scheduler.agregar(
+                f"{fase}:{clave}",
+                self._guardar_en(resultados, clave,
+                                 lambda c=clave, t=tablas, v=validacion: validator.ejecutar_validacion(c, t, v)),
+                dependencias, fase, tablas)
+            tareas.append(nombre)
+            for tabla in tablas:
+                lectores.setdefault(tabla, []).append(nombre)
         
-        try:
-            validator = DataValidator(etl_id=self.etl_id)
-            
-            resultados = validator.ejecutar_validaciones_staging()
-            
-            self.stats['validacion_pre'] = resultados
-            
-            total_validaciones = len(resultados)
-            exitosas = sum(resultados.values())
-            tasa_exito = (exitosas / total_validaciones * 100) if total_validaciones > 0 else 0
-            
-            validator.cerrar_conexion()
-            
-            self.etl_logger.log_etl_end("FASE 2: VALIDACION PRE", exito=True, detalles={
-                'Total validaciones': total_validaciones,
-                'Exitosas': exitosas,
-                'Fallidas': total_validaciones - exitosas,
-                'Tasa de éxito': f"{tasa_exito:.1f}%"
-            })
-            
-            # Advertir si tasa de éxito es muy baja
-            if tasa_exito < 50:
-                self.logger.warning(f"⚠️  ADVERTENCIA: Tasa de éxito baja ({tasa_exito:.1f}%)")
-                self.logger.warning("   Considerar revisar los datos de origen")
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"❌ Error en validación PRE: {e}")
-            self.etl_logger.log_etl_end("FASE 2: VALIDACION PRE", exito=False)
-            return False
+        fin = scheduler.agregar(
+            f"{fase}:fin",
+            self._guardar_en(self.stats, fase, lambda: validator.finalizar_validaciones(resultados)),
+            [inicio] + tareas, fase)
+        return lectores, fin
     
-    def _fase_limpieza(self) -> bool:
-        """Fase 3: Limpieza y transformaciones en staging"""
-        self.stats['fase_actual'] = 'LIMPIEZA'
+    def _ejecutar_dag(self) -> bool:
+        """
+        Ejecuta el ETL como grafo de tareas finas con el planificador DAG
         
-        self.etl_logger.log_etl_start("FASE 3: LIMPIEZA", 
-                                     "Procesando y limpiando datos en staging")
+        Cada tabla se extrae y limpia por separado; cada validación,
+        dimensión y tramo de fact_ventas se lanza en cuanto sus tablas de
+        entrada están listas, con a lo sumo self.workers tareas a la vez.
+        La limpieza de una tabla espera a las validaciones PRE que la leen.
+        Los resultados quedan en las estadísticas por fase, más el resumen
+        del grafo en stats['dag'].
         
-        try:
-            processor = StagingProcessor(etl_id=self.etl_id)
-            
-            stats = processor.procesar_todas_las_tablas()
-            
-            self.stats['limpieza'] = stats
-            
-            # Calcular totales
-            total_duplicados = sum(s.get('duplicados', 0) for s in stats.values())
-            total_invalidos = sum(
-                sum(v for k, v in s.items() if 'invalido' in k or 'negativo' in k)
-                for s in stats.values()
-            )
-            
-            processor.cerrar_conexion()
-            
-            self.etl_logger.log_etl_end("FASE 3: LIMPIEZA", exito=True, detalles={
-                'Tablas procesadas': len(stats),
-                'Duplicados eliminados': total_duplicados,
-                'Registros inválidos': total_invalidos
-            })
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"❌ Error en limpieza: {e}")
-            self.etl_logger.log_etl_end("FASE 3: LIMPIEZA", exito=False)
-            return False
-    
-    def _fase_validacion_post(self) -> bool:
-        """Fase 4: Validaciones POST-limpieza"""
-        self.stats['fase_actual'] = 'VALIDACION_POST'
+        Extracción, limpieza, dimensiones y tramos de fact_ventas dejan
+        checkpoint con la huella de sus entradas. Con --resume se reutiliza
+        el etl_id de la última ejecución sin terminar y se saltan las
+        tareas con checkpoint vigente; con --phase/--tables se reutiliza el
+        de la última ejecución y solo corren las tareas seleccionadas. Si la
+        ejecución falla con DM_SHADOW_SWAP las tablas sombra se conservan
+        (sin publicar) para que --resume continúe sobre ellas.
         
-        self.etl_logger.log_etl_start("FASE 4: VALIDACION POST", 
-                                     "Validando datos después de limpieza")
+        Returns:
+            True si todas las tareas terminaron bien
+        """
+        self.stats['fase_actual'] = 'DAG'
+        self.etl_logger.log_etl_start("PIPELINE DAG", f"Grafo de tareas con {self.workers} workers")
         
-        try:
-            validator = DataValidator(etl_id=self.etl_id)
-            
-            resultados = validator.ejecutar_validaciones_staging()
-            
-            self.stats['validacion_post'] = resultados
-            
-            total_validaciones = len(resultados)
-            exitosas = sum(resultados.values())
-            tasa_exito = (exitosas / total_validaciones * 100) if total_validaciones > 0 else 0
-            
-            # Calcular mejora
-            if self.stats['validacion_pre']:
-                tasa_pre = (sum(self.stats['validacion_pre'].values()) / 
-                           len(self.stats['validacion_pre']) * 100)
-                mejora = tasa_exito - tasa_pre
-            else:
-                mejora = 0
-            
-            validator.cerrar_conexion()
-            
-            self.etl_logger.log_etl_end("FASE 4: VALIDACION POST", exito=True, detalles={
-                'Total validaciones': total_validaciones,
-                'Exitosas': exitosas,
-                'Tasa de éxito': f"{tasa_exito:.1f}%",
-                'Mejora vs PRE': f"{mejora:+.1f}%"
-            })
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"❌ Error en validación POST: {e}")
-            self.etl_logger.log_etl_end("FASE 4: VALIDACION POST", exito=False)
-            return False
-    
-    def _fase_transformacion(self) -> bool:
-        """Fase 5: Transformación a Data Mart"""
-        self.stats['fase_actual'] = 'TRANSFORMACION'
+        extractor = SakilaExtractor()
+        validadores = []
+        processor = None
+        transformer = None
+        exito = False
         
-        self.etl_logger.log_etl_start("FASE 5: TRANSFORMACION", 
-                                     "Cargando datos al modelo estrella")
+        seleccion = bool(self.fases or self.tablas)
+        checkpoints = None
+        parametros = {}
         
         try:
-            transformer = DataMartTransformer(etl_id=self.etl_id)
-            
-            stats = transformer.ejecutar_transformacion_completa()
-            
-            self.stats['transformacion'] = stats
-            
-            transformer.cerrar_conexiones()
-            
-            self.etl_logger.log_etl_end("FASE 5: TRANSFORMACION", exito=True, detalles={
-                'Dimensiones pobladas': 4,
-                'Hechos cargados': f"{stats.get('fact_ventas', 0):,}"
+            previa = None
+            if self.resume or seleccion:
+                previa = CheckpointStore.ultima_ejecucion(extractor.engine_staging,
+                                                          solo_pendientes=self.resume)
+                if previa is None:
+                    self.logger.warning("⚠️  La última ejecución no quedó pendiente (o no hay), se inicia una nueva")
+            
+            if previa is not None:
+                # Misma ejecución: mismo etl_id y mismo modo que la original
+                self.etl_id, parametros = previa
+                extractor.etl_id = self.etl_id
+                self.incremental = parametros.get('incremental', self.incremental)
+                fecha_desde = parametros.get('fecha_desde')
+                fecha_desde = datetime.fromisoformat(fecha_desde) if fecha_desde else None
+                self.logger.info(f"♻️  {'Reanudando' if self.resume else 'Re-ejecutando tareas de'} ETL {self.etl_id}")
+            else:
+                fecha_desde = None
+                if self.incremental:
+                    fecha_desde = extractor.obtener_ultima_extraccion()
+                    if not fecha_desde:
+                        self.logger.warning("⚠️  No hay extracción previa, cambiando a modo COMPLETO")
+                        self.incremental = False
+                
+                self.etl_id = extractor.registrar_inicio_etl(
+                    f"EXTRACCION_{'INCREMENTAL' if self.incremental else 'COMPLETA'}")
+                parametros = {'incremental': self.incremental,
+                              'fecha_desde': fecha_desde.isoformat() if fecha_desde else None}
+            
+            if self.stream_validation and not self.skip_validation:
+                if self.incremental:
+                    self.logger.warning("⚠️  Validación en flujo no aplica en modo INCREMENTAL, se validará sobre staging")
+                elif previa is not None:
+                    # Las tablas con checkpoint no se vuelven a extraer: no habría lotes que validar
+                    self.logger.warning("⚠️  Validación en flujo no aplica al reanudar, se validará sobre staging")
+                else:
+                    self.validador_stream = DataValidator.crear_validador_stream()
+            
+            checkpoints = CheckpointStore(extractor.engine_staging, self.etl_id)
+            if self.resume and previa is not None:
+                self.logger.info(f"   {checkpoints.cargar()} tareas con checkpoint")
+            checkpoints.iniciar_pipeline(parametros)
+            
+            processor = StagingProcessor(etl_id=self.etl_id, cache_llaves=self.cache_llaves)
+            transformer = DataMartTransformer(etl_id=self.etl_id, incremental=self.incremental)
+            scheduler = DAGScheduler(self.workers, self.logger, checkpoints)
+            
+            # Tabla de staging -> tareas tras las cuales está lista para el paso siguiente
+            listas: Dict[str, List[str]] = {}
+            
+            # 1. Extracción: una tarea por tabla (la huella es la de la tabla en Sakila)
+            self.stats['extraccion'] = {}
+            
+            def extraer(tabla_origen: str, tabla_staging: str):
+                stats = extractor.extraer_tabla_a_staging(
+                    tabla_origen, tabla_staging, self.incremental, fecha_desde, self.validador_stream)
+                if 'error' in stats:
+                    # Sin checkpoint: la tabla se vuelve a extraer al reanudar
+                    raise RuntimeError(stats['error'])
+                return stats
+            
+            for tabla_origen, tabla_staging in SakilaExtractor.TABLAS:
+                listas[tabla_staging] = [scheduler.agregar(
+                    f"extraer:{tabla_origen}",
+                    self._guardar_en(self.stats['extraccion'], tabla_origen,
+                                     lambda o=tabla_origen, d=tabla_staging: extraer(o, d)),
+                    fase='extraccion', tablas=[tabla_staging],
+                    huella=lambda o=tabla_origen: huella_tablas(extractor.engine_sakila, [o]),
+                    restaurar=self._restaurar_en(self.stats['extraccion'], tabla_origen))]
+            extraidas = [t for tareas in listas.values() for t in tareas]
+            
+            def cerrar_extraccion():
+                stats = self.stats['extraccion'].values()
+                extractor.registrar_fin_etl(
+                    estado='COMPLETADO',
+                    registros_leidos=sum(s['leidos'] for s in stats),
+                    registros_escritos=sum(s['escritos'] for s in stats),
+                    registros_error=sum(1 for s in stats if 'error' in s)
+                )
+            
+            scheduler.agregar('extraccion:fin', cerrar_extraccion, extraidas, 'extraccion')
+            
+            # 2. Validación PRE: sobre los datos crudos de cada tabla
+            lectores_pre, previas_post = {}, []
+            if not self.skip_validation:
+                validator_pre = DataValidator(etl_id=self.etl_id, cache_llaves=self.cache_llaves)
+                validadores.append(validator_pre)
+                if self.validador_stream is not None:
+                    scheduler.agregar('validacion_pre', self._guardar_en(
+                        self.stats, 'validacion_pre',
+                        lambda: validator_pre.ejecutar_validaciones_stream(self.validador_stream)),
+                        extraidas, 'validacion_pre')
+                else:
+                    lectores_pre, fin_pre = self._agregar_validaciones(
+                        scheduler, validator_pre, 'validacion_pre', listas, [])
+                    # La fase POST lee la caché de validaciones que escribe la PRE
+                    previas_post = [fin_pre]
+            
+            # 3. Limpieza: cada proceso espera la extracción, las validaciones PRE
+            # que leen sus tablas y los procesos anteriores sobre las mismas tablas
+            self.stats['limpieza'] = {}
+            for clave, tablas, proceso in processor.definir_procesos():
+                dependencias = set()
+                for tabla in tablas:
+                    dependencias.update(listas.get(tabla, []))
+                    dependencias.update(lectores_pre.get(tabla, []))
+                nombre = scheduler.agregar(f"limpiar:{clave}",
+                                           self._guardar_en(self.stats['limpieza'], clave, proceso),
+                                           dependencias, 'limpieza', tablas,
+                                           lambda t=tablas: huella_tablas(processor.engine_staging, t),
+                                           self._restaurar_en(self.stats['limpieza'], clave))
+                for tabla in tablas:
+                    listas[tabla] = [nombre]
+            
+            # 4. Validación POST: sobre las tablas ya limpias
+            if not self.skip_validation:
+                validator_post = DataValidator(etl_id=self.etl_id, cache_llaves=self.cache_llaves)
+                validadores.append(validator_post)
+                self._agregar_validaciones(scheduler, validator_post, 'validacion_post', listas, previas_post)
+            
+            # 5. Transformación: dimensiones, tramos de fact_ventas, agregados
+            self.stats['transformacion'] = {}
+            # Una re-ejecución parcial trabaja sobre las tablas publicadas, sin sombra
+            ultima = transformer.registrar_tareas(scheduler, listas, self.stats['transformacion'],
+                                                  sombra=False if seleccion else None)
+            
+            if not self.skip_validation:
+                validator_rec = DataValidator(etl_id=self.etl_id, cache_llaves=self.cache_llaves)
+                validadores.append(validator_rec)
+                scheduler.agregar('reconciliacion', self._guardar_en(
+                    self.stats, 'reconciliacion', validator_rec.validar_reconciliacion_particionada),
+                    [ultima], 'reconciliacion')
+            
+            if seleccion:
+                excluidas = scheduler.seleccionar(self.fases, self.tablas)
+                self.logger.info(f"   {len(scheduler.tareas) - excluidas} tareas seleccionadas")
+            
+            with medir('DAG', 'fase'):
+                exito = scheduler.ejecutar()
+            self.stats['dag'] = scheduler.resumen()
+            
+            if not exito:
+                fallidas = [t for t in scheduler.tareas.values() if t.estado == 'error']
+                self.stats['error'] = "; ".join(f"{t.nombre}: {t.error}" for t in fallidas)
+                transformer.recuperar_error(conservar_sombras=True)
+            elif self.stats['reconciliacion'] is False:
+                self.logger.warning("⚠️  fact_ventas no reconcilia con staging, revisar audit_calidad")
+            checkpoints.cerrar_pipeline(exito, parametros, self.stats['error'])
+            
+            resumen = self.stats['dag']
+            self.etl_logger.log_etl_end("PIPELINE DAG", exito=exito, detalles={
+                'Tareas': resumen['tareas'],
+                'Estados': resumen['estados'],
+                'Duración': f"{resumen['duracion_s']:.1f}s",
+                'Suma de tareas': f"{resumen['suma_tareas_s']:.1f}s",
+                'Ruta crítica': f"{resumen['ruta_critica_s']:.1f}s ({' → '.join(resumen['ruta_critica'])})"
             })
-            
-            return True
+            return exito
             
         except Exception as e:
-            self.logger.error(f"❌ Error en transformación: {e}")
-            self.etl_logger.log_etl_end("FASE 5: TRANSFORMACION", exito=False)
+            self.logger.error(f"❌ Error en el pipeline DAG: {e}")
+            self.etl_logger.log_etl_end("PIPELINE DAG", exito=False)
+            if transformer is not None:
+                transformer.recuperar_error(conservar_sombras=True)
+            if checkpoints is not None:
+                checkpoints.cerrar_pipeline(False, parametros, str(e))
             return False
+        
+        finally:
+            for validator in validadores:
+                validator.cerrar_conexion()
+            if processor is not None:
+                processor.cerrar_conexion()
+            if transformer is not None:
+                transformer.cerrar_conexiones()
+            extractor.cerrar_conexiones()
     
     def _generar_reporte_final(self):
         """Genera reporte final de ejecución"""
@@ -371,6 +471,26 @@ class ETLOrchestrator:
         if self.stats['transformacion']:
             fact = self.stats['transformacion'].get('fact_ventas', 0)
             self.logger.info(f"  5. Transformación: {fact:,} registros en fact_ventas")
+            tramos = self.stats['transformacion'].get('fact_ventas_tramos', [])
+            if tramos:
+                lento = max(tramos, key=lambda t: t['segundos'])
+                self.logger.info(f"     {len(tramos)} tramos, más lento {lento['desde']} "
+                               f"({lento['registros']:,} registros, {lento['segundos']:.2f}s)")
+            carga = self.stats['transformacion'].get('fact_ventas_carga', {})
+            if 'indices_s' in carga:
+                self.logger.info(f"     Carga {carga['carga_s']:.2f}s, integridad {carga['integridad_s']:.2f}s, "
+                               f"{carga['indices']} índices {carga['indices_s']:.2f}s")
+        
+        # Grafo de tareas
+        if self.stats['dag']:
+            dag = self.stats['dag']
+            self.logger.info(f"  DAG: {dag['tareas']} tareas con {dag['workers']} workers en {dag['duracion_s']:.1f}s "
+                           f"(suma {dag['suma_tareas_s']:.1f}s, ruta crítica {dag['ruta_critica_s']:.1f}s)")
+        
+        # Reconciliación
+        if self.stats['reconciliacion'] is not None:
+            estado = "OK" if self.stats['reconciliacion'] else "CON DIFERENCIAS"
+            self.logger.info(f"  6. Reconciliación staging → fact_ventas: {estado}")
         
         self.logger.info("="*80)
         
@@ -380,6 +500,60 @@ class ETLOrchestrator:
             self.logger.error("💥 ETL FALLÓ - Revisar logs para detalles")
         
         self.logger.info("="*80)
+    
+    def _cerrar_perfil(self):
+        """
+        Detiene el perfil, lo guarda con su línea de tiempo y resume dónde se fue el tiempo
+        
+        Se llama al terminar la ejecución, haya fallado o no. Compara contra
+        el último perfil del mismo modo para marcar bloques que empeoraron.
+        """
+        if self.perfil is None:
+            return
+        self.perfil.detener()
+        
+        extra = {'modo': 'incremental' if self.incremental else 'completo', 'workers': self.workers}
+        if self.stats['dag']:
+            extra['dag'] = {clave: self.stats['dag'][clave]
+                            for clave in ('ruta_critica', 'ruta_critica_s', 'suma_tareas_s')}
+        try:
+            perfil = self.perfil.guardar(self.etl_id, extra)
+        except OSError as e:
+            self.logger.warning(f"⚠️  No se pudo guardar el perfil de ejecución: {e}")
+            return
+        self.stats['perfil'] = perfil['archivos']
+        
+        def megabytes(bloque: Dict) -> float:
+            return (bloque['bytes_enviados'] + bloque['bytes_recibidos']) / 1e6
+        
+        totales = perfil['totales']
+        self.logger.info("⏱️  PERFIL DE EJECUCIÓN")
+        self.logger.info(f"  Total {perfil['duracion_s']:.1f}s | BD {totales['bd_s']:.1f}s | "
+                       f"CPU Python {totales['cpu_s']:.1f}s | {totales['sentencias']:,} sentencias SQL | "
+                       f"RSS pico {perfil['rss_pico_mb'] or 0:.0f} MB")
+        
+        for bloque in perfil['mediciones']:
+            if bloque['categoria'] == 'fase':
+                self.logger.info(f"  {bloque['nombre']}: {bloque['duracion_s']:.1f}s "
+                               f"(BD {bloque['bd_s']:.1f}s, CPU {bloque['cpu_s']:.1f}s), "
+                               f"{bloque['filas_por_s'] or 0:,.0f} filas/s, {megabytes(bloque):.1f} MB")
+        
+        lentos = sorted((b for b in perfil['mediciones'] if b['categoria'] != 'fase'),
+                        key=lambda b: b['duracion_s'], reverse=True)[:5]
+        for bloque in lentos:
+            self.logger.info(f"     {bloque['categoria']}/{bloque['nombre']}: {bloque['duracion_s']:.2f}s "
+                           f"(BD {bloque['bd_s']:.2f}s), {bloque['filas_por_s'] or 0:,.0f} filas/s")
+        
+        anterior = ETLProfiler.perfil_anterior(Config.ETL_PROFILE_PATH, perfil['archivos']['perfil'],
+                                               perfil['modo'])
+        if anterior:
+            for regresion in ETLProfiler.comparar(perfil, anterior)[:5]:
+                self.logger.warning(f"  ⚠️  Más lento que ETL {anterior['etl_id']}: {regresion['nombre']} "
+                                  f"{regresion['antes_s']:.1f}s → {regresion['ahora_s']:.1f}s "
+                                  f"(+{regresion['cambio']:.0%})")
+        
+        self.logger.info(f"  Perfil: {perfil['archivos']['perfil']}")
+        self.logger.info(f"  Línea de tiempo (chrome://tracing, ui.perfetto.dev): {perfil['archivos']['trace']}")
 
 def main():
     """Función principal"""
@@ -391,6 +565,10 @@ Ejemplos de uso:
   python main_etl.py                    # Extracción completa
   python main_etl.py --incremental      # Extracción incremental
   python main_etl.py --skip-validation  # Omitir validaciones (no recomendado)
+  python main_etl.py --stream-validation  # Validación PRE durante la extracción
+  python main_etl.py --workers 8        # Grafo de tareas con 8 en paralelo
+  python main_etl.py --resume           # Retomar la última ejecución fallida
+  python main_etl.py --phase limpieza --tables film  # Re-ejecutar una fase/tabla
   python main_etl.py --force            # Forzar ejecución sin confirmación
         """
     )
@@ -407,6 +585,38 @@ Ejemplos de uso:
         help='Omitir validaciones de calidad (no recomendado)'
     )
     
+    parser.add_argument(
+        '--stream-validation',
+        action='store_true',
+        help='Calcular la validación PRE sobre los lotes extraídos (sin releer staging)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=Config.ETL_WORKERS,
+        help='Tareas simultáneas del planificador DAG (1 = una tras otra)'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Retomar la última ejecución sin terminar desde la primera tarea pendiente'
+    )
+    
+    parser.add_argument(
+        '--phase',
+        nargs='+',
+        choices=ETLOrchestrator.FASES,
+        help='Ejecutar solo estas fases (sobre la última ejecución)'
+    )
+    
+    parser.add_argument(
+        '--tables',
+        nargs='+',
+        help='Ejecutar solo las tareas de estas tablas (ej: film stg_rental)'
+    )
+    
     parser.add_argument(
         '--force',
         action='store_true',
@@ -422,6 +632,10 @@ Ejemplos de uso:
         print("="*80)
         print(f"Modo: {'INCREMENTAL' if args.incremental else 'COMPLETO'}")
         print(f"Validaciones: {'OMITIDAS' if args.skip_validation else 'ACTIVADAS'}")
+        print(f"Workers: {args.workers}")
+        if args.resume or args.phase or args.tables:
+            print(f"Reanudar: {'SÍ' if args.resume else 'NO'} | Fases: {args.phase or 'todas'} | "
+                  f"Tablas: {args.tables or 'todas'}")
         print("="*80)
         
         respuesta = input("\n¿Desea continuar? (s/n): ").strip().lower()
@@ -432,7 +646,12 @@ Ejemplos de uso:
     # Ejecutar ETL
     orchestrator = ETLOrchestrator(
         incremental=args.incremental,
-        skip_validation=args.skip_validation
+        skip_validation=args.skip_validation,
+        stream_validation=args.stream_validation,
+        workers=args.workers,
+        resume=args.resume,
+        fases=args.phase,
+        tablas=args.tables
     )
     
     exito = orchestrator.ejecutar()
@@ -47,6 +47,8 @@ CREATE TABLE dim_film (
     clasificacion VARCHAR(10),
     tarifa_renta DECIMAL(4,2),
     costo_reemplazo DECIMAL(5,2),
+    -- Hash de atributos rastreados (detección de cambios SCD2)
+    hash_atributos CHAR(16),
     -- Metadata SCD2
     fecha_inicio DATETIME DEFAULT CURRENT_TIMESTAMP,
     fecha_fin DATETIME DEFAULT '9999-12-31 23:59:59',
@@ -54,7 +56,8 @@ CREATE TABLE dim_film (
     activo BOOLEAN DEFAULT TRUE,
     INDEX idx_film_id (film_id),
     INDEX idx_activo (activo),
-    INDEX idx_titulo (titulo)
+    INDEX idx_titulo (titulo),
+    INDEX idx_film_hash (film_id, activo, hash_atributos)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================
@@ -66,13 +69,16 @@ CREATE TABLE dim_categoria (
     categoria_id INT NOT NULL,
     nombre_categoria VARCHAR(50) NOT NULL,
     descripcion VARCHAR(255),
+    -- Hash de atributos rastreados (detección de cambios SCD2)
+    hash_atributos CHAR(16),
     -- Metadata SCD2
     fecha_inicio DATETIME DEFAULT CURRENT_TIMESTAMP,
     fecha_fin DATETIME DEFAULT '9999-12-31 23:59:59',
     version INT DEFAULT 1,
     activo BOOLEAN DEFAULT TRUE,
     INDEX idx_categoria_id (categoria_id),
-    INDEX idx_activo (activo)
+    INDEX idx_activo (activo),
+    INDEX idx_categoria_hash (categoria_id, activo, hash_atributos)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================
@@ -87,6 +93,8 @@ CREATE TABLE dim_tienda (
     ciudad VARCHAR(50),
     pais VARCHAR(50),
     codigo_postal VARCHAR(10),
+    -- Hash de atributos rastreados (detección de cambios SCD2)
+    hash_atributos CHAR(16),
     -- Metadata SCD2
     fecha_inicio DATETIME DEFAULT CURRENT_TIMESTAMP,
     fecha_fin DATETIME DEFAULT '9999-12-31 23:59:59',
@@ -95,7 +103,8 @@ CREATE TABLE dim_tienda (
     INDEX idx_tienda_id (tienda_id),
     INDEX idx_activo (activo),
     INDEX idx_ciudad (ciudad),
-    INDEX idx_pais (pais)
+    INDEX idx_pais (pais),
+    INDEX idx_tienda_hash (tienda_id, activo, hash_atributos)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================
@@ -103,8 +112,8 @@ CREATE TABLE dim_tienda (
 -- ============================================
 DROP TABLE IF EXISTS fact_ventas;
 CREATE TABLE fact_ventas (
-    venta_id BIGINT AUTO_INCREMENT PRIMARY KEY,
-    -- Foreign Keys a dimensiones
+    venta_id BIGINT AUTO_INCREMENT,
+    -- Llaves surrogadas de las dimensiones
     fecha_id INT NOT NULL,
     film_sk INT NOT NULL,
     categoria_sk INT NOT NULL,
@@ -125,31 +134,173 @@ CREATE TABLE fact_ventas (
     INDEX idx_tienda (tienda_sk),
     INDEX idx_fecha_tienda (fecha_id, tienda_sk),
     INDEX idx_fecha_categoria (fecha_id, categoria_sk),
-    -- Foreign Keys
-    FOREIGN KEY (fecha_id) REFERENCES dim_tiempo(fecha_id),
-    FOREIGN KEY (film_sk) REFERENCES dim_film(film_sk),
-    FOREIGN KEY (categoria_sk) REFERENCES dim_categoria(categoria_sk),
-    FOREIGN KEY (tienda_sk) REFERENCES dim_tienda(tienda_sk)
+    -- La llave de partición debe formar parte de la PK
+    PRIMARY KEY (venta_id, fecha_id)
+    -- Sin FOREIGN KEY: InnoDB no las admite en tablas particionadas.
+    -- La integridad contra las dimensiones la validan DataValidator y la
+    -- reconciliación staging → fact_ventas.
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+-- Una partición por mes: los filtros por fecha_id podan particiones y
+-- recargar un mes es un EXCHANGE PARTITION. El transformador separa
+-- nuevos meses de pmax (REORGANIZE PARTITION) a medida que llegan datos.
+PARTITION BY RANGE (fecha_id) (
+    PARTITION p200501 VALUES LESS THAN (20050201),
+    PARTITION p200502 VALUES LESS THAN (20050301),
+    PARTITION p200503 VALUES LESS THAN (20050401),
+    PARTITION p200504 VALUES LESS THAN (20050501),
+    PARTITION p200505 VALUES LESS THAN (20050601),
+    PARTITION p200506 VALUES LESS THAN (20050701),
+    PARTITION p200507 VALUES LESS THAN (20050801),
+    PARTITION p200508 VALUES LESS THAN (20050901),
+    PARTITION p200509 VALUES LESS THAN (20051001),
+    PARTITION p200510 VALUES LESS THAN (20051101),
+    PARTITION p200511 VALUES LESS THAN (20051201),
+    PARTITION p200512 VALUES LESS THAN (20060101),
+    PARTITION p200601 VALUES LESS THAN (20060201),
+    PARTITION p200602 VALUES LESS THAN (20060301),
+    PARTITION p200603 VALUES LESS THAN (20060401),
+    PARTITION p200604 VALUES LESS THAN (20060501),
+    PARTITION p200605 VALUES LESS THAN (20060601),
+    PARTITION p200606 VALUES LESS THAN (20060701),
+    PARTITION p200607 VALUES LESS THAN (20060801),
+    PARTITION p200608 VALUES LESS THAN (20060901),
+    PARTITION p200609 VALUES LESS THAN (20061001),
+    PARTITION p200610 VALUES LESS THAN (20061101),
+    PARTITION p200611 VALUES LESS THAN (20061201),
+    PARTITION p200612 VALUES LESS THAN (20070101),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- ============================================
+-- AGREGADOS (rollups mantenidos por el ETL)
+-- ============================================
+-- Se recalculan solo los meses de fact_ventas tocados en cada ejecución.
+-- Los promedios se guardan como suma + número de filas de fact_ventas
+-- para que se puedan combinar entre meses sin perder exactitud.
+
+-- Agregado: mes × tienda
+DROP TABLE IF EXISTS agg_ventas_mes_tienda;
+CREATE TABLE agg_ventas_mes_tienda (
+    anio_mes INT NOT NULL,
+    tienda_sk INT NOT NULL,
+    total_rentas INT NOT NULL DEFAULT 0,
+    ingresos_totales DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+    suma_monto_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    suma_dias_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    filas_fact INT NOT NULL DEFAULT 0,
+    etl_id INT,
+    PRIMARY KEY (anio_mes, tienda_sk)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Agregado: mes × categoría
+DROP TABLE IF EXISTS agg_ventas_mes_categoria;
+CREATE TABLE agg_ventas_mes_categoria (
+    anio_mes INT NOT NULL,
+    categoria_sk INT NOT NULL,
+    peliculas_rentadas INT NOT NULL DEFAULT 0,
+    total_rentas INT NOT NULL DEFAULT 0,
+    ingresos_totales DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+    suma_monto_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    suma_dias_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    filas_fact INT NOT NULL DEFAULT 0,
+    etl_id INT,
+    PRIMARY KEY (anio_mes, categoria_sk)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Agregado: mes × película × categoría (base de los totales por película)
+DROP TABLE IF EXISTS agg_ventas_mes_film;
+CREATE TABLE agg_ventas_mes_film (
+    anio_mes INT NOT NULL,
+    film_sk INT NOT NULL,
+    categoria_sk INT NOT NULL,
+    total_rentas INT NOT NULL DEFAULT 0,
+    ingresos_totales DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+    suma_monto_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    suma_dias_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    filas_fact INT NOT NULL DEFAULT 0,
+    etl_id INT,
+    PRIMARY KEY (anio_mes, film_sk, categoria_sk),
+    INDEX idx_film (film_sk)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Agregado: totales por película × categoría
+DROP TABLE IF EXISTS agg_ventas_film;
+CREATE TABLE agg_ventas_film (
+    film_sk INT NOT NULL,
+    categoria_sk INT NOT NULL,
+    total_rentas INT NOT NULL DEFAULT 0,
+    ingresos_totales DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+    suma_monto_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    suma_dias_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    filas_fact INT NOT NULL DEFAULT 0,
+    etl_id INT,
+    PRIMARY KEY (film_sk, categoria_sk),
+    INDEX idx_categoria (categoria_sk)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Agregado: KPIs por mes
+DROP TABLE IF EXISTS agg_kpi_mes;
+CREATE TABLE agg_kpi_mes (
+    anio_mes INT PRIMARY KEY,
+    -- Conteos por llave natural (film_id, tienda_id), no por versión SCD2
+    peliculas_rentadas INT NOT NULL DEFAULT 0,
+    tiendas_activas INT NOT NULL DEFAULT 0,
+    total_rentas INT NOT NULL DEFAULT 0,
+    ingresos_totales DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+    suma_monto_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    suma_dias_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    filas_fact INT NOT NULL DEFAULT 0,
+    etl_id INT
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Agregado: KPIs globales (una sola fila, id = 1)
+DROP TABLE IF EXISTS agg_kpi_global;
+CREATE TABLE agg_kpi_global (
+    id TINYINT PRIMARY KEY,
+    total_rentas BIGINT NOT NULL DEFAULT 0,
+    total_ventas DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    suma_monto_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    suma_dias_promedio DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    filas_fact BIGINT NOT NULL DEFAULT 0,
+    -- Conteos por llave natural (film_id, tienda_id), no por versión SCD2
+    total_peliculas_rentadas INT NOT NULL DEFAULT 0,
+    total_tiendas INT NOT NULL DEFAULT 0,
+    etl_id INT,
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================
 -- VISTAS ANALÍTICAS
 -- ============================================
+-- Leen los agregados, no fact_ventas
+-- Las dimensiones se unen por SK: con FACT_SCD_ASOF los hechos apuntan
+-- a la versión vigente en la fecha de renta, que puede no ser la activa.
+-- Los rankings por película suman sus versiones por llave natural
 
--- Vista: Top películas por categoría
+-- Vista: Top películas por categoría (todas las versiones SCD2, nombres de la activa)
 DROP VIEW IF EXISTS v_top_films_categoria;
 CREATE VIEW v_top_films_categoria AS
 SELECT 
     c.nombre_categoria,
     f.titulo,
-    SUM(fv.cantidad_rentas) as total_rentas,
-    SUM(fv.monto_total) as ingresos_totales,
-    AVG(fv.monto_promedio) as precio_promedio
-FROM fact_ventas fv
-JOIN dim_film f ON fv.film_sk = f.film_sk AND f.activo = TRUE
-JOIN dim_categoria c ON fv.categoria_sk = c.categoria_sk AND c.activo = TRUE
-GROUP BY c.nombre_categoria, f.titulo
-ORDER BY c.nombre_categoria, total_rentas DESC;
+    v.total_rentas,
+    v.ingresos_totales,
+    v.precio_promedio
+FROM (
+    SELECT 
+        fh.film_id,
+        ch.categoria_id,
+        SUM(a.total_rentas) as total_rentas,
+        SUM(a.ingresos_totales) as ingresos_totales,
+        SUM(a.suma_monto_promedio) / SUM(a.filas_fact) as precio_promedio
+    FROM agg_ventas_film a
+    JOIN dim_film fh ON a.film_sk = fh.film_sk
+    JOIN dim_categoria ch ON a.categoria_sk = ch.categoria_sk
+    GROUP BY fh.film_id, ch.categoria_id
+) v
+JOIN dim_film f ON f.film_id = v.film_id AND f.activo = TRUE
+JOIN dim_categoria c ON c.categoria_id = v.categoria_id AND c.activo = TRUE
+ORDER BY c.nombre_categoria, v.total_rentas DESC;
 
 -- Vista: Ventas mensuales por tienda
 DROP VIEW IF EXISTS v_ventas_mensuales_tienda;
@@ -160,12 +311,12 @@ SELECT
     t.mes_nombre,
     ti.nombre_tienda,
     ti.ciudad,
-    SUM(fv.cantidad_rentas) as total_rentas,
-    SUM(fv.monto_total) as ingresos_totales,
-    AVG(fv.monto_promedio) as ticket_promedio
-FROM fact_ventas fv
-JOIN dim_tiempo t ON fv.fecha_id = t.fecha_id
-JOIN dim_tienda ti ON fv.tienda_sk = ti.tienda_sk AND ti.activo = TRUE
+    SUM(a.total_rentas) as total_rentas,
+    SUM(a.ingresos_totales) as ingresos_totales,
+    SUM(a.suma_monto_promedio) / SUM(a.filas_fact) as ticket_promedio
+FROM agg_ventas_mes_tienda a
+JOIN dim_tiempo t ON t.fecha_id = a.anio_mes * 100 + 1
+JOIN dim_tienda ti ON a.tienda_sk = ti.tienda_sk
 GROUP BY t.anio, t.mes, t.mes_nombre, ti.nombre_tienda, ti.ciudad
 ORDER BY t.anio, t.mes, ti.nombre_tienda;
 
@@ -174,14 +325,14 @@ DROP VIEW IF EXISTS v_performance_categoria;
 CREATE VIEW v_performance_categoria AS
 SELECT 
     c.nombre_categoria,
-    COUNT(DISTINCT f.film_sk) as total_peliculas,
-    SUM(fv.cantidad_rentas) as total_rentas,
-    SUM(fv.monto_total) as ingresos_totales,
-    AVG(fv.monto_promedio) as precio_promedio,
-    AVG(fv.dias_renta_promedio) as dias_renta_promedio
-FROM fact_ventas fv
-JOIN dim_categoria c ON fv.categoria_sk = c.categoria_sk AND c.activo = TRUE
-JOIN dim_film f ON fv.film_sk = f.film_sk AND f.activo = TRUE
+    COUNT(DISTINCT f.film_id) as total_peliculas,
+    SUM(a.total_rentas) as total_rentas,
+    SUM(a.ingresos_totales) as ingresos_totales,
+    SUM(a.suma_monto_promedio) / SUM(a.filas_fact) as precio_promedio,
+    SUM(a.suma_dias_promedio) / SUM(a.filas_fact) as dias_renta_promedio
+FROM agg_ventas_film a
+JOIN dim_categoria c ON a.categoria_sk = c.categoria_sk
+JOIN dim_film f ON a.film_sk = f.film_sk
 GROUP BY c.nombre_categoria
 ORDER BY ingresos_totales DESC;
 
@@ -189,15 +340,13 @@ ORDER BY ingresos_totales DESC;
 DROP VIEW IF EXISTS v_resumen_ejecutivo;
 CREATE VIEW v_resumen_ejecutivo AS
 SELECT 
-    t.anio,
-    t.mes,
-    COUNT(DISTINCT fv.film_sk) as peliculas_rentadas,
-    COUNT(DISTINCT fv.tienda_sk) as tiendas_activas,
-    SUM(fv.cantidad_rentas) as total_rentas,
-    SUM(fv.monto_total) as ingresos_totales,
-    AVG(fv.monto_promedio) as ticket_promedio,
-    SUM(fv.cantidad_rentas) / COUNT(DISTINCT fv.tienda_sk) as rentas_por_tienda
-FROM fact_ventas fv
-JOIN dim_tiempo t ON fv.fecha_id = t.fecha_id
-GROUP BY t.anio, t.mes
-ORDER BY t.anio, t.mes;
\ No newline at end of file
+    a.anio_mes DIV 100 as anio,
+    a.anio_mes MOD 100 as mes,
+    a.peliculas_rentadas,
+    a.tiendas_activas,
+    a.total_rentas,
+    a.ingresos_totales,
+    a.suma_monto_promedio / a.filas_fact as ticket_promedio,
+    a.total_rentas / a.tiendas_activas as rentas_por_tienda
+FROM agg_kpi_mes a
+ORDER BY anio, mes;
@@ -31,12 +31,15 @@ CREATE TABLE stg_rental (
     return_date DATETIME,
     staff_id INT,
     last_update TIMESTAMP,
+    -- Llave de fecha AAAAMMDD (calculada en la carga, = dim_tiempo.fecha_id)
+    fecha_id INT,
     -- Metadatos ETL
     etl_fecha_carga DATETIME DEFAULT CURRENT_TIMESTAMP,
     etl_id INT,
     es_valido BOOLEAN DEFAULT TRUE,
     mensaje_validacion VARCHAR(255),
-    PRIMARY KEY (rental_id)
+    PRIMARY KEY (rental_id),
+    INDEX idx_fecha_id (fecha_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Staging: Payment (pagos)
@@ -49,12 +52,24 @@ CREATE TABLE stg_payment (
     amount DECIMAL(5,2),
     payment_date DATETIME,
     last_update TIMESTAMP,
+    -- Llave de fecha AAAAMMDD (calculada en la carga, = dim_tiempo.fecha_id)
+    fecha_id INT,
     -- Metadatos ETL
     etl_fecha_carga DATETIME DEFAULT CURRENT_TIMESTAMP,
     etl_id INT,
     es_valido BOOLEAN DEFAULT TRUE,
     mensaje_validacion VARCHAR(255),
-    PRIMARY KEY (payment_id)
+    PRIMARY KEY (payment_id),
+    INDEX idx_fecha_id (fecha_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Staging: Pagos pre-agregados por renta (join 1:1 en la construcción de fact_ventas)
+DROP TABLE IF EXISTS stg_payment_rental;
+CREATE TABLE stg_payment_rental (
+    rental_id INT PRIMARY KEY,
+    monto_total DECIMAL(10,2) NOT NULL DEFAULT 0.00,
+    cantidad_pagos INT NOT NULL DEFAULT 0,
+    etl_id INT
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Staging: Inventory (inventario)
@@ -186,6 +201,36 @@ CREATE TABLE IF NOT EXISTS audit_calidad (
     INDEX idx_resultado (resultado)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Caché de resultados de validación (por huella de tablas de entrada)
+CREATE TABLE IF NOT EXISTS cache_validaciones (
+    clave VARCHAR(100) PRIMARY KEY,
+    huella CHAR(64) NOT NULL,
+    resultado BOOLEAN NOT NULL,
+    etl_id INT,
+    registros TEXT,
+    fecha DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Particiones de fact_ventas (día × tienda) afectadas por cada ejecución
+CREATE TABLE IF NOT EXISTS etl_particiones_afectadas (
+    etl_id INT NOT NULL,
+    fecha_id INT NOT NULL,
+    tienda_id INT NOT NULL,
+    PRIMARY KEY (etl_id, fecha_id, tienda_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Checkpoints de tareas del planificador DAG (para reanudar con --resume)
+CREATE TABLE IF NOT EXISTS etl_checkpoint (
+    etl_id INT NOT NULL,
+    tarea VARCHAR(100) NOT NULL,
+    estado ENUM('INICIADO', 'COMPLETADO', 'ERROR') NOT NULL,
+    huella CHAR(64),
+    resultado TEXT,
+    mensaje_error TEXT,
+    fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (etl_id, tarea)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- Vista de resumen de ejecuciones
 CREATE OR REPLACE VIEW v_etl_resumen AS
 SELECT 
@@ -0,0 +1,157 @@
+"""
+Checkpoints de tareas para reanudar ejecuciones fallidas
+RF10: Orquestación del proceso completo
+
+Cada tarea del planificador DAG que modifica datos (extraer una tabla,
+limpiarla, cargar una dimensión, un tramo de fact_ventas) deja una fila en
+etl_checkpoint al terminar, con la huella de sus tablas de entrada. Con
+--resume se reutiliza el etl_id de la última ejecución sin terminar y se
+omite cada tarea cuyo checkpoint sigue vigente: misma huella y ninguna
+tarea anterior rehecha en esta ejecución.
+
+La huella de una tabla es la de las validaciones
+(DataValidator.calcular_huella: COUNT(*) y CHECKSUM TABLE), así sirve
+también para las tablas de Sakila (que no tienen etl_id).
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from sqlalchemy import text
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.validator import DataValidator
+
+# Fila de etl_checkpoint con el estado y los parámetros de la ejecución completa
+TAREA_PIPELINE = 'pipeline'
+
+def huella_tablas(engine, tablas: List[str]) -> str:
+    """
+    Huella del contenido de un conjunto de tablas
+    
+    Args:
+        engine: Engine de la base de datos de las tablas
+        tablas: Nombres de tabla
+    
+    Returns:
+        SHA-256 hexadecimal de las huellas de cada tabla
+    """
+    partes = [f"{tabla}={DataValidator.calcular_huella(engine, tabla)}" for tabla in sorted(tablas)]
+    return hashlib.sha256("|".join(partes).encode('utf-8')).hexdigest()
+
+def _a_json(valor: Any) -> str:
+    """Serializa el resultado de una tarea (escalares NumPy y fechas incluidos)"""
+    return json.dumps(valor, ensure_ascii=False,
+                      default=lambda v: v.item() if hasattr(v, 'item') else str(v))
+
+class CheckpointStore:
+    """Checkpoints de las tareas de una ejecución (etl_checkpoint en staging)"""
+    
+    def __init__(self, engine_staging, etl_id: int):
+        """
+        Args:
+            engine_staging: Engine de staging
+            etl_id: Ejecución a la que pertenecen los checkpoints
+        """
+        self.engine_staging = engine_staging
+        self.etl_id = etl_id
+        self._completados: Dict[str, Tuple[str, Any]] = {}
+    
+    def cargar(self) -> int:
+        """
+        Lee los checkpoints completados de la ejecución (para reanudarla)
+        
+        Returns:
+            Número de tareas completadas
+        """
+        with self.engine_staging.connect() as conn:
+            filas = conn.execute(text("""
+                SELECT tarea, huella, resultado
+                FROM etl_checkpoint
+                WHERE etl_id = :etl_id AND estado = 'COMPLETADO' AND tarea <> :pipeline
+            """), {"etl_id": self.etl_id, "pipeline": TAREA_PIPELINE}).fetchall()
+        
+        self._completados = {
+            tarea: (huella, json.loads(resultado) if resultado else None)
+            for tarea, huella, resultado in filas
+        }
+        return len(self._completados)
+    
+    def obtener(self, tarea: str) -> Optional[Tuple[str, Any]]:
+        """
+        Checkpoint completado de una tarea
+        
+        Returns:
+            (huella, resultado) o None si la tarea no terminó en la ejecución
+        """
+        return self._completados.get(tarea)
+    
+    def guardar(self, tarea: str, estado: str, huella: str = None,
+                resultado: Any = None, mensaje_error: str = None) -> None:
+        """
+        Registra (o reemplaza) el checkpoint de una tarea
+        
+        Args:
+            tarea: Nombre de la tarea
+            estado: 'INICIADO', 'COMPLETADO' o 'ERROR'
+            huella: Huella de las tablas de entrada (opcional)
+            resultado: Resultado serializable a JSON (opcional)
+            mensaje_error: Descripción del error (opcional)
+        """
+        with self.engine_staging.connect() as conn:
+            conn.execute(text("""
+                INSERT INTO etl_checkpoint (etl_id, tarea, estado, huella, resultado, mensaje_error, fecha)
+                VALUES (:etl_id, :tarea, :estado, :huella, :resultado, :mensaje, :fecha)
+                ON DUPLICATE KEY UPDATE
+                    estado = VALUES(estado),
+                    huella = VALUES(huella),
+                    resultado = VALUES(resultado),
+                    mensaje_error = VALUES(mensaje_error),
+                    fecha = VALUES(fecha)
+            """), {
+                "etl_id": self.etl_id,
+                "tarea": tarea,
+                "estado": estado,
+                "huella": huella,
+                "resultado": _a_json(resultado) if resultado is not None else None,
+                "mensaje": mensaje_error,
+                "fecha": datetime.now()
+            })
+            conn.commit()
+    
+    def iniciar_pipeline(self, parametros: Dict) -> None:
+        """Marca la ejecución como iniciada con los parámetros necesarios para reanudarla"""
+        self.guardar(TAREA_PIPELINE, 'INICIADO', resultado=parametros)
+    
+    def cerrar_pipeline(self, exito: bool, parametros: Dict, mensaje_error: str = None) -> None:
+        """Marca la ejecución como completada o con error"""
+        self.guardar(TAREA_PIPELINE, 'COMPLETADO' if exito else 'ERROR',
+                     resultado=parametros, mensaje_error=mensaje_error)
+    
+    @staticmethod
+    def ultima_ejecucion(engine_staging, solo_pendientes: bool = True) -> Optional[Tuple[int, Dict]]:
+        """
+        Última ejecución registrada en etl_checkpoint
+        
+        Solo se mira la más reciente: una ejecución fallida anterior a otra
+        que terminó bien no se retoma (sus tareas pisarían datos más nuevos).
+        
+        Args:
+            engine_staging: Engine de staging
+            solo_pendientes: Retornar la última solo si quedó sin terminar (INICIADO o ERROR)
+        
+        Returns:
+            (etl_id, parámetros) o None
+        """
+        with engine_staging.connect() as conn:
+            fila = conn.execute(text("""
+                SELECT etl_id, estado, resultado
+                FROM etl_checkpoint
+                WHERE tarea = :pipeline
+                ORDER BY etl_id DESC
+                LIMIT 1
+            """), {"pipeline": TAREA_PIPELINE}).fetchone()
+        
+        if fila is None or (solo_pendientes and fila[1] == 'COMPLETADO'):
+            return None
+        return fila[0], json.loads(fila[2]) if fila[2] else {}
@@ -6,7 +6,7 @@ RF1: Extracción de datos de Sakila
 import pandas as pd
 from sqlalchemy import create_engine, text
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import sys
 from pathlib import Path
 
@@ -16,10 +16,32 @@ sys.path.insert(0, str(project_root))
 
 from config.config import Config
 from src.logger_config import get_logger
+from src.stream_validator import StreamValidator
+from src.profiler import medir
 
 class SakilaExtractor:
     """Extractor de datos desde la base de datos Sakila"""
     
+    # Tablas de staging con llave de fecha entera (AAAAMMDD) -> columna de origen
+    COLUMNAS_FECHA_ID = {
+        'stg_rental': 'rental_date',
+        'stg_payment': 'payment_date'
+    }
+    
+    # Tablas a extraer (origen -> staging)
+    TABLAS = [
+        ('rental', 'stg_rental'),
+        ('payment', 'stg_payment'),
+        ('inventory', 'stg_inventory'),
+        ('film', 'stg_film'),
+        ('film_category', 'stg_film_category'),
+        ('category', 'stg_category'),
+        ('store', 'stg_store'),
+        ('address', 'stg_address'),
+        ('city', 'stg_city'),
+        ('country', 'stg_country')
+    ]
+    
     def __init__(self):
         """Inicializa el extractor con conexiones y logger"""
         from src.logger_config import ETLLogger
@@ -101,6 +123,43 @@ class SakilaExtractor:
         
         self.logger.info(f"📝 ETL {self.etl_id} finalizado con estado: {estado}")
     
+    def _construir_query(self, tabla: str, fecha_desde: datetime = None) -> str:
+        """
+        Construye el query de extracción por defecto de una tabla
+        
+        Args:
+            tabla: Nombre de la tabla
+            fecha_desde: Fecha para extracción incremental (opcional)
+            
+        Returns:
+            Query SQL
+        """
+        # Caso especial: tabla address (excluir campo GEOMETRY)
+        if tabla == 'address':
+            campos = "address_id, address, address2, district, city_id, postal_code, phone, last_update"
+            if fecha_desde:
+                query = f"""
+                    SELECT {campos} FROM {tabla} 
+                    WHERE last_update >= '{fecha_desde.strftime('%Y-%m-%d %H:%M:%S')}'
+                """
+                self.logger.info(f"📥 Extrayendo {tabla} (incremental desde {fecha_desde})")
+            else:
+                query = f"SELECT {campos} FROM {tabla}"
+                self.logger.info(f"📥 Extrayendo {tabla} (completo, sin campo GEOMETRY)")
+        else:
+            # Query por defecto: extracción total
+            if fecha_desde:
+                query = f"""
+                    SELECT * FROM {tabla} 
+                    WHERE last_update >= '{fecha_desde.strftime('%Y-%m-%d %H:%M:%S')}'
+                """
+                self.logger.info(f"📥 Extrayendo {tabla} (incremental desde {fecha_desde})")
+            else:
+                query = f"SELECT * FROM {tabla}"
+                self.logger.info(f"📥 Extrayendo {tabla} (completo)")
+        
+        return query
+    
     def extraer_tabla(self, tabla: str, query: str = None, 
                      fecha_desde: datetime = None) -> pd.DataFrame:
         """
@@ -116,29 +175,7 @@ class SakilaExtractor:
         """
         try:
             if query is None:
-                # Caso especial: tabla address (excluir campo GEOMETRY)
-                if tabla == 'address':
-                    campos = "address_id, address, address2, district, city_id, postal_code, phone, last_update"
-                    if fecha_desde:
-                        query = f"""
-                            SELECT {campos} FROM {tabla} 
-                            WHERE last_update >= '{fecha_desde.strftime('%Y-%m-%d %H:%M:%S')}'
-                        """
-                        self.logger.info(f"📥 Extrayendo {tabla} (incremental desde {fecha_desde})")
-                    else:
-                        query = f"SELECT {campos} FROM {tabla}"
-                        self.logger.info(f"📥 Extrayendo {tabla} (completo, sin campo GEOMETRY)")
-                else:
-                    # Query por defecto: extracción total
-                    if fecha_desde:
-                        query = f"""
-                            SELECT * FROM {tabla} 
-                            WHERE last_update >= '{fecha_desde.strftime('%Y-%m-%d %H:%M:%S')}'
-                        """
-                        self.logger.info(f"📥 Extrayendo {tabla} (incremental desde {fecha_desde})")
-                    else:
-                        query = f"SELECT * FROM {tabla}"
-                        self.logger.info(f"📥 Extrayendo {tabla} (completo)")
+                query = self._construir_query(tabla, fecha_desde)
             
             # Ejecutar query
             df = pd.read_sql(query, self.engine_sakila)
@@ -150,8 +187,58 @@ class SakilaExtractor:
             self.logger.error(f"❌ Error extrayendo {tabla}: {e}")
             raise
     
+    def extraer_y_cargar(self, tabla: str, tabla_staging: str,
+                         fecha_desde: datetime = None, if_exists: str = 'replace',
+                         validador_stream: StreamValidator = None) -> Tuple[int, int]:
+        """
+        Extrae una tabla por lotes y los carga a staging a medida que llegan
+        
+        Cada lote pasa por los checks del validador en flujo (si se indica)
+        antes de escribirse, así la validación PRE no necesita releer staging.
+        
+        Args:
+            tabla: Nombre de la tabla en Sakila
+            tabla_staging: Nombre de la tabla en staging
+            fecha_desde: Fecha para extracción incremental (opcional)
+            if_exists: 'replace' o 'append' (aplica al primer lote)
+            validador_stream: Validador en flujo (opcional)
+            
+        Returns:
+            (registros_leidos, registros_escritos)
+        """
+        query = self._construir_query(tabla, fecha_desde)
+        fecha_carga = datetime.now()
+        leidos = 0
+        escritos = 0
+        
+        try:
+            for lote in pd.read_sql(query, self.engine_sakila, chunksize=Config.ETL_BATCH_SIZE):
+                if len(lote) == 0:
+                    continue
+                
+                leidos += len(lote)
+                
+                if validador_stream is not None:
+                    validador_stream.procesar_lote(tabla_staging, lote)
+                
+                escritos += self.cargar_a_staging(
+                    lote,
+                    tabla_staging,
+                    if_exists=if_exists if escritos == 0 else 'append',
+                    fecha_carga=fecha_carga,
+                    registrar_log=False
+                )
+            
+            self.logger.info(f"✅ Extraídos y cargados {escritos:,} registros: {tabla} → {tabla_staging}")
+            return leidos, escritos
+            
+        except Exception as e:
+            self.logger.error(f"❌ Error extrayendo {tabla}: {e}")
+            raise
+    
     def cargar_a_staging(self, df: pd.DataFrame, tabla_staging: str, 
-                        if_exists: str = 'replace') -> int:
+                        if_exists: str = 'replace', fecha_carga: datetime = None,
+                        registrar_log: bool = True) -> int:
         """
         Carga datos al área de staging
         
@@ -159,6 +246,8 @@ class SakilaExtractor:
             df: DataFrame a cargar
             tabla_staging: Nombre de la tabla en staging
             if_exists: 'replace' o 'append'
+            fecha_carga: Marca etl_fecha_carga (default: ahora)
+            registrar_log: Si True, registra la carga en el log
             
         Returns:
             Número de registros cargados
@@ -166,9 +255,14 @@ class SakilaExtractor:
         try:
             # Agregar metadatos ETL
             df_staging = df.copy()
-            df_staging['etl_fecha_carga'] = datetime.now()
+            df_staging['etl_fecha_carga'] = fecha_carga or datetime.now()
             df_staging['etl_id'] = self.etl_id
             
+            # Llave de fecha entera, misma codificación que dim_tiempo.fecha_id
+            if tabla_staging in self.COLUMNAS_FECHA_ID:
+                df_staging['fecha_id'] = self.calcular_fecha_id(
+                    df_staging[self.COLUMNAS_FECHA_ID[tabla_staging]])
+            
             # Cargar a staging
             registros = df_staging.to_sql(
                 tabla_staging,
@@ -178,38 +272,115 @@ class SakilaExtractor:
                 chunksize=Config.ETL_BATCH_SIZE
             )
             
-            self.logger.info(f"✅ Cargados {len(df_staging):,} registros a {tabla_staging}")
+            if registrar_log:
+                self.logger.info(f"✅ Cargados {len(df_staging):,} registros a {tabla_staging}")
             return len(df_staging)
             
         except Exception as e:
             self.logger.error(f"❌ Error cargando a {tabla_staging}: {e}")
             raise
     
+    @staticmethod
+    def calcular_fecha_id(fechas: pd.Series) -> pd.Series:
+        """
+        Calcula la llave de fecha AAAAMMDD de forma vectorizada
+        
+        Args:
+            fechas: Serie de fechas/datetimes
+            
+        Returns:
+            Serie entera (Int64, nulos donde la fecha es nula)
+        """
+        fechas = pd.to_datetime(fechas)
+        return (fechas.dt.year * 10000 + fechas.dt.month * 100 + fechas.dt.day).astype('Int64')
+    
+    def asegurar_indice_fecha(self, tabla_staging: str) -> None:
+        """
+        Crea el índice sobre fecha_id si no existe
+        
+        La carga completa reemplaza la tabla (to_sql con if_exists='replace')
+        y con ella los índices del DDL, así que se vuelve a crear después.
+        
+        Args:
+            tabla_staging: Tabla de staging con columna fecha_id
+        """
+        with self.engine_staging.connect() as conn:
+            existe = conn.execute(text("""
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE()
+                  AND table_name = :tabla
+                  AND index_name = 'idx_fecha_id'
+            """), {"tabla": tabla_staging}).fetchone()[0]
+            
+            if not existe:
+                conn.execute(text(f"ALTER TABLE {tabla_staging} ADD INDEX idx_fecha_id (fecha_id)"))
+                conn.commit()
+    
+    def extraer_tabla_a_staging(self, tabla_origen: str, tabla_staging: str,
+                                incremental: bool = False, fecha_desde: datetime = None,
+                                validador_stream: StreamValidator = None) -> Dict[str, int]:
+        """
+        Extrae una tabla de Sakila a Staging (un error no detiene al resto)
+        
+        Args:
+            tabla_origen: Tabla en Sakila
+            tabla_staging: Tabla destino en Staging
+            incremental: Si True, extrae solo registros nuevos
+            fecha_desde: Fecha de inicio para extracción incremental
+            validador_stream: Validador en flujo alimentado con cada lote (opcional)
+            
+        Returns:
+            Diccionario con leidos, escritos y error (si lo hubo)
+        """
+        try:
+            # Extraer de Sakila y cargar a Staging por lotes
+            registros_leidos, registros_escritos = self.extraer_y_cargar(
+                tabla_origen,
+                tabla_staging,
+                fecha_desde=fecha_desde if incremental else None,
+                if_exists='append' if incremental else 'replace',
+                validador_stream=validador_stream
+            )
+            
+            if registros_leidos == 0:
+                self.logger.info(f"⚠️  No hay datos nuevos en {tabla_origen}")
+            elif tabla_staging in self.COLUMNAS_FECHA_ID:
+                self.asegurar_indice_fecha(tabla_staging)
+            
+            self.etl_logger.log_table_stats (
+                tabla_origen, 
+                registros_leidos, 
+                registros_escritos
+            )
+            
+            return {
+                'leidos': registros_leidos,
+                'escritos': registros_escritos
+            }
+            
+        except Exception as e:
+            self.logger.error(f"❌ Error en tabla {tabla_origen}: {e}")
+            return {
+                'leidos': 0,
+                'escritos': 0,
+                'error': str(e)
+            }
+    
     def extraer_todas_las_tablas(self, incremental: bool = False, 
-                                 fecha_desde: datetime = None) -> Dict[str, int]:
+                                 fecha_desde: datetime = None,
+                                 validador_stream: StreamValidator = None) -> Dict[str, int]:
         """
         Extrae todas las tablas necesarias de Sakila a Staging
         
         Args:
             incremental: Si True, extrae solo registros nuevos
             fecha_desde: Fecha de inicio para extracción incremental
+            validador_stream: Validador en flujo alimentado con cada lote (opcional)
             
         Returns:
             Diccionario con estadísticas de extracción
         """
-        # Tablas a extraer
-        tablas = [
-            ('rental', 'stg_rental'),
-            ('payment', 'stg_payment'),
-            ('inventory', 'stg_inventory'),
-            ('film', 'stg_film'),
-            ('film_category', 'stg_film_category'),
-            ('category', 'stg_category'),
-            ('store', 'stg_store'),
-            ('address', 'stg_address'),
-            ('city', 'stg_city'),
-            ('country', 'stg_country')
-        ]
+        tablas = self.TABLAS
         
         proceso = f"EXTRACCION_{'INCREMENTAL' if incremental else 'COMPLETA'}"
         self.registrar_inicio_etl(proceso)
@@ -223,49 +394,13 @@ class SakilaExtractor:
         
         try:
             for tabla_origen, tabla_staging in tablas:
-                try:
-                    # Extraer de Sakila
-                    df = self.extraer_tabla(
-                        tabla_origen, 
-                        fecha_desde=fecha_desde if incremental else None
-                    )
-                    
-                    registros_leidos = len(df)
-                    
-                    # Cargar a Staging
-                    if registros_leidos > 0:
-                        registros_escritos = self.cargar_a_staging(
-                            df, 
-                            tabla_staging,
-                            if_exists='append' if incremental else 'replace'
-                        )
-                    else:
-                        registros_escritos = 0
-                        self.logger.info(f"⚠️  No hay datos nuevos en {tabla_origen}")
-                    
-                    # Estadísticas
-                    estadisticas[tabla_origen] = {
-                        'leidos': registros_leidos,
-                        'escritos': registros_escritos
-                    }
-                    
-                    total_leidos += registros_leidos
-                    total_escritos += registros_escritos
-                    
-                    self.etl_logger.log_table_stats (
-                        tabla_origen, 
-                        registros_leidos, 
-                        registros_escritos
-                    )
-                    
-                except Exception as e:
-                    self.logger.error(f"❌ Error en tabla {tabla_origen}: {e}")
-                    errores += 1
-                    estadisticas[tabla_origen] = {
-                        'leidos': 0,
-                        'escritos': 0,
-                        'error': str(e)
-                    }
+                with medir(tabla_origen, 'extraccion'):
+                    estadisticas[tabla_origen] = self.extraer_tabla_a_staging(
+                        tabla_origen, tabla_staging, incremental, fecha_desde, validador_stream)
+                
+                total_leidos += estadisticas[tabla_origen]['leidos']
+                total_escritos += estadisticas[tabla_origen]['escritos']
+                errores += 'error' in estadisticas[tabla_origen]
             
             # Registrar fin exitoso
             self.registrar_fin_etl(
@@ -0,0 +1,380 @@
+"""
+Motor de agregación de hechos en proceso
+RF3-4: Transformaciones analíticas y carga al modelo estrella
+
+Alternativa al INSERT ... SELECT de DataMartTransformer.poblar_fact_ventas:
+el join rental → inventory → film → category → pagos y el group-by
+diario se hacen en pandas con operaciones vectorizadas, repartiendo los
+días entre varios hilos. Las llaves surrogadas se resuelven con mapas de
+dimensión en caché y el resultado se carga en bloque a fact_ventas.
+
+En modo 'flujo' (cargar_en_flujo) el group-by corre en staging sin tocar
+tablas del Data Mart y el resultado se transmite por lotes; así staging y
+Data Mart pueden estar en servidores distintos.
+
+Con resolución as-of (Config.FACT_SCD_ASOF) cada renta recibe la versión
+de la dimensión vigente en su rental_date (AsOfKeyResolver) en lugar de
+la versión activa.
+
+La semántica es la misma que la del SQL: rentas válidas (es_valido TRUE
+o NULL), joins internos a inventory/film/film_category y join izquierdo a
+los pagos pre-agregados por renta. Sin resolución as-of se usan las
+versiones activas de las dimensiones, como en el SQL.
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.config import Config
+from src.scd_resolver import AsOfKeyResolver
+from src.profiler import anotar
+
+class FactEngine:
+    """Agregación de fact_ventas en memoria con mapas de dimensión en caché"""
+    
+    # Columnas de staging que necesita el motor
+    COLUMNAS_STAGING = {
+        'stg_rental': ['rental_id', 'fecha_id', 'rental_date', 'inventory_id', 'return_date', 'es_valido'],
+        'stg_inventory': ['inventory_id', 'film_id', 'store_id'],
+        'stg_film': ['film_id'],
+        'stg_film_category': ['film_id', 'category_id'],
+        'stg_payment_rental': ['rental_id', 'monto_total', 'cantidad_pagos']
+    }
+    
+    # Dimensión -> (llave natural, llave surrogada)
+    DIMENSIONES = {
+        'dim_film': ('film_id', 'film_sk'),
+        'dim_categoria': ('categoria_id', 'categoria_sk'),
+        'dim_tienda': ('tienda_id', 'tienda_sk')
+    }
+    
+    COLUMNAS_FACT = ['fecha_id', 'film_sk', 'categoria_sk', 'tienda_sk', 'cantidad_rentas',
+                     'monto_total', 'monto_promedio', 'dias_renta_promedio',
+                     'cantidad_devoluciones', 'etl_id']
+    
+    def __init__(self, engine_staging, engine_dm, workers: int = None,
+                 resolver: Callable[[str], str] = None, asof: bool = None):
+        """
+        Args:
+            engine_staging: Engine SQLAlchemy de staging
+            engine_dm: Engine SQLAlchemy del Data Mart
+            workers: Hilos de agregación (default: Config.FACT_ENGINE_WORKERS)
+            resolver: Nombre lógico -> tabla física (ej: tablas sombra); default: identidad
+            asof: Resolver SKs por fecha de renta (default: Config.FACT_SCD_ASOF)
+        """
+        self.engine_staging = engine_staging
+        self.engine_dm = engine_dm
+        self.resolver = resolver or (lambda tabla: tabla)
+        self.workers = max(1, workers or Config.FACT_ENGINE_WORKERS)
+        self.asof = Config.FACT_SCD_ASOF if asof is None else asof
+        self._mapas: Dict[str, pd.Series] = {}
+        self._resolvedores: Dict[str, AsOfKeyResolver] = {}
+    
+    def cargar_frames(self) -> Dict[str, pd.DataFrame]:
+        """
+        Lee de staging solo las columnas que usa el motor
+        
+        Returns:
+            Diccionario tabla -> DataFrame
+        """
+        frames = {}
+        for tabla, columnas in self.COLUMNAS_STAGING.items():
+            frames[tabla] = pd.read_sql(f"SELECT {', '.join(columnas)} FROM {tabla}",
+                                        self.engine_staging)
+        return frames
+    
+    def obtener_mapa_dimension(self, tabla: str) -> pd.Series:
+        """
+        Mapa llave natural -> llave surrogada de la versión activa (en caché)
+        
+        Args:
+            tabla: Dimensión ('dim_film', 'dim_categoria' o 'dim_tienda')
+        
+        Returns:
+            Serie indexada por llave natural
+        """
+        if tabla not in self._mapas:
+            llave_natural, llave_sk = self.DIMENSIONES[tabla]
+            df = pd.read_sql(f"""
+                SELECT {llave_natural}, {llave_sk} FROM {self.resolver(tabla)} WHERE activo = TRUE
+            """, self.engine_dm)
+            self._mapas[tabla] = df.drop_duplicates(llave_natural, keep='last') \
+                                   .set_index(llave_natural)[llave_sk]
+        return self._mapas[tabla]
+    
+    def obtener_resolvedor_asof(self, tabla: str) -> AsOfKeyResolver:
+        """
+        Intervalos de versión de todas las filas de la dimensión (en caché)
+        
+        Args:
+            tabla: Dimensión ('dim_film', 'dim_categoria' o 'dim_tienda')
+        
+        Returns:
+            AsOfKeyResolver de la dimensión
+        """
+        if tabla not in self._resolvedores:
+            llave_natural, llave_sk = self.DIMENSIONES[tabla]
+            df = pd.read_sql(f"""
+                SELECT {llave_natural}, {llave_sk}, fecha_inicio FROM {self.resolver(tabla)}
+            """, self.engine_dm)
+            self._resolvedores[tabla] = AsOfKeyResolver(df, llave_natural, llave_sk)
+        return self._resolvedores[tabla]
+    
+    def invalidar_mapas(self) -> None:
+        """Descarta los mapas de dimensión (llamar después de cargar dimensiones)"""
+        self._mapas.clear()
+        self._resolvedores.clear()
+    
+    def _asignar_llaves(self, df: pd.DataFrame) -> None:
+        """Agrega film_sk, categoria_sk y tienda_sk (versión activa o vigente en la fecha)"""
+        naturales = {'dim_film': 'film_id', 'dim_categoria': 'category_id', 'dim_tienda': 'store_id'}
+        for tabla, columna in naturales.items():
+            llave_sk = self.DIMENSIONES[tabla][1]
+            if self.asof:
+                df[llave_sk] = self.obtener_resolvedor_asof(tabla).resolver(
+                    df[columna].to_numpy(), df['fecha'].to_numpy())
+            else:
+                df[llave_sk] = df[columna].map(self.obtener_mapa_dimension(tabla))
+    
+    @staticmethod
+    def _preparar_rentas(rental: pd.DataFrame) -> pd.DataFrame:
+        """Filtra rentas válidas y calcula días de renta y devolución (fecha_id viene de staging)"""
+        rental = rental[rental['es_valido'].isna() | (rental['es_valido'] == 1)]
+        fecha = pd.to_datetime(rental['rental_date'])
+        devolucion = pd.to_datetime(rental['return_date'])
+        
+        return pd.DataFrame({
+            'rental_id': rental['rental_id'].to_numpy(),
+            'inventory_id': rental['inventory_id'].to_numpy(),
+            'fecha_id': rental['fecha_id'].to_numpy(),
+            'fecha': fecha.to_numpy(),
+            # DATEDIFF compara solo la parte fecha; sin devolución cuenta como 0
+            'dias': (devolucion.dt.normalize() - fecha.dt.normalize()).dt.days.fillna(0).to_numpy(),
+            'devuelto': devolucion.notna().to_numpy()
+        })
+    
+    @staticmethod
+    def _pagos_por_renta(pagos: pd.DataFrame) -> pd.DataFrame:
+        """
+        Pagos pre-agregados por renta (stg_payment_rental), indexados por rental_id
+        
+        Cada renta pesa max(pagos, 1) filas en los promedios y conteos, igual
+        que en el SELECT de DataMartTransformer._select_fact_ventas.
+        """
+        return pd.DataFrame({
+            'monto': pagos['monto_total'].astype(float).fillna(0).to_numpy(),
+            'filas': pagos['cantidad_pagos'].fillna(0).clip(lower=1).to_numpy()
+        }, index=pagos['rental_id'].to_numpy())
+    
+    def _agregar_particion(self, rentas: pd.DataFrame, tablas: Dict[str, pd.DataFrame],
+                           pagos: pd.DataFrame) -> pd.DataFrame:
+        """Join y group-by diario de un subconjunto de días"""
+        df = rentas.merge(tablas['inventory'], on='inventory_id', how='inner')
+        df = df[df['film_id'].isin(tablas['films'])]
+        df = df.merge(tablas['film_category'], on='film_id', how='inner')
+        
+        self._asignar_llaves(df)
+        df = df.dropna(subset=['film_sk', 'categoria_sk', 'tienda_sk'])
+        
+        df = df.join(pagos, on='rental_id')
+        df['monto'] = df['monto'].fillna(0)
+        df['filas'] = df['filas'].fillna(1)
+        df['dias_ponderados'] = df['dias'] * df['filas']
+        df['devoluciones'] = df['devuelto'] * df['filas']
+        
+        grupos = ['fecha_id', 'film_sk', 'categoria_sk', 'tienda_sk']
+        resultado = df.groupby(grupos, sort=False).agg(
+            cantidad_rentas=('rental_id', 'size'),
+            monto_total=('monto', 'sum'),
+            filas=('filas', 'sum'),
+            dias=('dias_ponderados', 'sum'),
+            cantidad_devoluciones=('devoluciones', 'sum')
+        ).reset_index()
+        
+        resultado['monto_promedio'] = resultado['monto_total'] / resultado['filas']
+        resultado['dias_renta_promedio'] = resultado['dias'] / resultado['filas']
+        return resultado
+    
+    def agregar(self, frames: Dict[str, pd.DataFrame] = None,
+                particiones: Optional[pd.DataFrame] = None,
+                rango: Tuple[int, int] = None) -> pd.DataFrame:
+        """
+        Calcula las filas de fact_ventas en memoria
+        
+        Args:
+            frames: DataFrames de staging ya en memoria (default: se leen de staging)
+            particiones: Pares (fecha_id, tienda_id) a recalcular (default: todos)
+            rango: (fecha_id desde inclusive, fecha_id hasta exclusivo) (opcional)
+        
+        Returns:
+            DataFrame con las columnas de fact_ventas (sin etl_id)
+        """
+        frames = frames if frames is not None else self.cargar_frames()
+        
+        rentas = self._preparar_rentas(frames['stg_rental'])
+        if rango is not None:
+            rentas = rentas[(rentas['fecha_id'] >= rango[0]) & (rentas['fecha_id'] < rango[1])]
+        tablas = {
+            'inventory': frames['stg_inventory'][['inventory_id', 'film_id', 'store_id']]
+                         .drop_duplicates('inventory_id', keep='last'),
+            'films': frames['stg_film']['film_id'].unique(),
+            'film_category': frames['stg_film_category'][['film_id', 'category_id']]
+        }
+        
+        if particiones is not None:
+            con_tienda = rentas.merge(tablas['inventory'][['inventory_id', 'store_id']],
+                                      on='inventory_id', how='inner')
+            con_tienda = con_tienda.merge(
+                particiones.rename(columns={'tienda_id': 'store_id'}),
+                on=['fecha_id', 'store_id'], how='inner')
+            rentas = con_tienda.drop(columns='store_id')
+        
+        pagos = self._pagos_por_renta(frames['stg_payment_rental'])
+        
+        # Reparto por día: cada día cae entero en una partición, no hay que recombinar grupos
+        dias = np.unique(rentas['fecha_id'].to_numpy())
+        bloques = [b for b in np.array_split(dias, min(self.workers, max(1, len(dias)))) if len(b) > 0]
+        
+        # Los mapas se cargan antes de repartir para no leerlos desde varios hilos
+        for tabla in self.DIMENSIONES:
+            if self.asof:
+                self.obtener_resolvedor_asof(tabla)
+            else:
+                self.obtener_mapa_dimension(tabla)
+        
+        if len(bloques) <= 1:
+            partes = [self._agregar_particion(rentas, tablas, pagos)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(bloques)) as pool:
+                partes = list(pool.map(
+                    lambda bloque: self._agregar_particion(
+                        rentas[rentas['fecha_id'].isin(bloque)], tablas, pagos),
+                    bloques
+                ))
+        
+        resultado = pd.concat(partes, ignore_index=True)
+        for col in ['fecha_id', 'film_sk', 'categoria_sk', 'tienda_sk',
+                    'cantidad_rentas', 'cantidad_devoluciones']:
+            resultado[col] = resultado[col].astype('int64')
+        
+        return resultado[self.COLUMNAS_FACT[:-1]]
+    
+    @staticmethod
+    def select_preagregado_staging(join_particiones: str = "", filtro: str = "") -> str:
+        """
+        SELECT que pre-agrega en staging por día y llaves naturales
+        
+        Se ejecuta solo contra staging (sin tablas del Data Mart), así
+        funciona aunque staging esté en otro servidor. Devuelve sumas y no
+        promedios para que las llaves surrogadas se asignen después.
+        
+        Args:
+            join_particiones: JOIN adicional para restringir a particiones (opcional)
+            filtro: Condición adicional del WHERE, empezando con AND (opcional)
+            
+        Returns:
+            Query SQL
+        """
+        peso = "GREATEST(COALESCE(pr.cantidad_pagos, 0), 1)"
+        return f"""
+            SELECT 
+                r.fecha_id,
+                i.film_id,
+                fc.category_id,
+                i.store_id,
+                COUNT(*) as cantidad_rentas,
+                SUM(COALESCE(pr.monto_total, 0)) as monto_total,
+                SUM({peso}) as filas,
+                SUM(COALESCE(DATEDIFF(r.return_date, r.rental_date), 0) * {peso}) as dias,
+                SUM(CASE WHEN r.return_date IS NOT NULL THEN {peso} ELSE 0 END) as cantidad_devoluciones
+            FROM stg_rental r
+            INNER JOIN stg_inventory i ON r.inventory_id = i.inventory_id
+            {join_particiones}
+            INNER JOIN stg_film f ON i.film_id = f.film_id
+            INNER JOIN stg_film_category fc ON f.film_id = fc.film_id
+            LEFT JOIN stg_payment_rental pr ON r.rental_id = pr.rental_id
+            WHERE (r.es_valido = TRUE OR r.es_valido IS NULL)
+            {filtro}
+            GROUP BY r.fecha_id, i.film_id, fc.category_id, i.store_id
+        """
+    
+    def cargar_en_flujo(self, etl_id: int, conn, join_particiones: str = "",
+                        filtro: str = "", params: Dict = None) -> int:
+        """
+        Transmite el pre-agregado de staging al Data Mart por lotes
+        
+        El group-by pesado corre en el servidor de staging y el resultado se
+        lee con cursor del lado del servidor en lotes de
+        Config.FACT_STREAM_CHUNK filas. Cada lote resuelve sus llaves
+        surrogadas con los mapas en caché (versión activa) y se carga en
+        bloque. Como hay una sola versión activa por llave natural, los
+        grupos por llave natural coinciden con los grupos por SK.
+        
+        Args:
+            etl_id: ID de la ejecución ETL
+            conn: Conexión al Data Mart (dentro de la transacción del llamador)
+            join_particiones: JOIN a etl_particiones_afectadas (opcional)
+            filtro: Condición adicional del WHERE (opcional)
+            params: Parámetros de la query de staging
+            
+        Returns:
+            Número de registros insertados
+        """
+        query = text(self.select_preagregado_staging(join_particiones, filtro))
+        registros = 0
+        
+        with self.engine_staging.connect() as conn_staging:
+            lotes = pd.read_sql(query, conn_staging.execution_options(stream_results=True),
+                                params=params or {}, chunksize=Config.FACT_STREAM_CHUNK)
+            for lote in lotes:
+                # Con stream_results el perfil no ve las filas al ejecutar la query
+                anotar(filas_leidas=len(lote), bytes_recibidos=int(lote.memory_usage(index=False).sum()))
+                lote['film_sk'] = lote['film_id'].map(self.obtener_mapa_dimension('dim_film'))
+                lote['categoria_sk'] = lote['category_id'].map(self.obtener_mapa_dimension('dim_categoria'))
+                lote['tienda_sk'] = lote['store_id'].map(self.obtener_mapa_dimension('dim_tienda'))
+                lote = lote.dropna(subset=['film_sk', 'categoria_sk', 'tienda_sk'])
+                
+                filas = lote['filas'].astype(float)
+                lote['monto_promedio'] = lote['monto_total'].astype(float) / filas
+                lote['dias_renta_promedio'] = lote['dias'].astype(float) / filas
+                for col in ['fecha_id', 'film_sk', 'categoria_sk', 'tienda_sk',
+                            'cantidad_rentas', 'cantidad_devoluciones']:
+                    lote[col] = lote[col].astype('int64')
+                
+                registros += self.cargar(lote[self.COLUMNAS_FACT[:-1]], etl_id, conn)
+        
+        return registros
+    
+    def cargar(self, df_fact: pd.DataFrame, etl_id: int, conn) -> int:
+        """
+        Carga en bloque las filas agregadas a fact_ventas
+        
+        Args:
+            df_fact: Resultado de agregar()
+            etl_id: ID de la ejecución ETL
+            conn: Conexión (dentro de la transacción del llamador)
+        
+        Returns:
+            Número de registros insertados
+        """
+        if len(df_fact) == 0:
+            return 0
+        
+        df_fact = df_fact.assign(etl_id=etl_id)
+        df_fact.to_sql(
+            self.resolver('fact_ventas'),
+            conn,
+            if_exists='append',
+            index=False,
+            chunksize=Config.ETL_BATCH_SIZE,
+            method='multi'
+        )
+        return len(df_fact)
@@ -0,0 +1,472 @@
+"""
+Generador de datos sintéticos con forma de Sakila
+Para probar extracción, staging y Data Mart a escala
+
+Produce las tablas que lee SakilaExtractor (rental, payment, inventory,
+film, film_category, category, store, address, city, country) con las
+columnas de Sakila, a un factor de escala sobre los volúmenes originales
+(1x = ~16k rentas y 1.000 films). Con la misma semilla y escala la salida
+es idéntica.
+
+Sesgo realista (0 = uniforme, 1 = default):
+- popularidad de films tipo Zipf; los populares tienen más copias
+- tiendas y categorías con pesos decrecientes
+- fechas con estacionalidad (verano) y más rentas en fin de semana
+
+Una fracción configurable de filas sale sucia para los validadores y la
+limpieza de staging: nulos, montos negativos o excesivos, fechas futuras,
+devoluciones antes de la renta, FKs huérfanas, tarifas y duraciones fuera
+de rango y títulos sin normalizar.
+
+La salida se escribe por bloques de BLOQUE filas en una base de datos
+(reemplaza las tablas) o en archivos CSV. La memoria depende del catálogo
+(films, tiendas, días), no del número de rentas.
+
+Uso:
+    python src/generator.py --escala 10 --semilla 42 --sucios 0.01
+    python src/generator.py --escala 100 --csv data/sintetico
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+from datetime import datetime
+from typing import Dict, Iterator
+import sys
+from pathlib import Path
+
+# Agregar path del proyecto
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from config.config import Config
+from src.logger_config import get_logger
+
+# Filas de Sakila original (escala 1)
+BASE = {
+    'country': 109,
+    'city': 600,
+    'address': 603,
+    'store': 2,
+    'customer': 599,
+    'film': 1000,
+    'rental': 16044
+}
+
+# Tablas que no crecen con la escala (dominios fijos)
+FIJAS = ('country',)
+
+CATEGORIAS = ['Action', 'Animation', 'Children', 'Classics', 'Comedy', 'Documentary',
+              'Drama', 'Family', 'Foreign', 'Games', 'Horror', 'Music', 'New',
+              'Sci-Fi', 'Sports', 'Travel']
+
+ADJETIVOS = ['ACADEMY', 'ACE', 'AFRICAN', 'AGENT', 'AIRPLANE', 'ALABAMA', 'ALIEN', 'AMERICAN',
+             'ANGELS', 'ARABIA', 'BEAST', 'BLADE', 'BRIDE', 'CHICAGO', 'CIRCUS', 'CLUELESS',
+             'DESERT', 'DRAGON', 'EGG', 'FANTASY', 'FLYING', 'GOLDEN', 'GRACELAND', 'HAUNTED',
+             'ICE', 'JUNGLE', 'LOST', 'MIDNIGHT', 'MUMMY', 'OCTOBER', 'PACIFIC', 'PRIDE',
+             'RIVER', 'SECRET', 'SILENT', 'SPIRIT', 'TITANIC', 'VELVET', 'WILD', 'ZOOLANDER']
+
+SUSTANTIVOS = ['ADAPTATION', 'ATTACKS', 'BOONDOCK', 'CASPER', 'CONFIDENTIAL', 'DINOSAUR',
+               'DIVORCE', 'DRIVER', 'EXPRESS', 'FACTORY', 'FEVER', 'GOLDFINGER', 'HARPER',
+               'HOLIDAY', 'HUNTER', 'JAWBREAKER', 'KISS', 'LEGEND', 'MASK', 'MOTIONS',
+               'NOTTING', 'ODDITY', 'PANTHER', 'PATIENT', 'QUEST', 'RAGING', 'SADDLE',
+               'SHAWSHANK', 'SQUAD', 'STING', 'SUNRISE', 'TELEGRAPH', 'TRAP', 'TROUBLE',
+               'UNFORGIVEN', 'VANISHING', 'WAR', 'WIZARD', 'YENTL', 'ZORRO']
+
+RATINGS = ['G', 'PG', 'PG-13', 'R', 'NC-17']
+
+# Filas generadas con un mismo estado aleatorio y escritas de una vez
+BLOQUE = 50000
+
+# Marca last_update fija (la salida no depende del momento de generación)
+ULTIMA_ACTUALIZACION = datetime(2006, 2, 15, 21, 30, 53)
+
+# Fechas de las filas sucias "futuras" (fijas para que la salida sea reproducible)
+FECHA_FUTURA = np.datetime64('2099-01-01')
+
+def _pesos_zipf(n: int, exponente: float, desplazamiento: int = 0) -> np.ndarray:
+    """Pesos normalizados 1/(rango + desplazamiento)^exponente (exponente 0 = uniforme)"""
+    pesos = 1.0 / np.arange(1 + desplazamiento, n + 1 + desplazamiento, dtype=np.float64) ** exponente
+    return pesos / pesos.sum()
+
+def _hash_uniforme(ids: np.ndarray, semilla: int) -> np.ndarray:
+    """Uniforme [0, 1) determinista por ID (mezcla splitmix64)"""
+    with np.errstate(over='ignore'):
+        x = ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(semilla & 0xFFFFFFFF)
+        x ^= x >> np.uint64(30)
+        x *= np.uint64(0xBF58476D1CE4E5B9)
+        x ^= x >> np.uint64(27)
+        x *= np.uint64(0x94D049BB133111EB)
+        x ^= x >> np.uint64(31)
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+class SakilaGenerator:
+    """Generador determinista de datos con forma de Sakila"""
+    
+    # Orden de generación (padres antes que hijos); payment sale junto con rental
+    TABLAS = ['country', 'city', 'address', 'store', 'category', 'film',
+              'film_category', 'inventory', 'rental', 'payment']
+    
+    def __init__(self, escala: float = 1.0, semilla: int = 42, tasa_sucios: float = 0.0,
+                 sesgo: float = 1.0, fecha_inicio: str = '2005-05-24', fecha_fin: str = '2006-02-14'):
+        """
+        Args:
+            escala: Factor sobre los volúmenes de Sakila (1, 10, 100, 1000...)
+            semilla: Semilla de todos los generadores aleatorios
+            tasa_sucios: Fracción de filas sucias en rental, payment, film e inventory
+            sesgo: Intensidad del sesgo de popularidad, tiendas, categorías y fechas
+            fecha_inicio: Primera fecha de renta (YYYY-MM-DD)
+            fecha_fin: Última fecha de renta (YYYY-MM-DD)
+        """
+        self.logger = get_logger('generator')
+        self.escala = escala
+        self.semilla = semilla
+        self.tasa_sucios = tasa_sucios
+        self.sesgo = sesgo
+        self.estadisticas: Dict[str, Dict[str, int]] = {}
+        
+        self.filas = {tabla: base if tabla in FIJAS else max(1, round(base * escala))
+                      for tabla, base in BASE.items()}
+        self.filas['store'] = max(2, self.filas['store'])
+        self.filas['address'] = max(self.filas['address'], self.filas['store'])
+        self.filas['category'] = len(CATEGORIAS)
+        self.filas['film_category'] = self.filas['film']
+        self.filas['payment'] = self.filas['rental']
+        
+        self.fecha_inicio = np.datetime64(fecha_inicio, 's')
+        self.dias = int((np.datetime64(fecha_fin, 'D') - np.datetime64(fecha_inicio, 'D')).astype(int)) + 1
+        
+        self._preparar_catalogo()
+        self.logger.info(f"🎲 Generador Sakila x{escala} (semilla {semilla}, sucios {tasa_sucios:.1%}): "
+                         f"{self.filas['film']:,} films, {self.filas['inventory']:,} copias, "
+                         f"{self.filas['rental']:,} rentas")
+    
+    def _rng(self, tabla: str, bloque: int = 0) -> np.random.Generator:
+        """Generador aleatorio propio de (tabla, bloque): la salida no depende del orden"""
+        return np.random.default_rng([self.semilla, self.TABLAS.index(tabla), bloque])
+    
+    def _preparar_catalogo(self) -> None:
+        """
+        Atributos por film y distribuciones compartidas entre tablas
+        
+        Es lo único que se mantiene en memoria (arreglos del tamaño del
+        catálogo); inventario y rentas se derivan de aquí bloque a bloque.
+        """
+        rng = self._rng('film')
+        films = self.filas['film']
+        
+        # Popularidad: rango aleatorio por film, pesos Zipf por rango (el
+        # desplazamiento aplana la cabeza: ningún film domina las rentas)
+        rango = rng.permutation(films)
+        popularidad = _pesos_zipf(films, 0.6 * self.sesgo, 10)[rango]
+        
+        self.film_duracion = rng.integers(3, 8, films).astype(np.int16)
+        self.film_tarifa = rng.choice([0.99, 2.99, 4.99], films)
+        self.film_categoria = rng.choice(len(CATEGORIAS), films,
+                                         p=_pesos_zipf(len(CATEGORIAS), 0.5 * self.sesgo)) + 1
+        
+        # Copias: ~4% de films sin inventario; los populares tienen más (2 a 8)
+        percentil = 1.0 - rango / max(1, films - 1)
+        self.film_copias = 2 + rng.binomial(6, 0.5 + min(1.0, self.sesgo) * (0.6 * percentil - 0.3))
+        self.film_copias[rng.random(films) < 0.042] = 0
+        self.inventario_fin = np.cumsum(self.film_copias)
+        self.inventario_inicio = self.inventario_fin - self.film_copias
+        self.filas['inventory'] = int(self.inventario_fin[-1])
+        
+        # Solo se rentan films con copias
+        pesos = popularidad * (self.film_copias > 0)
+        self.cdf_film = np.cumsum(pesos / pesos.sum())
+        
+        self.cdf_tienda = np.cumsum(_pesos_zipf(self.filas['store'], 0.5 * self.sesgo))
+        
+        # Fechas: estacionalidad anual con pico en julio y fin de semana más cargado
+        dias = self.fecha_inicio.astype('datetime64[D]') + np.arange(self.dias)
+        dia_anio = (dias - dias.astype('datetime64[Y]')).astype(int)
+        dia_semana = (dias.astype(int) + 3) % 7  # 0 = lunes
+        estacion = 1 + 0.5 * np.cos(2 * np.pi * (dia_anio - 196) / 365.25)
+        semana = np.where(dia_semana >= 4, 1.3, 0.9)
+        pesos_dia = 1 + self.sesgo * (estacion * semana - 1)
+        self.cdf_dia = np.cumsum(pesos_dia / pesos_dia.sum())
+    
+    def _elegir(self, cdf: np.ndarray, u: np.ndarray) -> np.ndarray:
+        """Índices 0..n-1 según una distribución acumulada y uniformes u"""
+        return np.minimum(np.searchsorted(cdf, u, side='right'), len(cdf) - 1)
+    
+    def _tienda_de_inventario(self, inventory_id: np.ndarray) -> np.ndarray:
+        """Tienda de cada copia (función del ID, así rentas e inventario coinciden)"""
+        return self._elegir(self.cdf_tienda, _hash_uniforme(inventory_id, self.semilla)) + 1
+    
+    def _sucias(self, rng: np.random.Generator, n: int, tipos: int) -> np.ndarray:
+        """Tipo de suciedad por fila: -1 limpia, 0..tipos-1 sucia"""
+        tipo = rng.integers(0, tipos, n)
+        tipo[rng.random(n) >= self.tasa_sucios] = -1
+        return tipo
+    
+    def _bloques(self, total: int) -> Iterator[tuple]:
+        """(número de bloque, IDs) de BLOQUE en BLOQUE"""
+        for bloque, inicio in enumerate(range(1, total + 1, BLOQUE)):
+            yield bloque, np.arange(inicio, min(inicio + BLOQUE, total + 1))
+    
+    def generar_country(self) -> Iterator[pd.DataFrame]:
+        """Países"""
+        for _, ids in self._bloques(self.filas['country']):
+            yield pd.DataFrame({'country_id': ids, 'country': [f"Country {i}" for i in ids],
+                                'last_update': ULTIMA_ACTUALIZACION})
+    
+    def generar_city(self) -> Iterator[pd.DataFrame]:
+        """Ciudades repartidas entre países"""
+        for bloque, ids in self._bloques(self.filas['city']):
+            rng = self._rng('city', bloque)
+            yield pd.DataFrame({'city_id': ids, 'city': [f"City {i}" for i in ids],
+                                'country_id': rng.integers(1, self.filas['country'] + 1, len(ids)),
+                                'last_update': ULTIMA_ACTUALIZACION})
+    
+    def generar_address(self) -> Iterator[pd.DataFrame]:
+        """Direcciones (sin el campo GEOMETRY, que el extractor no lee)"""
+        for bloque, ids in self._bloques(self.filas['address']):
+            rng = self._rng('address', bloque)
+            numeros = rng.integers(1, 2000, len(ids))
+            calles = rng.choice(SUSTANTIVOS, len(ids))
+            yield pd.DataFrame({
+                'address_id': ids,
+                'address': [f"{n} {c.title()} Street" for n, c in zip(numeros, calles)],
+                'address2': '',
+                'district': rng.choice(ADJETIVOS, len(ids)),
+                'city_id': rng.integers(1, self.filas['city'] + 1, len(ids)),
+                'postal_code': [f"{p:05d}" for p in rng.integers(0, 100000, len(ids))],
+                'phone': [f"{p:012d}" for p in rng.integers(0, 10**12, len(ids))],
+                'last_update': ULTIMA_ACTUALIZACION
+            })
+    
+    def generar_store(self) -> Iterator[pd.DataFrame]:
+        """Tiendas (cada una en su dirección y con su encargado)"""
+        for _, ids in self._bloques(self.filas['store']):
+            yield pd.DataFrame({'store_id': ids, 'manager_staff_id': ids, 'address_id': ids,
+                                'last_update': ULTIMA_ACTUALIZACION})
+    
+    def generar_category(self) -> Iterator[pd.DataFrame]:
+        """Las 16 categorías de Sakila"""
+        yield pd.DataFrame({'category_id': np.arange(1, len(CATEGORIAS) + 1), 'name': CATEGORIAS,
+                            'last_update': ULTIMA_ACTUALIZACION})
+    
+    def generar_film(self) -> Iterator[pd.DataFrame]:
+        """
+        Films; sucios: tarifa negativa o fuera de rango, duración inválida,
+        título sin normalizar (minúsculas con espacios)
+        """
+        for bloque, ids in self._bloques(self.filas['film']):
+            rng = self._rng('film', bloque + 1)
+            n = len(ids)
+            titulos = [f"{a} {s}" for a, s in zip(rng.choice(ADJETIVOS, n), rng.choice(SUSTANTIVOS, n))]
+            df = pd.DataFrame({
+                'film_id': ids,
+                'title': titulos,
+                'description': [f"A {r.lower()} story of a {s.lower()}"
+                                for r, s in zip(rng.choice(ADJETIVOS, n), rng.choice(SUSTANTIVOS, n))],
+                'release_year': rng.integers(1990, 2007, n),
+                'language_id': 1,
+                'rental_duration': self.film_duracion[ids - 1],
+                'rental_rate': self.film_tarifa[ids - 1],
+                'length': rng.integers(46, 186, n),
+                'replacement_cost': rng.integers(9, 30, n) + 0.99,
+                'rating': rng.choice(RATINGS, n),
+                'special_features': rng.choice(['Trailers', 'Commentaries', 'Deleted Scenes',
+                                                'Behind the Scenes', 'Trailers,Deleted Scenes'], n),
+                'last_update': ULTIMA_ACTUALIZACION
+            })
+            
+            sucias = self._sucias(rng, n, 3)
+            df.loc[sucias == 0, 'rental_rate'] = -rng.choice([0.99, 2.99], (sucias == 0).sum())
+            df.loc[sucias == 1, 'length'] = rng.choice([0, 600], (sucias == 1).sum())
+            df.loc[sucias == 2, 'title'] = "  " + df.loc[sucias == 2, 'title'].str.lower() + " "
+            self._contar_sucias('film', sucias)
+            yield df
+    
+    def generar_film_category(self) -> Iterator[pd.DataFrame]:
+        """Una categoría por film (con sesgo entre categorías)"""
+        for _, ids in self._bloques(self.filas['film']):
+            yield pd.DataFrame({'film_id': ids, 'category_id': self.film_categoria[ids - 1],
+                                'last_update': ULTIMA_ACTUALIZACION})
+    
+    def generar_inventory(self) -> Iterator[pd.DataFrame]:
+        """Copias contiguas por film; sucias: film_id huérfano"""
+        for bloque, ids in self._bloques(self.filas['inventory']):
+            rng = self._rng('inventory', bloque)
+            film_id = np.searchsorted(self.inventario_fin, ids - 1, side='right') + 1
+            sucias = self._sucias(rng, len(ids), 1)
+            film_id[sucias == 0] = self.filas['film'] + rng.integers(1, 1000, (sucias == 0).sum())
+            self._contar_sucias('inventory', sucias)
+            yield pd.DataFrame({'inventory_id': ids, 'film_id': film_id,
+                                'store_id': self._tienda_de_inventario(ids),
+                                'last_update': ULTIMA_ACTUALIZACION})
+    
+    def generar_rental_payment(self) -> Iterator[tuple]:
+        """
+        Rentas y su pago (payment_id = rental_id), bloque a bloque
+        
+        Film según popularidad, copia al azar entre las del film (la tienda
+        sale de la copia), fecha según la estacionalidad y hora con pico por
+        la tarde. Se devuelve a los rental_duration ± días del film (~1%
+        sin devolver); el pago es la tarifa más $1 por día de atraso.
+        
+        Sucias en rental: customer_id nulo, devolución antes de la renta,
+        fecha futura, inventory_id huérfano. En payment: monto nulo,
+        negativo o excesivo (> $100) y fecha futura.
+        """
+        for bloque, ids in self._bloques(self.filas['rental']):
+            rng = self._rng('rental', bloque)
+            n = len(ids)
+            
+            film = self._elegir(self.cdf_film, rng.random(n))
+            inventory_id = (self.inventario_inicio[film] + 1 +
+                            (rng.random(n) * self.film_copias[film]).astype(np.int64))
+            tienda = self._tienda_de_inventario(inventory_id)
+            
+            dia = self._elegir(self.cdf_dia, rng.random(n))
+            segundos = (np.clip(rng.normal(17, 3.5, n), 8, 23.99) * 3600).astype(np.int64)
+            rental_date = self.fecha_inicio + (dia * 86400 + segundos).astype('timedelta64[s]')
+            
+            dias_renta = np.maximum(1, self.film_duracion[film] + rng.integers(-2, 4, n))
+            return_date = rental_date + (dias_renta * 86400 + rng.integers(0, 86400, n)).astype('timedelta64[s]')
+            return_date[rng.random(n) < 0.011] = np.datetime64('NaT')
+            
+            atraso = np.maximum(0, dias_renta - self.film_duracion[film])
+            amount = np.round(self.film_tarifa[film] + atraso, 2)
+            customer_id = pd.array(rng.integers(1, self.filas['customer'] + 1, n), dtype='Int64')
+            
+            rental = pd.DataFrame({'rental_id': ids, 'rental_date': rental_date,
+                                   'inventory_id': inventory_id, 'customer_id': customer_id,
+                                   'return_date': return_date, 'staff_id': tienda,
+                                   'last_update': ULTIMA_ACTUALIZACION})
+            payment = pd.DataFrame({'payment_id': ids, 'customer_id': customer_id, 'staff_id': tienda,
+                                    'rental_id': ids, 'amount': amount, 'payment_date': rental_date,
+                                    'last_update': ULTIMA_ACTUALIZACION})
+            
+            sucias = self._sucias(rng, n, 4)
+            rental.loc[sucias == 0, 'customer_id'] = pd.NA
+            rental.loc[sucias == 1, 'return_date'] = (rental.loc[sucias == 1, 'rental_date'] -
+                                                      pd.to_timedelta(rng.integers(1, 6, (sucias == 1).sum()), unit='D'))
+            rental.loc[sucias == 2, 'rental_date'] = FECHA_FUTURA + rng.integers(
+                0, 365, (sucias == 2).sum()).astype('timedelta64[D]')
+            rental.loc[sucias == 3, 'inventory_id'] = self.filas['inventory'] + rng.integers(1, 1000, (sucias == 3).sum())
+            self._contar_sucias('rental', sucias)
+            
+            sucias = self._sucias(rng, n, 4)
+            payment.loc[sucias == 0, 'amount'] = np.nan
+            payment.loc[sucias == 1, 'amount'] = -payment.loc[sucias == 1, 'amount']
+            payment.loc[sucias == 2, 'amount'] = np.round(rng.uniform(100.01, 500, (sucias == 2).sum()), 2)
+            payment.loc[sucias == 3, 'payment_date'] = FECHA_FUTURA + rng.integers(
+                0, 365, (sucias == 3).sum()).astype('timedelta64[D]')
+            self._contar_sucias('payment', sucias)
+            
+            yield rental, payment
+    
+    def _contar_sucias(self, tabla: str, sucias: np.ndarray) -> None:
+        """Acumula filas sucias generadas por tabla"""
+        self.estadisticas.setdefault(tabla, {'filas': 0, 'sucias': 0})['sucias'] += int((sucias >= 0).sum())
+    
+    def generar(self, engine=None, directorio: Path = None) -> Dict[str, Dict[str, int]]:
+        """
+        Genera todas las tablas y las escribe bloque a bloque
+        
+        Args:
+            engine: Engine de la base de datos destino (las tablas se reemplazan)
+            directorio: Carpeta para un CSV por tabla (alternativa a engine)
+        
+        Returns:
+            Diccionario tabla -> {filas, sucias}
+        """
+        if (engine is None) == (directorio is None):
+            raise ValueError("Indicar engine o directorio (uno solo)")
+        if directorio is not None:
+            directorio = Path(directorio)
+            directorio.mkdir(parents=True, exist_ok=True)
+        
+        self.estadisticas = {}
+        escritas = set()
+        
+        def escribir(tabla: str, df: pd.DataFrame) -> None:
+            primero = tabla not in escritas
+            escritas.add(tabla)
+            if engine is not None:
+                df.to_sql(tabla, engine, if_exists='replace' if primero else 'append', index=False,
+                          chunksize=Config.ETL_BATCH_SIZE * 10, method='multi')
+            else:
+                df.to_csv(directorio / f"{tabla}.csv", mode='w' if primero else 'a',
+                          header=primero, index=False)
+            self.estadisticas.setdefault(tabla, {'filas': 0, 'sucias': 0})['filas'] += len(df)
+        
+        for tabla in self.TABLAS:
+            if tabla == 'payment':
+                continue
+            
+            if tabla == 'rental':
+                for rental, payment in self.generar_rental_payment():
+                    escribir('rental', rental)
+                    escribir('payment', payment)
+            else:
+                for df in getattr(self, f"generar_{tabla}")():
+                    escribir(tabla, df)
+            self.logger.info(f"✅ {tabla}: {self.estadisticas[tabla]['filas']:,} filas")
+        
+        if engine is not None:
+            self._crear_llaves(engine)
+        
+        self.logger.info("📊 Filas sucias: " + ", ".join(
+            f"{t} {e['sucias']:,}" for t, e in self.estadisticas.items() if e['sucias']))
+        return self.estadisticas
+    
+    @staticmethod
+    def _crear_llaves(engine) -> None:
+        """Llaves primarias como en Sakila (to_sql crea las tablas sin ellas)"""
+        llaves = {
+            'country': 'country_id', 'city': 'city_id', 'address': 'address_id',
+            'store': 'store_id', 'category': 'category_id', 'film': 'film_id',
+            'film_category': 'film_id, category_id', 'inventory': 'inventory_id',
+            'rental': 'rental_id', 'payment': 'payment_id'
+        }
+        with engine.begin() as conn:
+            for tabla, columnas in llaves.items():
+                conn.execute(text(f"ALTER TABLE {tabla} ADD PRIMARY KEY ({columnas})"))
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador de datos sintéticos con forma de Sakila')
+    parser.add_argument('--escala', type=float, default=1.0,
+                        help='Factor sobre los volúmenes de Sakila (1, 10, 100, 1000)')
+    parser.add_argument('--semilla', type=int, default=42,
+                        help='Semilla (misma semilla y escala = mismos datos)')
+    parser.add_argument('--sucios', type=float, default=0.0,
+                        help='Fracción de filas sucias en rental, payment, film e inventory (ej: 0.01)')
+    parser.add_argument('--sesgo', type=float, default=1.0,
+                        help='Intensidad del sesgo de films, tiendas, categorías y fechas (0 = uniforme)')
+    parser.add_argument('--esquema', default='sakila_sintetico',
+                        help='Base de datos destino en el servidor de Sakila (se crea si no existe)')
+    parser.add_argument('--csv', type=Path, default=None,
+                        help='Escribir un CSV por tabla en esta carpeta en vez de la base de datos')
+    args = parser.parse_args()
+    
+    generador = SakilaGenerator(escala=args.escala, semilla=args.semilla,
+                                tasa_sucios=args.sucios, sesgo=args.sesgo)
+    
+    if args.csv is not None:
+        generador.generar(directorio=args.csv)
+        return
+    
+    cfg = Config.SAKILA_CONFIG
+    servidor = f"mysql+pymysql://{cfg['user']}:{cfg['password']}@{cfg['host']}:{cfg['port']}"
+    engine = create_engine(servidor)
+    with engine.connect() as conn:
+        conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {args.esquema}"))
+        conn.commit()
+    engine.dispose()
+    
+    engine = create_engine(f"{servidor}/{args.esquema}")
+    try:
+        generador.generar(engine=engine)
+        print(f"Para extraer estos datos: SAKILA_DATABASE={args.esquema}")
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
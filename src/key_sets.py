@@ -0,0 +1,161 @@
+"""
+Conjuntos de llaves compactos para verificar integridad referencial en memoria
+RF8: Validaciones de calidad de datos
+
+Las llaves de las tablas padre se cargan una vez por ejecución y se
+reutilizan en todos los checks de FK. Hay dos estructuras:
+- SortedKeySet: array NumPy ordenado, búsqueda exacta con searchsorted
+- BloomFilter: bits + k hashes, sin falsos negativos; los aciertos se
+  confirman con una segunda pasada exacta
+"""
+
+import math
+import threading
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Tuple
+
+class SortedKeySet:
+    """Conjunto exacto de llaves como array NumPy ordenado"""
+    
+    def __init__(self, llaves):
+        """
+        Args:
+            llaves: Array o Serie de llaves (se ignoran nulos y repetidos)
+        """
+        llaves = pd.Series(llaves).dropna()
+        self.llaves = np.unique(llaves.to_numpy())
+    
+    def __len__(self):
+        return len(self.llaves)
+    
+    @property
+    def exacto(self) -> bool:
+        return True
+    
+    def contiene(self, valores) -> np.ndarray:
+        """
+        Busca un lote de valores en el conjunto
+        
+        Args:
+            valores: Array de valores a buscar
+        
+        Returns:
+            Máscara booleana, True si el valor está en el conjunto
+        """
+        valores = np.asarray(valores)
+        if len(self.llaves) == 0:
+            return np.zeros(len(valores), dtype=bool)
+        
+        posiciones = np.searchsorted(self.llaves, valores)
+        posiciones = np.minimum(posiciones, len(self.llaves) - 1)
+        return self.llaves[posiciones] == valores
+    
+    @property
+    def bytes(self) -> int:
+        return self.llaves.nbytes
+
+class BloomFilter:
+    """Filtro de Bloom vectorizado (doble hashing sobre hash_array de pandas)"""
+    
+    def __init__(self, capacidad: int, tasa_falsos_positivos: float = 0.01):
+        """
+        Args:
+            capacidad: Número esperado de llaves
+            tasa_falsos_positivos: Probabilidad objetivo de falso positivo
+        """
+        capacidad = max(1, capacidad)
+        self.m = max(8, math.ceil(-capacidad * math.log(tasa_falsos_positivos) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacidad * math.log(2)))
+        # Un bit por posición, empaquetado en bytes
+        self.bits = np.zeros((self.m + 7) // 8, dtype=np.uint8)
+    
+    @property
+    def exacto(self) -> bool:
+        return False
+    
+    def _posiciones(self, valores: np.ndarray) -> np.ndarray:
+        """Matriz (n, k) de posiciones de bit para cada valor"""
+        h1 = pd.util.hash_array(valores)
+        # Segundo hash independiente: re-mezclar h1 con una constante
+        h2 = pd.util.hash_array(h1 ^ np.uint64(0x9E3779B97F4A7C15)) | np.uint64(1)
+        i = np.arange(self.k, dtype=np.uint64)
+        return ((h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.m)).astype(np.int64)
+    
+    def agregar(self, valores) -> None:
+        """Agrega un lote de llaves al filtro"""
+        valores = pd.Series(valores).dropna().to_numpy()
+        if len(valores) > 0:
+            posiciones = self._posiciones(valores).ravel()
+            np.bitwise_or.at(self.bits, posiciones >> 3,
+                             (1 << (posiciones & 7)).astype(np.uint8))
+    
+    def contiene(self, valores) -> np.ndarray:
+        """
+        Busca un lote de valores en el filtro
+        
+        Args:
+            valores: Array de valores a buscar
+        
+        Returns:
+            Máscara booleana; False es definitivo, True puede ser falso positivo
+        """
+        valores = np.asarray(valores)
+        if len(valores) == 0:
+            return np.zeros(0, dtype=bool)
+        posiciones = self._posiciones(valores)
+        activos = (self.bits[posiciones >> 3] >> (posiciones & 7).astype(np.uint8)) & 1
+        return activos.all(axis=1).astype(bool)
+    
+    @property
+    def bytes(self) -> int:
+        return self.bits.nbytes
+
+class KeySetCache:
+    """
+    Caché de conjuntos de llaves de tablas padre, compartida entre checks de FK
+    
+    Una sola instancia por ejecución, compartida por los validadores PRE,
+    POST y de reconciliación. Los workers del planificador DAG la usan a la
+    vez: un lock evita cargar dos veces el mismo conjunto. La limpieza de
+    staging invalida las tablas que modifica.
+    """
+    
+    def __init__(self):
+        self._conjuntos: Dict[Tuple[str, str, str], object] = {}
+        self._lock = threading.Lock()
+    
+    def obtener(self, tabla: str, columna: str, estructura: str,
+                cargador: Callable[[], pd.Series]):
+        """
+        Retorna el conjunto de llaves de tabla.columna, construyéndolo si no existe
+        
+        Args:
+            tabla: Tabla padre
+            columna: Columna PK
+            estructura: 'ordenado' o 'bloom'
+            cargador: Función que lee las llaves de la tabla
+        
+        Returns:
+            SortedKeySet o BloomFilter
+        """
+        clave = (tabla, columna, estructura)
+        with self._lock:
+            if clave not in self._conjuntos:
+                llaves = cargador()
+                if estructura == 'bloom':
+                    conjunto = BloomFilter(len(llaves))
+                    conjunto.agregar(llaves)
+                else:
+                    conjunto = SortedKeySet(llaves)
+                self._conjuntos[clave] = conjunto
+            return self._conjuntos[clave]
+    
+    def invalidar(self, tabla: str = None) -> None:
+        """Descarta los conjuntos de una tabla (o todos)"""
+        with self._lock:
+            if tabla is None:
+                self._conjuntos.clear()
+            else:
+                for clave in [c for c in self._conjuntos if c[0] == tabla]:
+                    del self._conjuntos[clave]
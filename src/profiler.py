@@ -0,0 +1,470 @@
+"""
+Perfil de rendimiento por ejecución del ETL
+RF7: Auditoría / logging
+
+Mide cada fase, tabla y tarea del ETL (bloques `medir`) y cada sentencia
+SQL, con eventos de cursor de SQLAlchemy registrados sobre la clase Engine
+(cubren todos los engines del proceso). Por bloque se guarda:
+
+- duración, tiempo esperando a la base de datos y CPU de Python
+- filas leídas/escritas y filas por segundo
+- bytes enviados y recibidos (estimados sobre una muestra de filas)
+- RSS pico del proceso
+
+Al terminar se escribe un perfil JSON y una línea de tiempo en formato
+Chrome trace (se abre en chrome://tracing o ui.perfetto.dev), ambos con el
+etl_id en el nombre.
+
+Las lecturas con stream_results (cursor de servidor) no exponen sus filas
+al ejecutar: quien las consume las suma con `anotar`.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Sentencias que devuelven filas (el resto cuenta como escritura)
+LECTURAS = ('SELECT', 'SHOW', 'WITH', 'CHECKSUM', 'DESCRIBE', 'EXPLAIN')
+
+# Filas usadas para estimar el tamaño medio de un resultado o lote
+MUESTRA_BYTES = 50
+
+# Sentencias individuales en la línea de tiempo (el perfil las agrega todas)
+MAX_EVENTOS_SQL = 20000
+
+CONTADORES = ('sentencias', 'bd_s', 'cpu_s', 'filas_leidas', 'filas_escritas',
+              'bytes_enviados', 'bytes_recibidos')
+
+_activo: Optional['ETLProfiler'] = None
+
+def rss_pico_mb() -> Optional[float]:
+    """RSS máximo del proceso hasta ahora en MB (None si no está disponible)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KB y macOS en bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _bytes_fila(fila) -> int:
+    """Tamaño aproximado de una fila o juego de parámetros"""
+    if fila is None:
+        return 0
+    if isinstance(fila, dict):
+        valores = fila.values()
+    else:
+        valores = fila if isinstance(fila, (list, tuple)) else [fila]
+    return sum(len(v) if isinstance(v, (bytes, bytearray)) else len(str(v))
+               for v in valores if v is not None)
+
+def _estimar_bytes(filas, total: int) -> int:
+    """Bytes de `total` filas extrapolando el tamaño medio de las primeras"""
+    muestra = list(filas[:MUESTRA_BYTES]) if filas else []
+    if not muestra:
+        return 0
+    return int(sum(_bytes_fila(f) for f in muestra) / len(muestra) * total)
+
+class Medicion:
+    """Bloque medido (fase, tabla o tarea) con sus contadores"""
+    
+    def __init__(self, nombre: str, categoria: str, padre: Optional['Medicion'], origen: float):
+        self.nombre = nombre
+        self.categoria = categoria
+        self.padre = padre
+        self.hilo = threading.current_thread()
+        self.inicio = time.perf_counter() - origen
+        self.fin: Optional[float] = None
+        self._cpu_inicio = time.thread_time()
+        self.contadores = dict.fromkeys(CONTADORES, 0)
+        # CPU de este hilo gastada dentro de sentencias SQL (ya contada en bd_s)
+        self._cpu_en_sql = 0.0
+        self.rss_pico_mb: Optional[float] = None
+    
+    def ancestros(self):
+        """Este bloque y sus padres, del más interno al más externo"""
+        medicion = self
+        while medicion is not None:
+            yield medicion
+            medicion = medicion.padre
+    
+    def a_dict(self) -> Dict[str, Any]:
+        """Resumen del bloque para el perfil JSON"""
+        c = self.contadores
+        duracion = (self.fin or 0) - self.inicio
+        filas = c['filas_leidas'] + c['filas_escritas']
+        return {
+            'nombre': self.nombre,
+            'categoria': self.categoria,
+            'padre': self.padre.nombre if self.padre else None,
+            'hilo': self.hilo.name,
+            'inicio_s': round(self.inicio, 3),
+            'duracion_s': round(duracion, 3),
+            'bd_s': round(c['bd_s'], 3),
+            'cpu_s': round(c['cpu_s'], 3),
+            'sentencias': c['sentencias'],
+            'filas_leidas': c['filas_leidas'],
+            'filas_escritas': c['filas_escritas'],
+            'filas_por_s': round(filas / duracion, 1) if duracion > 0 else None,
+            'bytes_enviados': c['bytes_enviados'],
+            'bytes_recibidos': c['bytes_recibidos'],
+            'rss_pico_mb': self.rss_pico_mb
+        }
+
+class ETLProfiler:
+    """Perfil de una ejecución: bloques medidos, sentencias SQL y memoria"""
+    
+    def __init__(self, directorio: Path):
+        """
+        Args:
+            directorio: Carpeta donde se escriben perfil y línea de tiempo
+        """
+        self.directorio = Path(directorio)
+        self.inicio = datetime.now()
+        self._origen = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.mediciones: List[Medicion] = []
+        self.totales = dict.fromkeys(CONTADORES, 0)
+        self._eventos_sql: List[Dict[str, Any]] = []
+        self._sql_agregado: Dict[str, Dict[str, Any]] = {}
+        self.duracion: Optional[float] = None
+    
+    def iniciar(self) -> 'ETLProfiler':
+        """Registra los eventos de cursor y activa `medir`/`anotar` en el proceso"""
+        global _activo
+        event.listen(Engine, 'before_cursor_execute', self._antes_sql)
+        event.listen(Engine, 'after_cursor_execute', self._despues_sql)
+        event.listen(Engine, 'handle_error', self._error_sql)
+        _activo = self
+        return self
+    
+    def detener(self) -> None:
+        """Quita los eventos de cursor y fija la duración total"""
+        global _activo
+        if event.contains(Engine, 'before_cursor_execute', self._antes_sql):
+            event.remove(Engine, 'before_cursor_execute', self._antes_sql)
+            event.remove(Engine, 'after_cursor_execute', self._despues_sql)
+            event.remove(Engine, 'handle_error', self._error_sql)
+        if _activo is self:
+            _activo = None
+        if self.duracion is None:
+            self.duracion = time.perf_counter() - self._origen
+    
+    @property
+    def _pila(self) -> List[Medicion]:
+        """Bloques abiertos en el hilo actual"""
+        if not hasattr(self._local, 'pila'):
+            self._local.pila = []
+        return self._local.pila
+    
+    def actual(self) -> Optional[Medicion]:
+        """Bloque abierto más interno del hilo actual"""
+        pila = self._pila
+        return pila[-1] if pila else None
+    
+    @contextmanager
+    def medir(self, nombre: str, categoria: str, padre: Medicion = None):
+        """
+        Mide un bloque de código
+        
+        Las sentencias SQL del bloque se suman también a sus padres. Un
+        bloque que corre en otro hilo (worker de un pool) recibe su padre
+        explícito; al cerrar suma su CPU a ese padre, cuyo hilo no la ve.
+        
+        Args:
+            nombre: Nombre del bloque (ej: 'EXTRACCION', 'rental', 'fact:2005-07')
+            categoria: Fase o tipo de bloque (ej: 'fase', 'extraccion')
+            padre: Bloque contenedor (default: el abierto en este hilo)
+        """
+        medicion = Medicion(nombre, categoria, padre or self.actual(), self._origen)
+        self._pila.append(medicion)
+        try:
+            yield medicion
+        finally:
+            self._pila.pop()
+            cpu = time.thread_time() - medicion._cpu_inicio - medicion._cpu_en_sql
+            medicion.fin = time.perf_counter() - self._origen
+            medicion.rss_pico_mb = rss_pico_mb()
+            with self._lock:
+                medicion.contadores['cpu_s'] += cpu
+                padre = medicion.padre
+                if padre is not None and padre.hilo is not medicion.hilo:
+                    for ancestro in padre.ancestros():
+                        ancestro.contadores['cpu_s'] += medicion.contadores['cpu_s']
+                if medicion.padre is None:
+                    self.totales['cpu_s'] += medicion.contadores['cpu_s']
+                self.mediciones.append(medicion)
+    
+    def anotar(self, **contadores) -> None:
+        """Suma contadores (filas_leidas, bytes_recibidos...) al bloque actual y sus padres"""
+        with self._lock:
+            for medicion in (self.actual().ancestros() if self.actual() else ()):
+                for clave, valor in contadores.items():
+                    medicion.contadores[clave] += valor
+            for clave, valor in contadores.items():
+                self.totales[clave] += valor
+    
+    def _antes_sql(self, conn, cursor, statement, parameters, context, executemany):
+        """Marca el inicio de una sentencia (pila por conexión, admite anidadas)"""
+        conn.info.setdefault('perfil_inicio', []).append((time.perf_counter(), time.thread_time()))
+    
+    def _error_sql(self, contexto):
+        """Descarta el inicio de una sentencia fallida (no llega a after_cursor_execute)"""
+        if contexto.connection is not None:
+            pila = contexto.connection.info.get('perfil_inicio')
+            if pila:
+                pila.pop()
+    
+    def _despues_sql(self, conn, cursor, statement, parameters, context, executemany):
+        """Atribuye tiempo, filas y bytes de una sentencia al bloque actual"""
+        pila = conn.info.get('perfil_inicio')
+        if not pila:
+            return
+        inicio, cpu_inicio = pila.pop()
+        fin = time.perf_counter()
+        duracion = fin - inicio
+        cpu_sql = time.thread_time() - cpu_inicio
+        
+        # Filas y bytes según el tipo de sentencia
+        verbo = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        enviados = len(statement)
+        leidas = escritas = recibidos = 0
+        if executemany and parameters:
+            enviados += _estimar_bytes(parameters, len(parameters))
+        else:
+            enviados += _bytes_fila(parameters) if parameters else 0
+        
+        filas = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else 0
+        if verbo in LECTURAS:
+            streaming = context is not None and context.execution_options.get('stream_results')
+            if not streaming:
+                # pymysql trae el resultado completo al ejecutar
+                resultado = getattr(cursor, '_rows', None)
+                leidas = len(resultado) if resultado is not None else filas
+                recibidos = _estimar_bytes(resultado, leidas)
+        else:
+            escritas = filas
+        
+        actual = self.actual()
+        medidos = {'sentencias': 1, 'bd_s': duracion, 'filas_leidas': leidas,
+                   'filas_escritas': escritas, 'bytes_enviados': enviados,
+                   'bytes_recibidos': recibidos}
+        
+        with self._lock:
+            if actual is not None:
+                for medicion in actual.ancestros():
+                    if medicion.hilo is actual.hilo:
+                        medicion._cpu_en_sql += cpu_sql
+                    for clave, valor in medidos.items():
+                        medicion.contadores[clave] += valor
+            for clave, valor in medidos.items():
+                self.totales[clave] += valor
+            
+            texto = ' '.join(statement.split())
+            agregado = self._sql_agregado.setdefault(texto[:200], {
+                'sql': texto[:200], 'veces': 0, 'bd_s': 0.0, 'filas': 0, 'bytes': 0})
+            agregado['veces'] += 1
+            agregado['bd_s'] += duracion
+            agregado['filas'] += leidas + escritas
+            agregado['bytes'] += enviados + recibidos
+            
+            if len(self._eventos_sql) < MAX_EVENTOS_SQL:
+                self._eventos_sql.append({
+                    'nombre': f"{verbo} {texto[len(verbo):len(verbo) + 60].strip()}",
+                    'sql': texto[:500],
+                    'hilo': threading.current_thread(),
+                    'inicio': inicio - self._origen,
+                    'duracion': duracion,
+                    'filas': leidas + escritas,
+                    'bytes': enviados + recibidos,
+                    'bloque': actual.nombre if actual else None
+                })
+    
+    def resumen(self, etl_id: Optional[int] = None, extra: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Perfil completo de la ejecución
+        
+        Args:
+            etl_id: Ejecución perfilada
+            extra: Datos adicionales (ej: ruta crítica del DAG)
+        
+        Returns:
+            Diccionario serializable con totales, bloques por categoría y SQL más costoso
+        """
+        duracion = self.duracion if self.duracion is not None else time.perf_counter() - self._origen
+        totales = {clave: round(valor, 3) if isinstance(valor, float) else valor
+                   for clave, valor in self.totales.items()}
+        totales['otro_s'] = round(max(0.0, duracion - self.totales['bd_s'] - self.totales['cpu_s']), 3)
+        
+        mediciones = sorted((m.a_dict() for m in self.mediciones), key=lambda m: m['inicio_s'])
+        por_categoria: Dict[str, Dict[str, Any]] = {}
+        for medicion in mediciones:
+            grupo = por_categoria.setdefault(medicion['categoria'], dict(
+                {'bloques': 0, 'duracion_s': 0.0}, **dict.fromkeys(CONTADORES, 0)))
+            grupo['bloques'] += 1
+            grupo['duracion_s'] = round(grupo['duracion_s'] + medicion['duracion_s'], 3)
+            for clave in CONTADORES:
+                grupo[clave] = round(grupo[clave] + medicion[clave], 3)
+        
+        sql_top = sorted(self._sql_agregado.values(), key=lambda s: s['bd_s'], reverse=True)[:20]
+        
+        return {
+            'etl_id': etl_id,
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'duracion_s': round(duracion, 3),
+            'rss_pico_mb': rss_pico_mb(),
+            'totales': totales,
+            'por_categoria': por_categoria,
+            'mediciones': mediciones,
+            'sql_top': [dict(s, bd_s=round(s['bd_s'], 4)) for s in sql_top],
+            **(extra or {})
+        }
+    
+    def linea_de_tiempo(self) -> Dict[str, Any]:
+        """
+        Línea de tiempo en formato Chrome trace (eventos 'X' en microsegundos)
+        
+        Returns:
+            Diccionario con traceEvents: un carril por hilo con bloques y
+            sentencias SQL anidadas, más un contador de RSS pico
+        """
+        pid = os.getpid()
+        hilos: Dict[int, int] = {}
+        eventos = [{'ph': 'M', 'name': 'process_name', 'pid': pid, 'args': {'name': 'ETL Sakila'}}]
+        
+        def tid(hilo: threading.Thread) -> int:
+            if hilo.ident not in hilos:
+                hilos[hilo.ident] = len(hilos) + 1
+                eventos.append({'ph': 'M', 'name': 'thread_name', 'pid': pid,
+                                'tid': hilos[hilo.ident], 'args': {'name': hilo.name}})
+            return hilos[hilo.ident]
+        
+        for medicion in sorted(self.mediciones, key=lambda m: m.inicio):
+            datos = medicion.a_dict()
+            eventos.append({
+                'ph': 'X', 'name': medicion.nombre, 'cat': medicion.categoria,
+                'pid': pid, 'tid': tid(medicion.hilo),
+                'ts': round(medicion.inicio * 1e6), 'dur': round(datos['duracion_s'] * 1e6),
+                'args': {k: v for k, v in datos.items() if k not in ('nombre', 'categoria', 'hilo', 'inicio_s')}
+            })
+            if medicion.rss_pico_mb is not None:
+                eventos.append({'ph': 'C', 'name': 'rss_pico_mb', 'pid': pid,
+                                'ts': round(medicion.fin * 1e6), 'args': {'MB': medicion.rss_pico_mb}})
+        
+        for sql in self._eventos_sql:
+            eventos.append({
+                'ph': 'X', 'name': sql['nombre'], 'cat': 'sql', 'pid': pid, 'tid': tid(sql['hilo']),
+                'ts': round(sql['inicio'] * 1e6), 'dur': round(sql['duracion'] * 1e6),
+                'args': {'sql': sql['sql'], 'filas': sql['filas'], 'bytes': sql['bytes'],
+                         'bloque': sql['bloque']}
+            })
+        
+        return {'traceEvents': eventos, 'displayTimeUnit': 'ms'}
+    
+    def guardar(self, etl_id: Optional[int] = None, extra: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Escribe perfil JSON y línea de tiempo de la ejecución
+        
+        Args:
+            etl_id: Ejecución perfilada (sin etl_id se usa la hora de inicio)
+            extra: Datos adicionales para el perfil
+        
+        Returns:
+            Perfil escrito, con las rutas de ambos archivos en 'archivos'
+        """
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        base = f"etl_{etl_id}" if etl_id is not None else f"etl_{self.inicio.strftime('%Y%m%d_%H%M%S')}"
+        ruta_perfil = self.directorio / f"{base}_perfil.json"
+        ruta_traza = self.directorio / f"{base}_trace.json"
+        
+        perfil = self.resumen(etl_id, extra)
+        perfil['archivos'] = {'perfil': str(ruta_perfil), 'trace': str(ruta_traza)}
+        
+        ruta_perfil.write_text(json.dumps(perfil, ensure_ascii=False, indent=2, default=str), encoding='utf-8')
+        ruta_traza.write_text(json.dumps(self.linea_de_tiempo(), default=str), encoding='utf-8')
+        return perfil
+    
+    @staticmethod
+    def perfil_anterior(directorio: Path, excluir: str = None,
+                        modo: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Último perfil guardado en el directorio (para comparar ejecuciones)
+        
+        Args:
+            directorio: Carpeta de perfiles
+            excluir: Ruta del perfil actual
+            modo: Considerar solo perfiles de este modo ('completo' o 'incremental')
+        
+        Returns:
+            Perfil más reciente distinto de `excluir` (y del modo pedido), o None
+        """
+        rutas = []
+        for ruta in Path(directorio).glob('etl_*_perfil.json'):
+            if str(ruta) != excluir:
+                try:
+                    rutas.append((ruta.stat().st_mtime, ruta))
+                except OSError:
+                    continue
+        
+        # Del más reciente al más antiguo; se omiten los ilegibles
+        for _, ruta in sorted(rutas, reverse=True):
+            try:
+                perfil = json.loads(ruta.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            if modo is None or perfil.get('modo') == modo:
+                return perfil
+        return None
+    
+    @staticmethod
+    def comparar(actual: Dict[str, Any], anterior: Dict[str, Any],
+                 umbral: float = 0.2) -> List[Dict[str, Any]]:
+        """
+        Bloques que tardaron bastante más que en la ejecución anterior
+        
+        Args:
+            actual: Perfil de esta ejecución
+            anterior: Perfil de la ejecución con la que comparar
+            umbral: Aumento relativo mínimo para reportar (0.2 = 20%)
+        
+        Returns:
+            Lista de {nombre, antes_s, ahora_s, cambio} ordenada por aumento absoluto
+        """
+        previos = {(m['categoria'], m['nombre']): m['duracion_s'] for m in anterior.get('mediciones', [])}
+        regresiones = []
+        for medicion in actual.get('mediciones', []):
+            antes = previos.get((medicion['categoria'], medicion['nombre']))
+            ahora = medicion['duracion_s']
+            # Ignorar bloques muy cortos, su variación es ruido
+            if antes and ahora >= 0.5 and ahora > antes * (1 + umbral):
+                regresiones.append({'nombre': medicion['nombre'], 'antes_s': antes,
+                                    'ahora_s': ahora, 'cambio': round(ahora / antes - 1, 3)})
+        return sorted(regresiones, key=lambda r: r['ahora_s'] - r['antes_s'], reverse=True)
+
+def medir(nombre: str, categoria: str, padre: Medicion = None):
+    """`ETLProfiler.medir` del perfil activo; no hace nada si no hay perfil"""
+    if _activo is None:
+        return nullcontext()
+    return _activo.medir(nombre, categoria, padre)
+
+def medicion_actual() -> Optional[Medicion]:
+    """Bloque abierto en este hilo del perfil activo (para pasarlo a un worker)"""
+    return _activo.actual() if _activo is not None else None
+
+def anotar(**contadores) -> None:
+    """`ETLProfiler.anotar` del perfil activo; no hace nada si no hay perfil"""
+    if _activo is not None:
+        _activo.anotar(**contadores)
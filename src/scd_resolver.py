@@ -0,0 +1,73 @@
+"""
+Resolución de llaves surrogadas "as-of" para dimensiones SCD Type 2
+RF3-4: Transformaciones analíticas y carga al modelo estrella
+
+Un join por rango (rental_date BETWEEN fecha_inicio AND fecha_fin) en
+MySQL es lento. Aquí cada dimensión se carga una vez como intervalos
+ordenados por llave natural y fecha de inicio, y las llaves surrogadas se
+asignan a lotes de hechos con merge_asof (ordenar + búsqueda binaria,
+O(n log n)).
+
+Las versiones de un miembro son contiguas: _merge_scd2 cierra la versión
+anterior con la misma marca de tiempo con la que abre la nueva, así que
+la versión vigente en una fecha es la de mayor fecha_inicio <= fecha.
+"""
+
+import numpy as np
+import pandas as pd
+
+class AsOfKeyResolver:
+    """Intervalos de versión por llave natural para resolver SKs por fecha"""
+    
+    def __init__(self, versiones: pd.DataFrame, llave_natural: str, llave_sk: str):
+        """
+        Args:
+            versiones: Filas de la dimensión con llave natural, llave surrogada
+                       y fecha_inicio (todas las versiones, no solo activas)
+            llave_natural: Columna de llave natural (ej: 'film_id')
+            llave_sk: Columna de llave surrogada (ej: 'film_sk')
+        """
+        versiones = versiones.dropna(subset=[llave_natural, 'fecha_inicio'])
+        self.intervalos = pd.DataFrame({
+            'llave': versiones[llave_natural].astype('int64').to_numpy(),
+            'inicio': pd.to_datetime(versiones['fecha_inicio']).to_numpy(),
+            'sk': versiones[llave_sk].astype('int64').to_numpy()
+        }).sort_values(['inicio', 'sk'], kind='mergesort').reset_index(drop=True)
+        
+        # Hechos anteriores a la primera versión (la dimensión se cargó después
+        # que los hechos históricos): se asignan a la versión más antigua
+        self.primera = self.intervalos.drop_duplicates('llave', keep='first').set_index('llave')['sk']
+    
+    def __len__(self):
+        return len(self.intervalos)
+    
+    def resolver(self, llaves, fechas) -> np.ndarray:
+        """
+        Asigna a cada par (llave natural, fecha) la SK de la versión vigente
+        
+        Args:
+            llaves: Array de llaves naturales
+            fechas: Array de fechas de los hechos
+        
+        Returns:
+            Array float de SKs (NaN si la llave no existe en la dimensión)
+        """
+        consulta = pd.DataFrame({
+            'llave': np.asarray(llaves, dtype='int64'),
+            'fecha': pd.to_datetime(np.asarray(fechas)),
+            'posicion': np.arange(len(llaves))
+        })
+        resultado = np.full(len(consulta), np.nan)
+        consulta = consulta[consulta['fecha'].notna()].sort_values('fecha', kind='mergesort')
+        
+        if len(consulta) == 0 or len(self.intervalos) == 0:
+            return resultado
+        
+        df = pd.merge_asof(consulta, self.intervalos,
+                           left_on='fecha', right_on='inicio', by='llave',
+                           direction='backward')
+        sin_version = df['sk'].isna()
+        df.loc[sin_version, 'sk'] = df.loc[sin_version, 'llave'].map(self.primera)
+        
+        resultado[df['posicion'].to_numpy()] = df['sk'].to_numpy(dtype=float)
+        return resultado
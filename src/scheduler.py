@@ -0,0 +1,354 @@
+"""
+Planificador de tareas por grafo de dependencias (DAG)
+RF10: Orquestación del proceso completo
+
+El pipeline se expresa como tareas finas ("extraer rental", "limpiar
+stg_film", "validar inventory→film FK", "cargar dim_tienda", "fact mes
+2005-07") con sus dependencias. Cada tarea se lanza en el pool de hilos en
+cuanto terminan sus entradas, así el tiempo total lo marca la ruta crítica
+y no la suma de los pasos.
+
+Si una tarea falla, las que dependen de ella (directa o indirectamente) se
+omiten y el resto del grafo sigue. Una tarea puede agregar tareas nuevas
+mientras corre (ej: un tramo por mes cuando se conoce el rango de fechas).
+
+Con un CheckpointStore las tareas con huella registran su checkpoint al
+terminar; al reanudar, una tarea cuyo checkpoint sigue vigente no se
+ejecuta y su resultado guardado se entrega a su función restaurar.
+
+Con un perfil activo (src.profiler) cada tarea es un bloque medido, con la
+fase de la tarea como categoría.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from src.profiler import medicion_actual, medir
+
+# Estados que liberan a las tareas dependientes
+ESTADOS_LISTOS = ('ok', 'reanudada', 'excluida')
+
+class DAGTask:
+    """Tarea del grafo con sus dependencias, estado y tiempos"""
+    
+    def __init__(self, nombre: str, funcion: Callable[[], Any],
+                 dependencias: Iterable[str] = None, fase: str = None,
+                 tablas: Iterable[str] = None, huella: Callable[[], str] = None,
+                 restaurar: Callable[[Any], None] = None):
+        """
+        Args:
+            nombre: Identificador único (ej: 'extraer:rental')
+            funcion: Callable sin argumentos que ejecuta la tarea
+            dependencias: Tareas que deben terminar bien antes
+            fase: Fase del pipeline para el resumen (ej: 'extraccion')
+            tablas: Tablas de staging que lee o escribe (para seleccionar)
+            huella: Huella de las entradas; sin ella la tarea no deja checkpoint
+            restaurar: Recibe el resultado guardado cuando la tarea se reanuda
+        """
+        self.nombre = nombre
+        self.funcion = funcion
+        self.dependencias = set(dependencias or [])
+        self.fase = fase
+        self.tablas = set(tablas or [])
+        self.huella = huella
+        self.restaurar = restaurar
+        # pendiente, ejecutando, ok, error, omitida, reanudada, excluida
+        self.estado = 'pendiente'
+        # Se ejecutó una tarea con checkpoint en esta tarea o antes: sus
+        # dependientes no pueden reutilizar los suyos
+        self.rehecha = False
+        self.resultado = None
+        self.error = None
+        self.inicio = None
+        self.fin = None
+    
+    @property
+    def duracion(self) -> float:
+        """Segundos de ejecución (0 si no corrió)"""
+        if self.inicio is None or self.fin is None:
+            return 0.0
+        return self.fin - self.inicio
+
+class DAGScheduler:
+    """Ejecuta un grafo de tareas con un pool de hilos acotado"""
+    
+    def __init__(self, workers: int = 4, logger=None, checkpoints=None):
+        """
+        Args:
+            workers: Tareas simultáneas
+            logger: Logger para el progreso (opcional)
+            checkpoints: CheckpointStore para registrar y reanudar tareas (opcional)
+        """
+        self.workers = max(1, workers)
+        self.logger = logger
+        self.checkpoints = checkpoints
+        self.tareas: Dict[str, DAGTask] = {}
+        self._seleccion = None
+        self._lock = threading.RLock()
+        self._origen = None
+        self._medicion = None
+        self.duracion = 0.0
+    
+    def agregar(self, nombre: str, funcion: Callable[[], Any],
+                dependencias: Iterable[str] = None, fase: str = None,
+                tablas: Iterable[str] = None, huella: Callable[[], str] = None,
+                restaurar: Callable[[Any], None] = None) -> str:
+        """
+        Agrega una tarea (también desde otra tarea en ejecución)
+        
+        Args:
+            nombre: Identificador único
+            funcion: Callable sin argumentos
+            dependencias: Nombres de tareas previas
+            fase: Fase para el resumen
+            tablas: Tablas de staging que lee o escribe
+            huella: Huella de las entradas (habilita el checkpoint)
+            restaurar: Recibe el resultado guardado al reanudar
+        
+        Returns:
+            Nombre de la tarea
+        """
+        tarea = DAGTask(nombre, funcion, dependencias, fase, tablas, huella, restaurar)
+        with self._lock:
+            if nombre in self.tareas:
+                raise ValueError(f"Tarea duplicada: {nombre}")
+            if self._seleccion is not None and not self._seleccion(tarea):
+                tarea.estado = 'excluida'
+            self.tareas[nombre] = tarea
+        return nombre
+    
+    def seleccionar(self, fases: Iterable[str] = None, tablas: Iterable[str] = None) -> int:
+        """
+        Limita la ejecución a las tareas de ciertas fases y/o tablas
+        
+        Las demás quedan 'excluidas': no se ejecutan pero no bloquean a sus
+        dependientes. Las tareas sin tablas (inicio y cierre de fase,
+        agregados) se mantienen si su fase está seleccionada. Aplica también
+        a las tareas que se agreguen después.
+        
+        Args:
+            fases: Fases a ejecutar (todas si es None)
+            tablas: Tablas de staging a ejecutar (todas si es None)
+        
+        Returns:
+            Número de tareas excluidas
+        """
+        fases = set(fases) if fases else None
+        tablas = set(tablas) if tablas else None
+        
+        def seleccionada(tarea: DAGTask) -> bool:
+            if fases is not None and tarea.fase not in fases:
+                return False
+            return tablas is None or not tarea.tablas or bool(tarea.tablas & tablas)
+        
+        with self._lock:
+            self._seleccion = seleccionada
+            excluidas = 0
+            for tarea in self.tareas.values():
+                if tarea.estado == 'pendiente' and not seleccionada(tarea):
+                    tarea.estado = 'excluida'
+                    excluidas += 1
+        return excluidas
+    
+    def agregar_dependencia(self, nombre: str, dependencia: str) -> None:
+        """Agrega una dependencia a una tarea que aún no se lanzó"""
+        with self._lock:
+            tarea = self.tareas[nombre]
+            if tarea.estado != 'pendiente':
+                raise ValueError(f"La tarea {nombre} ya se lanzó")
+            tarea.dependencias.add(dependencia)
+    
+    def resultado(self, nombre: str) -> Any:
+        """Resultado de una tarea terminada"""
+        return self.tareas[nombre].resultado
+    
+    def _validar(self) -> None:
+        """Verifica que las dependencias existan y que no haya ciclos (Kahn)"""
+        for tarea in self.tareas.values():
+            faltantes = tarea.dependencias - self.tareas.keys()
+            if faltantes:
+                raise ValueError(f"{tarea.nombre} depende de tareas inexistentes: {sorted(faltantes)}")
+        
+        grados = {n: len(t.dependencias) for n, t in self.tareas.items()}
+        sucesores = {n: [] for n in self.tareas}
+        for tarea in self.tareas.values():
+            for dep in tarea.dependencias:
+                sucesores[dep].append(tarea.nombre)
+        
+        listas = [n for n, g in grados.items() if g == 0]
+        visitadas = 0
+        while listas:
+            nombre = listas.pop()
+            visitadas += 1
+            for sucesor in sucesores[nombre]:
+                grados[sucesor] -= 1
+                if grados[sucesor] == 0:
+                    listas.append(sucesor)
+        
+        if visitadas != len(self.tareas):
+            ciclo = sorted(n for n, g in grados.items() if g > 0)
+            raise ValueError(f"El grafo de tareas tiene ciclos: {ciclo}")
+    
+    def _reanudar(self, tarea: DAGTask, rehechas_previas: bool) -> bool:
+        """
+        Reutiliza el checkpoint de la tarea si sigue vigente
+        
+        Vigente: la ejecución reanudada lo registró, ninguna tarea anterior
+        se rehizo y la huella actual de sus entradas es la misma.
+        
+        Returns:
+            True si la tarea no necesita ejecutarse
+        """
+        if self.checkpoints is None or tarea.huella is None or rehechas_previas:
+            return False
+        
+        guardado = self.checkpoints.obtener(tarea.nombre)
+        if guardado is None or guardado[0] != tarea.huella():
+            return False
+        
+        tarea.resultado = guardado[1]
+        if tarea.restaurar is not None and tarea.resultado is not None:
+            tarea.restaurar(tarea.resultado)
+        if self.logger:
+            self.logger.info(f"♻️  Tarea {tarea.nombre}: checkpoint vigente, no se ejecuta")
+        return True
+    
+    def _correr(self, tarea: DAGTask) -> None:
+        """Ejecuta una tarea y registra estado y tiempos (no propaga excepciones)"""
+        tarea.inicio = time.perf_counter() - self._origen
+        rehechas_previas = any(self.tareas[d].rehecha for d in tarea.dependencias)
+        try:
+            if self._reanudar(tarea, rehechas_previas):
+                estado = 'reanudada'
+            else:
+                tarea.resultado = tarea.funcion()
+                tarea.rehecha = rehechas_previas or tarea.huella is not None
+                if self.checkpoints is not None and tarea.huella is not None:
+                    self.checkpoints.guardar(tarea.nombre, 'COMPLETADO', tarea.huella(), tarea.resultado)
+                estado = 'ok'
+        except Exception as e:
+            tarea.error = e
+            tarea.rehecha = True
+            estado = 'error'
+            if self.logger:
+                self.logger.error(f"❌ Tarea {tarea.nombre} falló: {e}")
+            if self.checkpoints is not None:
+                try:
+                    self.checkpoints.guardar(tarea.nombre, 'ERROR', mensaje_error=str(e))
+                except Exception:
+                    pass
+        
+        # El estado se publica al final: otra tarea puede lanzarse apenas se lea 'ok'
+        tarea.fin = time.perf_counter() - self._origen
+        with self._lock:
+            tarea.estado = estado
+    
+    def _lanzar(self, tarea: DAGTask) -> None:
+        """Ejecuta una tarea en un worker como bloque del perfil activo"""
+        with medir(tarea.nombre, tarea.fase or 'dag', self._medicion):
+            self._correr(tarea)
+    
+    def _siguientes(self) -> List[DAGTask]:
+        """
+        Tareas pendientes listas para lanzar; omite las que dependen de una fallida
+        
+        Se recorre todo el grafo en cada paso para admitir tareas agregadas
+        durante la ejecución (el grafo es de decenas o cientos de tareas).
+        """
+        listas = []
+        with self._lock:
+            cambio = True
+            while cambio:
+                cambio = False
+                for tarea in self.tareas.values():
+                    if tarea.estado != 'pendiente':
+                        continue
+                    estados = [self.tareas[d].estado for d in tarea.dependencias]
+                    if any(e in ('error', 'omitida') for e in estados):
+                        tarea.estado = 'omitida'
+                        cambio = True
+                        if self.logger:
+                            self.logger.warning(f"⏭️  Tarea {tarea.nombre} omitida (falló una dependencia)")
+                    elif all(e in ESTADOS_LISTOS for e in estados):
+                        tarea.estado = 'ejecutando'
+                        listas.append(tarea)
+        return listas
+    
+    def ejecutar(self) -> bool:
+        """
+        Ejecuta el grafo hasta que no queden tareas lanzables
+        
+        Returns:
+            True si todas las tareas terminaron bien
+        """
+        with self._lock:
+            self._validar()
+        
+        self._origen = time.perf_counter()
+        # Bloque del perfil que contiene a las tareas (corren en otros hilos)
+        self._medicion = medicion_actual()
+        if self.logger:
+            self.logger.info(f"🧭 Ejecutando {len(self.tareas)} tareas con {self.workers} workers")
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            en_curso = {pool.submit(self._lanzar, t): t for t in self._siguientes()}
+            while en_curso:
+                hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    en_curso.pop(futuro)
+                
+                with self._lock:
+                    self._validar()
+                for tarea in self._siguientes():
+                    en_curso[pool.submit(self._lanzar, tarea)] = tarea
+        
+        self.duracion = time.perf_counter() - self._origen
+        return all(t.estado in ESTADOS_LISTOS for t in self.tareas.values())
+    
+    def ruta_critica(self) -> Tuple[float, List[str]]:
+        """
+        Cadena de dependencias con mayor suma de duraciones
+        
+        Returns:
+            (segundos, nombres de tareas en orden)
+        """
+        memo: Dict[str, Tuple[float, List[str]]] = {}
+        
+        def mas_larga(nombre: str) -> Tuple[float, List[str]]:
+            if nombre not in memo:
+                tarea = self.tareas[nombre]
+                previa = max((mas_larga(d) for d in tarea.dependencias),
+                             key=lambda r: r[0], default=(0.0, []))
+                memo[nombre] = (previa[0] + tarea.duracion, previa[1] + [nombre])
+            return memo[nombre]
+        
+        return max((mas_larga(n) for n in self.tareas), key=lambda r: r[0], default=(0.0, []))
+    
+    def resumen(self) -> Dict:
+        """
+        Estadísticas de la ejecución
+        
+        Returns:
+            Conteo por estado, tiempo real, suma de tareas, ruta crítica y
+            segundos por fase
+        """
+        estados = {}
+        fases = {}
+        for tarea in self.tareas.values():
+            estados[tarea.estado] = estados.get(tarea.estado, 0) + 1
+            if tarea.fase:
+                fases[tarea.fase] = round(fases.get(tarea.fase, 0.0) + tarea.duracion, 3)
+        
+        segundos_ruta, ruta = self.ruta_critica()
+        return {
+            'tareas': len(self.tareas),
+            'estados': estados,
+            'workers': self.workers,
+            'duracion_s': round(self.duracion, 3),
+            'suma_tareas_s': round(sum(t.duracion for t in self.tareas.values()), 3),
+            'ruta_critica_s': round(segundos_ruta, 3),
+            'ruta_critica': ruta,
+            'fases_s': fases
+        }
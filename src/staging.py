@@ -6,7 +6,7 @@ RF2: Staging / área intermedia - transformaciones y limpieza
 import pandas as pd
 from sqlalchemy import create_engine, text
 from datetime import datetime
-from typing import Dict, List
+from typing import Callable, Dict, List, Tuple
 import sys
 from pathlib import Path
 
@@ -15,25 +15,35 @@ sys.path.insert(0, str(project_root))
 
 from config.config import Config
 from src.logger_config import ETLLogger
+from src.profiler import medir
+from src.key_sets import KeySetCache
 
 class StagingProcessor:
     """Procesador de datos en staging - limpieza y transformaciones"""
     
-    def __init__(self, etl_id: int = None):
+    def __init__(self, etl_id: int = None, cache_llaves: KeySetCache = None):
         """
         Inicializa el procesador de staging
         
         Args:
             etl_id: ID de la ejecución ETL actual
+            cache_llaves: Caché de llaves de los validadores; se invalida cada
+                          tabla que la limpieza modifica (opcional)
         """
         self.etl_logger = ETLLogger('staging', Config.ETL_LOG_PATH, Config.ETL_LOG_LEVEL)
         self.logger = self.etl_logger.get_logger()
         
         self.engine_staging = create_engine(Config.get_staging_connection_string())
         self.etl_id = etl_id
+        self.cache_llaves = cache_llaves
         
         self.logger.info("✅ Procesador de staging inicializado")
     
+    def _invalidar_llaves(self, tabla: str, modificados: int) -> None:
+        """Descarta las llaves en caché de una tabla que la limpieza modificó"""
+        if modificados > 0 and self.cache_llaves is not None:
+            self.cache_llaves.invalidar(tabla)
+    
     def limpiar_datos_nulos(self, tabla: str, columnas_numericas: List[str] = None,
                            columnas_texto: List[str] = None) -> int:
         """
@@ -88,12 +98,18 @@ class StagingProcessor:
         if total_actualizados > 0:
             self.logger.info(f"✅ Total limpiados en {tabla}: {total_actualizados}")
         
+        self._invalidar_llaves(tabla, total_actualizados)
         return total_actualizados
     
     def eliminar_duplicados(self, tabla: str, columnas_pk: List[str]) -> int:
         """
         Elimina registros duplicados basándose en PK
         
+        Se conserva la versión más reciente (mayor etl_fecha_carga): en
+        incremental una renta re-extraída (devolución tardía, corrección)
+        reemplaza a la anterior y mantiene el etl_id de la ejecución, que
+        es lo que usa DataMartTransformer.detectar_particiones_afectadas.
+        
         Args:
             tabla: Nombre de la tabla
             columnas_pk: Columnas que forman la PK
@@ -103,11 +119,11 @@ class StagingProcessor:
         """
         pk_str = ", ".join(columnas_pk)
         
-        # Crear columna temporal con row_number
+        # Borra cada fila para la que existe otra más nueva con la misma PK
         query = text(f"""
             DELETE t1 FROM {tabla} t1
             INNER JOIN {tabla} t2 
-            WHERE t1.etl_fecha_carga > t2.etl_fecha_carga
+            WHERE t1.etl_fecha_carga < t2.etl_fecha_carga
             AND {' AND '.join([f't1.{col} = t2.{col}' for col in columnas_pk])}
         """)
         
@@ -121,6 +137,7 @@ class StagingProcessor:
         else:
             self.logger.info(f"✅ Sin duplicados en {tabla}")
         
+        self._invalidar_llaves(tabla, eliminados)
         return eliminados
     
     def marcar_registros_invalidos(self, tabla: str, condicion: str, 
@@ -151,6 +168,7 @@ class StagingProcessor:
         if marcados > 0:
             self.logger.warning(f"⚠️  Marcados {marcados} registros inválidos en {tabla}: {mensaje}")
         
+        self._invalidar_llaves(tabla, marcados)
         return marcados
     
     def normalizar_textos(self, tabla: str, columnas: List[str]) -> int:
@@ -185,6 +203,7 @@ class StagingProcessor:
         if total_actualizados > 0:
             self.logger.info(f"✅ Total normalizados en {tabla}: {total_actualizados}")
         
+        self._invalidar_llaves(tabla, total_actualizados)
         return total_actualizados
     
     def convertir_tipos_datos(self, tabla: str) -> pd.DataFrame:
@@ -312,6 +331,81 @@ class StagingProcessor:
         self.logger.info(f"✅ stg_film procesado: {stats}")
         return stats
     
+    def preagregar_pagos(self) -> int:
+        """
+        Pre-agrega los pagos por renta en stg_payment_rental
+        
+        Una fila por rental_id con la suma y el número de pagos, indexada por
+        rental_id. La construcción de fact_ventas hace join 1:1 contra esta
+        tabla en lugar de multiplicar cada renta por sus pagos.
+        
+        Returns:
+            Número de rentas con pagos
+        """
+        self.logger.info("🔧 Pre-agregando pagos por renta...")
+        
+        with self.engine_staging.connect() as conn:
+            conn.execute(text("TRUNCATE TABLE stg_payment_rental"))
+            result = conn.execute(text("""
+                INSERT INTO stg_payment_rental (rental_id, monto_total, cantidad_pagos, etl_id)
+                SELECT rental_id, SUM(COALESCE(amount, 0)), COUNT(*), :etl_id
+                FROM stg_payment
+                WHERE rental_id IS NOT NULL
+                GROUP BY rental_id
+            """), {"etl_id": self.etl_id})
+            conn.commit()
+            registros = result.rowcount
+        
+        self.logger.info(f"✅ stg_payment_rental: {registros:,} rentas con pagos")
+        return registros
+    
+    def procesar_dimension(self, tabla: str, columna_pk: str,
+                           columnas_texto: List[str] = None) -> Dict[str, int]:
+        """
+        Procesa una tabla de dimensión (sin validaciones complejas)
+        
+        Args:
+            tabla: Nombre de la tabla
+            columna_pk: Columna PK para deduplicar
+            columnas_texto: Columnas a normalizar (opcional)
+            
+        Returns:
+            Estadísticas del procesamiento
+        """
+        self.logger.info(f"🔧 Procesando {tabla}...")
+        stats = {'duplicados': self.eliminar_duplicados(tabla, [columna_pk])}
+        if columnas_texto:
+            stats['normalizados'] = self.normalizar_textos(tabla, columnas_texto)
+        return stats
+    
+    def definir_procesos(self) -> List[Tuple[str, List[str], Callable[[], Dict[str, int]]]]:
+        """
+        Define los procesos de limpieza de staging en orden de ejecución
+        
+        El planificador DAG ejecuta en paralelo los que no comparten tablas;
+        los que sí (payment_rental lee stg_payment ya deduplicada) respetan
+        este orden.
+        
+        Returns:
+            Lista de (clave, tablas que lee o modifica, función)
+        """
+        return [
+            ('rental', ['stg_rental'], self.procesar_rental),
+            ('payment', ['stg_payment'], self.procesar_payment),
+            ('film', ['stg_film'], self.procesar_film),
+            ('category', ['stg_category'],
+             lambda: self.procesar_dimension('stg_category', 'category_id', ['name'])),
+            ('store', ['stg_store'],
+             lambda: self.procesar_dimension('stg_store', 'store_id')),
+            ('city', ['stg_city'],
+             lambda: self.procesar_dimension('stg_city', 'city_id', ['city'])),
+            ('country', ['stg_country'],
+             lambda: self.procesar_dimension('stg_country', 'country_id', ['country'])),
+            # Pagos por renta para la construcción de hechos (después de deduplicar pagos)
+            ('payment_rental', ['stg_payment', 'stg_payment_rental'],
+             lambda: {'rentas_con_pagos': self.preagregar_pagos()})
+        ]
+    
     def procesar_todas_las_tablas(self) -> Dict[str, Dict[str, int]]:
         """
         Procesa todas las tablas de staging
@@ -324,31 +418,9 @@ class StagingProcessor:
         
         resultados = {}
         
-        # Procesar tablas principales
-        resultados['rental'] = self.procesar_rental()
-        resultados['payment'] = self.procesar_payment()
-        resultados['film'] = self.procesar_film()
-        
-        # Procesar tablas de dimensiones (sin validaciones complejas)
-        self.logger.info("🔧 Procesando dimensiones...")
-        resultados['category'] = {
-            'duplicados': self.eliminar_duplicados('stg_category', ['category_id']),
-            'normalizados': self.normalizar_textos('stg_category', ['name'])
-        }
-        
-        resultados['store'] = {
-            'duplicados': self.eliminar_duplicados('stg_store', ['store_id'])
-        }
-        
-        resultados['city'] = {
-            'duplicados': self.eliminar_duplicados('stg_city', ['city_id']),
-            'normalizados': self.normalizar_textos('stg_city', ['city'])
-        }
-        
-        resultados['country'] = {
-            'duplicados': self.eliminar_duplicados('stg_country', ['country_id']),
-            'normalizados': self.normalizar_textos('stg_country', ['country'])
-        }
+        for clave, _, proceso in self.definir_procesos():
+            with medir(clave, 'limpieza'):
+                resultados[clave] = proceso()
         
         # Resumen
         total_duplicados = sum(r.get('duplicados', 0) for r in resultados.values())
@@ -0,0 +1,308 @@
+"""
+Validaciones de calidad en flujo durante la extracción
+RF8: Validaciones de calidad de datos
+
+Los checks se conectan al flujo de lotes del extractor y mantienen
+contadores acumulados (nulos, fuera de rango, cardinalidad por
+HyperLogLog, conjuntos de llaves para FK). Al terminar la extracción
+emiten los mismos resultados que DataValidator registra en audit_calidad,
+sin volver a leer staging.
+"""
+
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from src.key_sets import SortedKeySet
+
+class HyperLogLog:
+    """Estimador de cardinalidad HyperLogLog (vectorizado con NumPy)"""
+    
+    def __init__(self, precision: int = 14):
+        """
+        Args:
+            precision: Bits de índice de registro (m = 2^precision registros)
+        """
+        self.precision = precision
+        self.m = 1 << precision
+        self.registros = np.zeros(self.m, dtype=np.uint8)
+    
+    @staticmethod
+    def _longitud_bits(valores: np.ndarray) -> np.ndarray:
+        """Número de bits significativos de cada uint64 (exacto, sin pérdida de float)"""
+        alto = (valores >> np.uint64(32)).astype(np.float64)
+        bajo = (valores & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        
+        with np.errstate(divide='ignore'):
+            bits_alto = np.where(alto > 0, np.floor(np.log2(alto)) + 1 + 32, 0)
+            bits_bajo = np.where(bajo > 0, np.floor(np.log2(bajo)) + 1, 0)
+        
+        return np.where(alto > 0, bits_alto, bits_bajo).astype(np.int64)
+    
+    def agregar(self, valores) -> None:
+        """
+        Agrega un lote de valores al sketch
+        
+        Args:
+            valores: Serie, array o DataFrame (se hashea cada fila)
+        """
+        if isinstance(valores, pd.DataFrame):
+            hashes = pd.util.hash_pandas_object(valores, index=False).to_numpy(dtype=np.uint64)
+        else:
+            hashes = pd.util.hash_array(np.asarray(valores))
+        
+        if len(hashes) == 0:
+            return
+        
+        p = np.uint64(self.precision)
+        indices = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        resto = hashes << p
+        
+        # rho = posición del primer bit 1 en los 64 - p bits restantes
+        rho = (64 - self._longitud_bits(resto)) + 1
+        rho = np.minimum(rho, 64 - self.precision + 1).astype(np.uint8)
+        
+        np.maximum.at(self.registros, indices, rho)
+    
+    def estimar(self) -> float:
+        """Retorna la cardinalidad estimada"""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimacion = alpha * self.m ** 2 / np.sum(np.power(2.0, -self.registros.astype(np.float64)))
+        
+        # Corrección de rango pequeño (linear counting)
+        vacios = int(np.count_nonzero(self.registros == 0))
+        if estimacion <= 2.5 * self.m and vacios > 0:
+            estimacion = self.m * np.log(self.m / vacios)
+        
+        return float(estimacion)
+    
+    @property
+    def error_relativo(self) -> float:
+        """Error estándar relativo del estimador"""
+        return 1.04 / np.sqrt(self.m)
+
+class StreamCheck(ABC):
+    """Check base que se actualiza lote a lote"""
+    
+    def __init__(self, clave: str, tabla: str):
+        """
+        Args:
+            clave: Clave del resultado (ej: 'rental_no_null')
+            tabla: Tabla de staging a la que aplica
+        """
+        self.clave = clave
+        self.tabla = tabla
+        self.tablas = {tabla}
+    
+    @abstractmethod
+    def actualizar(self, tabla: str, df: pd.DataFrame) -> None:
+        """Procesa un lote de la tabla indicada"""
+    
+    @abstractmethod
+    def evaluar(self) -> List[Dict]:
+        """
+        Retorna los registros de auditoría del check
+        
+        Returns:
+            Lista de dicts con los argumentos de DataValidator.registrar_validacion
+        """
+
+class NullCheck(StreamCheck):
+    """Cuenta nulos acumulados por columna"""
+    
+    def __init__(self, clave: str, tabla: str, columnas: List[str]):
+        super().__init__(clave, tabla)
+        self.columnas = columnas
+        self.nulos = {col: 0 for col in columnas}
+    
+    def actualizar(self, tabla: str, df: pd.DataFrame) -> None:
+        conteos = df[self.columnas].isna().sum()
+        for col in self.columnas:
+            self.nulos[col] += int(conteos[col])
+    
+    def evaluar(self) -> List[Dict]:
+        registros = []
+        for col, nulos in self.nulos.items():
+            if nulos > 0:
+                registros.append(dict(
+                    tabla_origen=self.tabla, tabla_destino=self.tabla,
+                    validacion=f"Nulos en {col}", resultado="FAIL",
+                    valor_esperado="0", valor_obtenido=str(nulos),
+                    mensaje=f"Columna requerida tiene {nulos} valores nulos"
+                ))
+            else:
+                registros.append(dict(
+                    tabla_origen=self.tabla, tabla_destino=self.tabla,
+                    validacion=f"Nulos en {col}", resultado="PASS",
+                    valor_esperado="0", valor_obtenido="0",
+                    mensaje="Columna sin valores nulos"
+                ))
+        return registros
+
+class RangeCheck(StreamCheck):
+    """Cuenta valores fuera de [min_val, max_val] acumulados"""
+    
+    def __init__(self, clave: str, tabla: str, columna: str,
+                 min_val: float = None, max_val: float = None):
+        super().__init__(clave, tabla)
+        self.columna = columna
+        self.min_val = min_val
+        self.max_val = max_val
+        self.fuera_rango = 0
+    
+    def actualizar(self, tabla: str, df: pd.DataFrame) -> None:
+        valores = pd.to_numeric(df[self.columna], errors='coerce')
+        mascara = np.zeros(len(valores), dtype=bool)
+        if self.min_val is not None:
+            mascara |= (valores < self.min_val).to_numpy()
+        if self.max_val is not None:
+            mascara |= (valores > self.max_val).to_numpy()
+        self.fuera_rango += int(mascara.sum())
+    
+    def evaluar(self) -> List[Dict]:
+        rango = f"[{self.min_val}, {self.max_val}]"
+        if self.fuera_rango > 0:
+            return [dict(
+                tabla_origen=self.tabla, tabla_destino=self.tabla,
+                validacion=f"Rango {self.columna}", resultado="FAIL",
+                valor_esperado=rango, valor_obtenido=f"{self.fuera_rango} fuera de rango",
+                mensaje="Valores fuera del rango permitido"
+            )]
+        return [dict(
+            tabla_origen=self.tabla, tabla_destino=self.tabla,
+            validacion=f"Rango {self.columna}", resultado="PASS",
+            valor_esperado=rango, valor_obtenido="Todos en rango",
+            mensaje="Todos los valores dentro del rango"
+        )]
+
+class DuplicateCheck(StreamCheck):
+    """
+    Estima duplicados de PK comparando filas vistas con cardinalidad HLL
+    
+    Una estimación dentro de la cota de error del HLL se da por buena; por
+    encima, DataValidator confirma con un conteo exacto sobre staging.
+    """
+    
+    def __init__(self, clave: str, tabla: str, columnas_pk: List[str], precision: int = 14):
+        super().__init__(clave, tabla)
+        self.columnas_pk = columnas_pk
+        self.sketch = HyperLogLog(precision)
+        self.filas = 0
+    
+    def actualizar(self, tabla: str, df: pd.DataFrame) -> None:
+        self.sketch.agregar(df[self.columnas_pk])
+        self.filas += len(df)
+    
+    def estimar(self) -> Tuple[int, float]:
+        """
+        Duplicados estimados y su cota de error (3 errores estándar del HLL)
+        
+        Returns:
+            (duplicados estimados, cota)
+        """
+        distintos = self.sketch.estimar()
+        return max(0, round(self.filas - distintos)), float(3 * self.sketch.error_relativo * distintos)
+    
+    def evaluar(self) -> List[Dict]:
+        duplicados, cota = self.estimar()
+        pk_str = ", ".join(self.columnas_pk)
+        estimacion = f"~{duplicados} ±{cota:.0f}"
+        
+        return [dict(
+            tabla_origen=self.tabla, tabla_destino=self.tabla,
+            validacion="Duplicados PK", resultado="PASS" if duplicados <= cota else "FAIL",
+            valor_esperado="0", valor_obtenido=estimacion,
+            mensaje=f"Estimados {estimacion} duplicados en {pk_str} "
+                    f"(HLL, {self.filas} filas, ~{self.filas - duplicados} distintos)"
+        )]
+
+class ForeignKeyCheck(StreamCheck):
+    """Acumula llaves hijas y padres para verificar integridad referencial al final"""
+    
+    def __init__(self, clave: str, tabla_hija: str, columna_fk: str,
+                 tabla_padre: str, columna_pk: str):
+        super().__init__(clave, tabla_hija)
+        self.columna_fk = columna_fk
+        self.tabla_padre = tabla_padre
+        self.columna_pk = columna_pk
+        self.tablas = {tabla_hija, tabla_padre}
+        # Conteo de filas hijas por valor de FK y llaves padre vistas
+        self.conteo_fk: Optional[pd.Series] = None
+        self.llaves_padre: List[np.ndarray] = []
+    
+    def actualizar(self, tabla: str, df: pd.DataFrame) -> None:
+        if tabla == self.tabla:
+            conteo = df[self.columna_fk].dropna().value_counts()
+            self.conteo_fk = conteo if self.conteo_fk is None else self.conteo_fk.add(conteo, fill_value=0)
+        if tabla == self.tabla_padre:
+            self.llaves_padre.append(df[self.columna_pk].dropna().unique())
+    
+    def evaluar(self) -> List[Dict]:
+        padres = SortedKeySet(np.concatenate(self.llaves_padre) if self.llaves_padre else [])
+        
+        huerfanas = 0
+        if self.conteo_fk is not None and len(self.conteo_fk) > 0:
+            sin_padre = ~padres.contiene(self.conteo_fk.index.to_numpy())
+            huerfanas = int(self.conteo_fk[sin_padre].sum())
+        
+        if huerfanas > 0:
+            return [dict(
+                tabla_origen=self.tabla, tabla_destino=self.tabla_padre,
+                validacion="Integridad Referencial", resultado="FAIL",
+                valor_esperado="0", valor_obtenido=str(huerfanas),
+                mensaje=f"FK {self.columna_fk} tiene llaves sin correspondencia en {self.tabla_padre}"
+            )]
+        return [dict(
+            tabla_origen=self.tabla, tabla_destino=self.tabla_padre,
+            validacion="Integridad Referencial", resultado="PASS",
+            valor_esperado="0", valor_obtenido="0",
+            mensaje="Todas las FK tienen correspondencia"
+        )]
+
+class StreamValidator:
+    """Conjunto de checks conectados al flujo de lotes de extracción"""
+    
+    def __init__(self, checks: List[StreamCheck] = None):
+        """
+        Args:
+            checks: Checks a ejecutar sobre el flujo
+        """
+        self.checks: List[StreamCheck] = checks or []
+        self.lotes_procesados = 0
+        # La extracción en paralelo (planificador DAG) entrega lotes desde varios hilos
+        self._lock = threading.Lock()
+    
+    def agregar(self, check: StreamCheck) -> 'StreamValidator':
+        """Agrega un check al validador"""
+        self.checks.append(check)
+        return self
+    
+    @property
+    def tablas(self) -> set:
+        """Tablas de staging que alimentan a algún check"""
+        return set().union(*(c.tablas for c in self.checks)) if self.checks else set()
+    
+    def procesar_lote(self, tabla: str, df: pd.DataFrame) -> None:
+        """
+        Actualiza los checks interesados en la tabla con un lote
+        
+        Args:
+            tabla: Tabla de staging destino del lote
+            df: Lote extraído
+        """
+        with self._lock:
+            for check in self.checks:
+                if tabla in check.tablas:
+                    check.actualizar(tabla, df)
+            self.lotes_procesados += 1
+    
+    def finalizar(self) -> Dict[str, List[Dict]]:
+        """
+        Evalúa todos los checks
+        
+        Returns:
+            Diccionario clave de resultado -> registros de auditoría
+        """
+        return {check.clave: check.evaluar() for check in self.checks}
@@ -6,8 +6,10 @@ RF3-4: Transformaciones analíticas y carga al modelo estrella
 import pandas as pd
 from sqlalchemy import create_engine, text
 from datetime import datetime, timedelta
-from typing import Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 import sys
+import time
 from pathlib import Path
 
 project_root = Path(__file__).resolve().parent.parent
@@ -15,79 +17,294 @@ sys.path.insert(0, str(project_root))
 
 from config.config import Config
 from src.logger_config import ETLLogger
+from src.fact_engine import FactEngine
+from src.scheduler import DAGScheduler
+from src.checkpoint import huella_tablas
+from src.profiler import medicion_actual, medir
 
 class DataMartTransformer:
     """Transformador para crear y poblar el modelo estrella"""
     
-    def __init__(self, etl_id: int = None):
-        """Inicializa el transformador"""
+    # Atributos rastreados por dimensión SCD (entran en hash_atributos)
+    ATRIBUTOS_SCD = {
+        'dim_film': ['titulo', 'descripcion', 'anio_lanzamiento', 'duracion',
+                     'clasificacion', 'tarifa_renta', 'costo_reemplazo'],
+        'dim_categoria': ['nombre_categoria'],
+        'dim_tienda': ['nombre_tienda', 'direccion', 'ciudad', 'pais', 'codigo_postal']
+    }
+    
+    # Tablas que se reconstruyen en sombra en una carga completa (dimensiones antes que hechos)
+    TABLAS_SOMBRA = ['dim_tiempo', 'dim_film', 'dim_categoria', 'dim_tienda', 'fact_ventas',
+                     'agg_ventas_mes_tienda', 'agg_ventas_mes_categoria', 'agg_ventas_mes_film',
+                     'agg_ventas_film', 'agg_kpi_mes', 'agg_kpi_global']
+    SUFIJO_SOMBRA = '__nueva'
+    SUFIJO_ANTERIOR = '__anterior'
+    # Cada mes cargado por intercambio numera venta_id desde AAAAMM × este valor
+    VENTA_ID_POR_PARTICION = 10 ** 10
+    
+    def __init__(self, etl_id: int = None, incremental: bool = False):
+        """
+        Inicializa el transformador
+        
+        Args:
+            etl_id: ID de la ejecución ETL actual
+            incremental: Si True, fact_ventas se recalcula solo en las particiones afectadas
+        """
         self.etl_logger = ETLLogger('transformer', Config.ETL_LOG_PATH, Config.ETL_LOG_LEVEL)
         self.logger = self.etl_logger.get_logger()
         
         self.engine_staging = create_engine(Config.get_staging_connection_string())
         self.engine_dm = create_engine(Config.get_dm_connection_string())
         self.etl_id = etl_id
+        self.incremental = incremental
+        self._motor_hechos = None
+        # Staging en otro servidor: nada de SQL entre esquemas
+        self.staging_separado = Config.staging_en_servidor_separado()
+        self.stats_tramos: List[Dict] = []
+        self.stats_carga: Dict = {}
+        # Nombre lógico -> tabla física mientras se carga en sombra
+        self._tablas_activas: Dict[str, str] = {}
+        self._pendientes_sombra: Dict[str, Tuple] = {}
+        # Índices de fact_ventas quitados por una carga completa aún sin reconstruir
+        self._indices_suspendidos: List[Tuple[str, bool, List[str]]] = []
         
         self.logger.info("✅ Transformador inicializado")
     
-    def poblar_dim_tiempo(self, fecha_inicio: str = '2005-01-01', 
-                         fecha_fin: str = '2026-12-31') -> int:
+    def _t(self, tabla: str) -> str:
+        """Tabla física a la que se escribe para un nombre lógico (sombra o publicada)"""
+        return self._tablas_activas.get(tabla, tabla)
+    
+    @staticmethod
+    def calcular_hash_atributos(df: pd.DataFrame, columnas: List[str]) -> pd.Series:
         """
-        Puebla la dimensión tiempo con rango de fechas
+        Calcula un hash por fila de los atributos rastreados (SCD2)
+        
+        Los valores se normalizan antes de hashear para que el hash no
+        dependa del tipo con que pandas leyó la columna (ej: 90 vs 90.0,
+        None vs NaN).
         
         Args:
-            fecha_inicio: Fecha inicial
-            fecha_fin: Fecha final
+            df: DataFrame con los atributos
+            columnas: Columnas rastreadas
             
         Returns:
-            Número de registros insertados
+            Serie con el hash en hexadecimal (16 caracteres)
+        """
+        normalizado = pd.DataFrame(index=df.index)
+        for col in columnas:
+            if pd.api.types.is_numeric_dtype(df[col]):
+                normalizado[col] = df[col].astype('float64').round(4).astype(str)
+            else:
+                normalizado[col] = df[col].astype('string').fillna('\x00')
+        
+        hashes = pd.util.hash_pandas_object(normalizado, index=False)
+        return hashes.map('{:016x}'.format)
+    
+    def _rango_fechas_hechos(self) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        """
+        Rango de fechas de las rentas en staging (las que llegan a fact_ventas)
+        
+        Returns:
+            (fecha_min, fecha_max), o (None, None) si staging está vacío
         """
-        self.logger.info(f"🕐 Poblando dim_tiempo ({fecha_inicio} a {fecha_fin})...")
-        
-        # Generar rango de fechas
-        fecha_range = pd.date_range(start=fecha_inicio, end=fecha_fin, freq='D')
-        
-        # Crear DataFrame
-        df_tiempo = pd.DataFrame({
-            'fecha': fecha_range,
-            'fecha_id': fecha_range.strftime('%Y%m%d').astype(int),
-            'anio': fecha_range.year,
-            'trimestre': fecha_range.quarter,
-            'mes': fecha_range.month,
-            'mes_nombre': fecha_range.strftime('%B'),
-            'dia': fecha_range.day,
-            'dia_semana': fecha_range.dayofweek + 1,
-            'dia_semana_nombre': fecha_range.strftime('%A'),
-            'semana_anio': fecha_range.isocalendar().week,
-            'es_fin_semana': fecha_range.dayofweek >= 5
+        with self.engine_staging.connect() as conn:
+            fila = conn.execute(text("""
+                SELECT MIN(fecha_id), MAX(fecha_id) FROM stg_rental
+            """)).fetchone()
+        
+        if fila is None or fila[0] is None:
+            return None, None
+        return (pd.to_datetime(str(int(fila[0])), format='%Y%m%d'),
+                pd.to_datetime(str(int(fila[1])), format='%Y%m%d'))
+    
+    @staticmethod
+    def construir_dim_tiempo(fechas: pd.DatetimeIndex, festivos: List[str] = None) -> pd.DataFrame:
+        """
+        Construye los atributos de dim_tiempo para un conjunto de fechas
+        
+        Args:
+            fechas: Fechas a generar
+            festivos: Festivos como 'MM-DD' (cada año) o 'YYYY-MM-DD' (fecha puntual)
+            
+        Returns:
+            DataFrame con las columnas de dim_tiempo
+        """
+        festivos = festivos or []
+        anuales = [f for f in festivos if len(f) == 5]
+        puntuales = [f for f in festivos if len(f) == 10]
+        es_festivo = (fechas.strftime('%m-%d').isin(anuales) |
+                      fechas.strftime('%Y-%m-%d').isin(puntuales))
+        
+        return pd.DataFrame({
+            'fecha': fechas,
+            'fecha_id': fechas.strftime('%Y%m%d').astype(int),
+            'anio': fechas.year,
+            'trimestre': fechas.quarter,
+            'mes': fechas.month,
+            'mes_nombre': fechas.strftime('%B'),
+            'dia': fechas.day,
+            'dia_semana': fechas.dayofweek + 1,
+            'dia_semana_nombre': fechas.strftime('%A'),
+            'semana_anio': fechas.isocalendar().week.to_numpy(),
+            'es_fin_semana': fechas.dayofweek >= 5,
+            'es_festivo': es_festivo
         })
+    
+    def poblar_dim_tiempo(self, fecha_inicio: str = None, fecha_fin: str = None) -> int:
+        """
+        Extiende la dimensión tiempo con las fechas que faltan
         
-        # Limpiar tabla manualmente si ya existe
-        with self.engine_dm.connect() as conn:
-            try:
-                conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
-                conn.execute(text("TRUNCATE TABLE dim_tiempo"))
-                conn.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
-                conn.commit()
-                self.logger.info("   Tabla dim_tiempo limpiada")
-            except:
-                self.logger.info("   dim_tiempo no existe aún, se creará")
-
-        # Cargar datos
-        registros = df_tiempo.to_sql(
-            'dim_tiempo',
+        El rango base (Config.DIM_TIEMPO_INICIO a Config.DIM_TIEMPO_FIN) se
+        amplía automáticamente para cubrir las fechas de las rentas en
+        staging. Solo se generan e insertan las fechas que no existen en
+        dim_tiempo; las filas existentes no se tocan.
+        
+        Args:
+            fecha_inicio: Fecha inicial (default: Config.DIM_TIEMPO_INICIO)
+            fecha_fin: Fecha final (default: Config.DIM_TIEMPO_FIN)
+            
+        Returns:
+            Número de registros insertados
+        """
+        inicio = pd.Timestamp(fecha_inicio or Config.DIM_TIEMPO_INICIO)
+        fin = pd.Timestamp(fecha_fin or Config.DIM_TIEMPO_FIN)
+        
+        hechos_min, hechos_max = self._rango_fechas_hechos()
+        if hechos_min is not None:
+            inicio = min(inicio, hechos_min)
+            fin = max(fin, hechos_max)
+        
+        self.logger.info(f"🕐 Extendiendo dim_tiempo ({inicio.date()} a {fin.date()})...")
+        
+        fecha_range = pd.date_range(start=inicio, end=fin, freq='D')
+        
+        existentes = pd.read_sql(
+            text(f"SELECT fecha_id FROM {self._t('dim_tiempo')} WHERE fecha_id BETWEEN :desde AND :hasta"),
             self.engine_dm,
-            if_exists='append',  # ← Cambiar a 'append'
+            params={"desde": int(inicio.strftime('%Y%m%d')), "hasta": int(fin.strftime('%Y%m%d'))}
+        )['fecha_id']
+        
+        faltantes = fecha_range[~fecha_range.strftime('%Y%m%d').astype(int).isin(existentes)]
+        
+        if len(faltantes) == 0:
+            self.logger.info("✅ dim_tiempo al día: sin fechas nuevas")
+            return 0
+        
+        df_tiempo = self.construir_dim_tiempo(faltantes, Config.DIM_TIEMPO_FESTIVOS)
+        
+        df_tiempo.to_sql(
+            self._t('dim_tiempo'),
+            self.engine_dm,
+            if_exists='append',
             index=False,
             chunksize=1000
         )
         
-        self.logger.info(f"✅ dim_tiempo poblado: {len(df_tiempo):,} registros")
+        self.logger.info(f"✅ dim_tiempo: {len(df_tiempo):,} fechas agregadas "
+                        f"({len(existentes):,} ya existían)")
         return len(df_tiempo)
     
+    def _merge_scd2(self, tabla: str, df_origen: pd.DataFrame,
+                    llave_natural: str, llave_sk: str) -> Tuple[int, int]:
+        """
+        Carga una dimensión SCD Type 2 por merge contra las versiones activas
+        
+        Compara el hash de atributos de staging contra las versiones activas
+        en un solo join. Las versiones activas cargadas antes de existir
+        hash_atributos reciben el hash de sus propios atributos guardados
+        (se completa en la tabla) y se comparan igual que las demás. Los
+        miembros nuevos se insertan, los cambiados se
+        cierran con un UPDATE y reciben una nueva versión, y los que no
+        cambian conservan su fila. Las llaves surrogadas existentes nunca se
+        reasignan, así que los hechos ya cargados siguen apuntando al miembro
+        correcto. Todo ocurre en una transacción; el cierre y la apertura
+        comparten la misma marca de tiempo.
+        
+        Args:
+            tabla: Tabla de dimensión (ej: 'dim_film')
+            df_origen: Atributos de staging, incluyendo hash_atributos
+            llave_natural: Columna de llave natural (ej: 'film_id')
+            llave_sk: Columna de llave surrogada (ej: 'film_sk')
+            
+        Returns:
+            (registros_nuevos, registros_actualizados)
+        """
+        fisica = self._t(tabla)
+        df_origen = df_origen.drop_duplicates(llave_natural, keep='last')
+        columnas = list(df_origen.columns)
+        
+        # Versiones activas actuales (cubiertas por el índice de hash)
+        df_activos = pd.read_sql(f"""
+            SELECT {llave_sk}, {llave_natural}, hash_atributos AS hash_actual, version
+            FROM {fisica}
+            WHERE activo = TRUE
+        """, self.engine_dm)
+        
+        # Filas cargadas antes de existir hash_atributos: hash de sus atributos guardados
+        df_backfill = pd.DataFrame(columns=[llave_sk, 'hash_atributos'])
+        if df_activos['hash_actual'].isna().any():
+            atributos = self.ATRIBUTOS_SCD[tabla]
+            df_backfill = pd.read_sql(f"""
+                SELECT {llave_sk}, {', '.join(atributos)}
+                FROM {fisica}
+                WHERE activo = TRUE AND hash_atributos IS NULL
+            """, self.engine_dm)
+            df_backfill['hash_atributos'] = self.calcular_hash_atributos(df_backfill, atributos)
+            df_activos['hash_actual'] = df_activos['hash_actual'].fillna(df_activos[llave_sk].map(
+                df_backfill.set_index(llave_sk)['hash_atributos']))
+        
+        # Diff en un solo join por llave natural: una comparación de hash por fila
+        df = df_origen.merge(df_activos, on=llave_natural, how='left')
+        es_nuevo = df[llave_sk].isna()
+        # SCD Type 2: cualquier cambio en atributos rastreados cierra la versión activa
+        es_cambio = ~es_nuevo & (df['hash_atributos'] != df['hash_actual'])
+        
+        ahora = datetime.now().replace(microsecond=0)
+        
+        df_insert = df.loc[es_nuevo | es_cambio, columnas].copy()
+        df_insert['version'] = (
+            df.loc[es_nuevo | es_cambio, 'version'].fillna(0).astype(int) + 1
+        ).values
+        df_insert['fecha_inicio'] = ahora
+        df_insert['activo'] = True
+        
+        sk_cerrados = df.loc[es_cambio, llave_sk].astype(int).tolist()
+        
+        with self.engine_dm.begin() as conn:
+            if len(df_backfill) > 0:
+                conn.execute(text(f"""
+                    UPDATE {fisica} SET hash_atributos = :hash_atributos WHERE {llave_sk} = :sk
+                """), [{"sk": int(sk), "hash_atributos": h}
+                       for sk, h in zip(df_backfill[llave_sk], df_backfill['hash_atributos'])])
+            
+            # Cerrar versiones anteriores
+            for inicio in range(0, len(sk_cerrados), Config.ETL_BATCH_SIZE):
+                lote = ", ".join(str(sk) for sk in sk_cerrados[inicio:inicio + Config.ETL_BATCH_SIZE])
+                conn.execute(text(f"""
+                    UPDATE {fisica}
+                    SET fecha_fin = :ahora, activo = FALSE
+                    WHERE {llave_sk} IN ({lote})
+                """), {"ahora": ahora})
+            
+            # Insertar nuevas versiones y miembros nuevos
+            if len(df_insert) > 0:
+                df_insert.to_sql(
+                    fisica,
+                    conn,
+                    if_exists='append',
+                    index=False,
+                    chunksize=Config.ETL_BATCH_SIZE
+                )
+        
+        # Los mapas llave natural -> SK del motor en proceso quedan obsoletos
+        if self._motor_hechos is not None and (es_nuevo.any() or es_cambio.any()):
+            self._motor_hechos.invalidar_mapas()
+        
+        return int(es_nuevo.sum()), int(es_cambio.sum())
+    
     def poblar_dim_film(self) -> Tuple[int, int]:
         """
-        Puebla dim_film desde staging (SCD Type 2)
+        Puebla dim_film desde staging (SCD Type 2, merge por hash de atributos)
         
         Returns:
             (registros_nuevos, registros_actualizados)
@@ -109,83 +326,20 @@ class DataMartTransformer:
         """
         
         df_film = pd.read_sql(query, self.engine_staging)
+        df_film['hash_atributos'] = self.calcular_hash_atributos(df_film, self.ATRIBUTOS_SCD['dim_film'])
         
-        # Cargar con SCD Type 2 simplificado
-        # Por ahora: INSERT ignorando duplicados
-        registros = 0
-        actualizados = 0
-        
-        for _, row in df_film.iterrows():
-            # Verificar si existe
-            query_check = text("""
-                SELECT film_sk, tarifa_renta 
-                FROM dim_film 
-                WHERE film_id = :film_id AND activo = TRUE
-            """)
-            
-            with self.engine_dm.connect() as conn:
-                result = conn.execute(query_check, {"film_id": row['film_id']})
-                existente = result.fetchone()
-                
-                if existente:
-                    # SCD Type 2: Si cambió tarifa, cerrar registro y crear nuevo
-                    if abs(existente[1] - row['tarifa_renta']) > 0.01:
-                        # Cerrar registro anterior
-                        query_close = text("""
-                            UPDATE dim_film
-                            SET fecha_fin = NOW(), activo = FALSE
-                            WHERE film_sk = :film_sk
-                        """)
-                        conn.execute(query_close, {"film_sk": existente[0]})
-                        
-                        # Insertar nuevo registro
-                        query_insert = text("""
-                            INSERT INTO dim_film 
-                            (film_id, titulo, descripcion, anio_lanzamiento, duracion,
-                             clasificacion, tarifa_renta, costo_reemplazo, version)
-                            VALUES (:film_id, :titulo, :desc, :anio, :duracion,
-                                    :clasif, :tarifa, :costo, :version)
-                        """)
-                        conn.execute(query_insert, {
-                            "film_id": row['film_id'],
-                            "titulo": row['titulo'],
-                            "desc": row['descripcion'],
-                            "anio": row['anio_lanzamiento'],
-                            "duracion": row['duracion'],
-                            "clasif": row['clasificacion'],
-                            "tarifa": row['tarifa_renta'],
-                            "costo": row['costo_reemplazo'],
-                            "version": 2
-                        })
-                        actualizados += 1
-                else:
-                    # Insertar nuevo film
-                    query_insert = text("""
-                        INSERT INTO dim_film 
-                        (film_id, titulo, descripcion, anio_lanzamiento, duracion,
-                         clasificacion, tarifa_renta, costo_reemplazo)
-                        VALUES (:film_id, :titulo, :desc, :anio, :duracion,
-                                :clasif, :tarifa, :costo)
-                    """)
-                    conn.execute(query_insert, {
-                        "film_id": row['film_id'],
-                        "titulo": row['titulo'],
-                        "desc": row['descripcion'],
-                        "anio": row['anio_lanzamiento'],
-                        "duracion": row['duracion'],
-                        "clasif": row['clasificacion'],
-                        "tarifa": row['tarifa_renta'],
-                        "costo": row['costo_reemplazo']
-                    })
-                    registros += 1
-                
-                conn.commit()
+        registros, actualizados = self._merge_scd2('dim_film', df_film, 'film_id', 'film_sk')
         
         self.logger.info(f"✅ dim_film: {registros} nuevos, {actualizados} actualizados")
         return registros, actualizados
     
-    def poblar_dim_categoria(self) -> int:
-        """Puebla dim_categoria desde staging"""
+    def poblar_dim_categoria(self) -> Tuple[int, int]:
+        """
+        Puebla dim_categoria desde staging (SCD Type 2, merge por hash de atributos)
+        
+        Returns:
+            (registros_nuevos, registros_actualizados)
+        """
         self.logger.info("📂 Poblando dim_categoria...")
         
         query = """
@@ -196,26 +350,22 @@ class DataMartTransformer:
         """
         
         df_categoria = pd.read_sql(query, self.engine_staging)
+        df_categoria['hash_atributos'] = self.calcular_hash_atributos(
+            df_categoria, self.ATRIBUTOS_SCD['dim_categoria'])
         
-        with self.engine_dm.connect() as conn:
-            try:
-                conn.execute(text("TRUNCATE TABLE dim_categoria"))
-                conn.commit()
-            except:
-                pass
-
-        registros = df_categoria.to_sql(
-            'dim_categoria',
-            self.engine_dm,
-            if_exists='append',
-            index=False
-        )
+        registros, actualizados = self._merge_scd2(
+            'dim_categoria', df_categoria, 'categoria_id', 'categoria_sk')
         
-        self.logger.info(f"✅ dim_categoria: {len(df_categoria)} registros")
-        return len(df_categoria)
+        self.logger.info(f"✅ dim_categoria: {registros} nuevos, {actualizados} actualizados")
+        return registros, actualizados
     
-    def poblar_dim_tienda(self) -> int:
-        """Puebla dim_tienda desde staging"""
+    def poblar_dim_tienda(self) -> Tuple[int, int]:
+        """
+        Puebla dim_tienda desde staging (SCD Type 2, merge por hash de atributos)
+        
+        Returns:
+            (registros_nuevos, registros_actualizados)
+        """
         self.logger.info("🏪 Poblando dim_tienda...")
         
         query = """
@@ -233,77 +383,1003 @@ class DataMartTransformer:
         """
         
         df_tienda = pd.read_sql(query, self.engine_staging)
+        df_tienda['hash_atributos'] = self.calcular_hash_atributos(
+            df_tienda, self.ATRIBUTOS_SCD['dim_tienda'])
         
-        with self.engine_dm.connect() as conn:
-            try:
-                conn.execute(text("TRUNCATE TABLE dim_tienda"))
-                conn.commit()
-            except:
-                pass
-
-        registros = df_tienda.to_sql(
-            'dim_tienda',
-            self.engine_dm,
-            if_exists='append',
-            index=False
-        )
+        registros, actualizados = self._merge_scd2(
+            'dim_tienda', df_tienda, 'tienda_id', 'tienda_sk')
         
-        self.logger.info(f"✅ dim_tienda: {len(df_tienda)} registros")
-        return len(df_tienda)
+        self.logger.info(f"✅ dim_tienda: {registros} nuevos, {actualizados} actualizados")
+        return registros, actualizados
     
-    def poblar_fact_ventas(self) -> int:
+    def _select_fact_ventas(self, join_particiones: str = "",
+                            esquema_staging: str = "sakila_staging", filtro: str = "") -> str:
         """
-        Puebla fact_ventas con datos agregados
+        SELECT agregado de fact_ventas desde staging
         
+        Args:
+            join_particiones: JOIN adicional para restringir las particiones (opcional)
+            esquema_staging: Base de datos de las tablas stg_*
+            filtro: Condición adicional del WHERE, empezando con AND (opcional)
+            
         Returns:
-            Número de registros insertados
+            Query SQL (sin INSERT)
         """
-        self.logger.info("💰 Poblando fact_ventas...")
-        
-        query = text("""
-            INSERT INTO fact_ventas 
-            (fecha_id, film_sk, categoria_sk, tienda_sk, cantidad_rentas, 
-             monto_total, monto_promedio, dias_renta_promedio, cantidad_devoluciones, etl_id)
+        # Los pagos llegan pre-agregados por renta (join 1:1). Cada renta pesa
+        # tantas filas como pagos tenga (mínimo 1), igual que el join directo
+        # a stg_payment, así promedios y devoluciones no cambian.
+        peso = "GREATEST(COALESCE(pr.cantidad_pagos, 0), 1)"
+        return f"""
             SELECT 
-                DATE_FORMAT(r.rental_date, '%Y%m%d') as fecha_id,
+                r.fecha_id,
                 df.film_sk,
                 dc.categoria_sk,
                 dt.tienda_sk,
-                COUNT(DISTINCT r.rental_id) as cantidad_rentas,
-                SUM(COALESCE(p.amount, 0)) as monto_total,
-                AVG(COALESCE(p.amount, 0)) as monto_promedio,
-                AVG(COALESCE(DATEDIFF(r.return_date, r.rental_date), 0)) as dias_renta_promedio,
-                SUM(CASE WHEN r.return_date IS NOT NULL THEN 1 ELSE 0 END) as cantidad_devoluciones,
+                COUNT(*) as cantidad_rentas,
+                SUM(COALESCE(pr.monto_total, 0)) as monto_total,
+                SUM(COALESCE(pr.monto_total, 0)) / SUM({peso}) as monto_promedio,
+                SUM(COALESCE(DATEDIFF(r.return_date, r.rental_date), 0) * {peso}) / SUM({peso}) as dias_renta_promedio,
+                SUM(CASE WHEN r.return_date IS NOT NULL THEN {peso} ELSE 0 END) as cantidad_devoluciones,
                 :etl_id as etl_id
-            FROM sakila_staging.stg_rental r
-            INNER JOIN sakila_staging.stg_inventory i ON r.inventory_id = i.inventory_id
-            INNER JOIN sakila_staging.stg_film f ON i.film_id = f.film_id
-            INNER JOIN sakila_staging.stg_film_category fc ON f.film_id = fc.film_id
-            LEFT JOIN sakila_staging.stg_payment p ON r.rental_id = p.rental_id
+            FROM {esquema_staging}.stg_rental r
+            INNER JOIN {esquema_staging}.stg_inventory i ON r.inventory_id = i.inventory_id
+            {join_particiones}
+            INNER JOIN {esquema_staging}.stg_film f ON i.film_id = f.film_id
+            INNER JOIN {esquema_staging}.stg_film_category fc ON f.film_id = fc.film_id
+            LEFT JOIN {esquema_staging}.stg_payment_rental pr ON r.rental_id = pr.rental_id
             -- Joins a dimensiones (solo activos)
-            INNER JOIN sakila_dw.dim_film df ON f.film_id = df.film_id AND df.activo = TRUE
-            INNER JOIN sakila_dw.dim_categoria dc ON fc.category_id = dc.categoria_id AND dc.activo = TRUE
-            INNER JOIN sakila_dw.dim_tienda dt ON i.store_id = dt.tienda_id AND dt.activo = TRUE
-            WHERE r.es_valido = TRUE OR r.es_valido IS NULL
+            INNER JOIN sakila_dw.{self._t('dim_film')} df ON f.film_id = df.film_id AND df.activo = TRUE
+            INNER JOIN sakila_dw.{self._t('dim_categoria')} dc ON fc.category_id = dc.categoria_id AND dc.activo = TRUE
+            INNER JOIN sakila_dw.{self._t('dim_tienda')} dt ON i.store_id = dt.tienda_id AND dt.activo = TRUE
+            WHERE (r.es_valido = TRUE OR r.es_valido IS NULL)
+            {filtro}
             GROUP BY 
-                DATE_FORMAT(r.rental_date, '%Y%m%d'),
+                r.fecha_id,
                 df.film_sk,
                 dc.categoria_sk,
                 dt.tienda_sk
+        """
+    
+    def detectar_particiones_afectadas(self) -> int:
+        """
+        Registra los pares (día, tienda) tocados por la ejecución actual
+        
+        Una partición se ve afectada si tiene rentas nuevas o modificadas
+        en este etl_id (incluye devoluciones tardías, que re-extraen la
+        renta) o si recibió pagos nuevos, aunque la renta sea antigua.
+        Se guardan en sakila_staging.etl_particiones_afectadas.
+        
+        Returns:
+            Número de particiones afectadas
+        """
+        query = text("""
+            INSERT IGNORE INTO etl_particiones_afectadas (etl_id, fecha_id, tienda_id)
+            SELECT DISTINCT :etl_id, r.fecha_id, i.store_id
+            FROM stg_rental r
+            INNER JOIN stg_inventory i ON r.inventory_id = i.inventory_id
+            WHERE r.etl_id = :etl_id
+               OR r.rental_id IN (
+                   SELECT p.rental_id FROM stg_payment p WHERE p.etl_id = :etl_id
+               )
         """)
         
+        with self.engine_staging.connect() as conn:
+            conn.execute(query, {"etl_id": self.etl_id})
+            conn.commit()
+            afectadas = conn.execute(text("""
+                SELECT COUNT(*) FROM etl_particiones_afectadas WHERE etl_id = :etl_id
+            """), {"etl_id": self.etl_id}).fetchone()[0]
+        
+        self.logger.info(f"   {afectadas:,} particiones (día × tienda) afectadas en ETL {self.etl_id}")
+        return afectadas
+    
+    def _rangos_fact_ventas(self, granularidad: str = None) -> List[Tuple[datetime, datetime]]:
+        """
+        Divide el rango de fechas de rentas en staging en tramos independientes
+        
+        Args:
+            granularidad: 'mes', 'semana' o 'dia' (default: Config.FACT_SLICE_GRANULARITY)
+            
+        Returns:
+            Lista de (desde, hasta) con hasta exclusivo
+        """
+        granularidad = granularidad or Config.FACT_SLICE_GRANULARITY
+        frecuencias = {'mes': 'M', 'semana': 'W-SUN', 'dia': 'D'}
+        
+        fecha_min, fecha_max = self._rango_fechas_hechos()
+        if fecha_min is None:
+            return []
+        
+        periodos = pd.period_range(fecha_min, fecha_max, freq=frecuencias[granularidad])
+        return [(p.start_time.to_pydatetime(), (p + 1).start_time.to_pydatetime())
+                for p in periodos]
+    
+    def _particiones_fact(self, conn) -> Dict[str, Optional[int]]:
+        """
+        Particiones RANGE de fact_ventas (o de su sombra)
+        
+        Returns:
+            Diccionario nombre -> límite superior exclusivo (None = MAXVALUE);
+            vacío si la tabla no está particionada
+        """
+        filas = conn.execute(text("""
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla
+              AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """), {"tabla": self._t('fact_ventas')}).fetchall()
+        
+        return {nombre: None if limite == 'MAXVALUE' else int(limite) for nombre, limite in filas}
+    
+    def asegurar_particiones_mensuales(self, rangos: List[Tuple[datetime, datetime]]) -> Dict[datetime, str]:
+        """
+        Garantiza una partición por mes para los tramos, separándola de pmax si falta
+        
+        Un mes solo se puede cargar por intercambio si tiene su propia
+        partición p<AAAAMM>; los meses posteriores a la última partición
+        acotada se crean con REORGANIZE PARTITION pmax. Los demás (ej: fechas
+        anteriores a la primera partición) se cargan con INSERT normal.
+        
+        Args:
+            rangos: Tramos (desde, hasta) de un mes calendario
+            
+        Returns:
+            Diccionario inicio del tramo -> nombre de la partición intercambiable
+        """
+        intercambiables = {}
+        
+        with self.engine_dm.connect() as conn:
+            particiones = self._particiones_fact(conn)
+            if 'pmax' not in particiones:
+                return intercambiables
+            
+            for desde, hasta in rangos:
+                nombre = f"p{desde:%Y%m}"
+                limite = int(hasta.strftime('%Y%m%d'))
+                acotadas = [l for l in particiones.values() if l is not None]
+                
+                if nombre not in particiones and (not acotadas or int(desde.strftime('%Y%m%d')) >= max(acotadas)):
+                    conn.execute(text(f"""
+                        ALTER TABLE {self._t('fact_ventas')} REORGANIZE PARTITION pmax INTO (
+                            PARTITION {nombre} VALUES LESS THAN ({limite}),
+                            PARTITION pmax VALUES LESS THAN MAXVALUE
+                        )
+                    """))
+                    particiones = self._particiones_fact(conn)
+                    self.logger.info(f"   Partición {nombre} creada")
+                
+                if particiones.get(nombre) == limite:
+                    intercambiables[desde] = nombre
+            conn.commit()
+        
+        return intercambiables
+    
+    def _cargar_tramo_por_intercambio(self, particion: str, query_select: str, params: Dict) -> int:
+        """
+        Carga un mes en una tabla de intercambio y la cambia por su partición
+        
+        La tabla de intercambio es una copia sin particionar de fact_ventas.
+        El INSERT pesado ocurre ahí, sin bloquear a los lectores; el EXCHANGE
+        PARTITION es una operación de metadatos que publica el mes completo y
+        deja las filas anteriores en la tabla de intercambio, que se elimina.
+        
+        CREATE TABLE ... LIKE reinicia el AUTO_INCREMENT: cada mes numera
+        venta_id desde AAAAMM × VENTA_ID_POR_PARTICION, así los tramos en
+        paralelo no repiten llaves (ver _ajustar_venta_id).
+        
+        Args:
+            particion: Partición destino (p<AAAAMM>)
+            query_select: SELECT agregado filtrado al mes
+            params: Parámetros de la query
+            
+        Returns:
+            Número de registros cargados
+        """
+        fact = self._t('fact_ventas')
+        intercambio = f"{fact}__{particion}"
+        
         with self.engine_dm.connect() as conn:
-            result = conn.execute(query, {"etl_id": self.etl_id})
+            conn.execute(text(f"DROP TABLE IF EXISTS {intercambio}"))
+            conn.execute(text(f"CREATE TABLE {intercambio} LIKE {fact}"))
+            conn.execute(text(f"ALTER TABLE {intercambio} REMOVE PARTITIONING"))
+            conn.execute(text(f"ALTER TABLE {intercambio} AUTO_INCREMENT = "
+                              f"{int(particion[1:]) * self.VENTA_ID_POR_PARTICION + 1}"))
             conn.commit()
-            registros = result.rowcount
         
-        self.logger.info(f"✅ fact_ventas: {registros:,} registros")
+        try:
+            with self.engine_dm.begin() as conn:
+                registros = conn.execute(text(f"""
+                    INSERT INTO {intercambio} 
+                    (fecha_id, film_sk, categoria_sk, tienda_sk, cantidad_rentas, 
+                     monto_total, monto_promedio, dias_renta_promedio, cantidad_devoluciones, etl_id)
+                    {query_select}
+                """), params).rowcount
+            
+            with self.engine_dm.connect() as conn:
+                # El filtro por fecha_id garantiza que las filas caen en la partición
+                conn.execute(text(f"""
+                    ALTER TABLE {fact} EXCHANGE PARTITION {particion}
+                    WITH TABLE {intercambio} WITHOUT VALIDATION
+                """))
+                conn.commit()
+        finally:
+            with self.engine_dm.connect() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {intercambio}"))
+                conn.commit()
+        
+        return registros
+    
+    def _cargar_tramo_fact_ventas(self, desde: datetime, hasta: datetime,
+                                  particion: str = None) -> Dict:
+        """
+        Carga un tramo de fechas de fact_ventas en su propia conexión y transacción
+        
+        Si el tramo tiene partición propia se carga por intercambio; si no,
+        se borran sus filas y se insertan de nuevo en una transacción. En
+        ambos casos recargar un tramo es idempotente.
+        
+        Args:
+            desde: Inicio del tramo (inclusive)
+            hasta: Fin del tramo (exclusivo)
+            particion: Partición intercambiable del tramo (opcional)
+            
+        Returns:
+            Estadísticas del tramo (desde, hasta, registros, segundos, intercambio)
+        """
+        query_select = self._select_fact_ventas(
+            filtro="AND r.fecha_id >= :fecha_desde AND r.fecha_id < :fecha_hasta")
+        params = {"etl_id": self.etl_id,
+                  "fecha_desde": int(desde.strftime('%Y%m%d')),
+                  "fecha_hasta": int(hasta.strftime('%Y%m%d'))}
+        
+        inicio = time.perf_counter()
+        if particion:
+            registros = self._cargar_tramo_por_intercambio(particion, query_select, params)
+        else:
+            with self.engine_dm.begin() as conn:
+                conn.execute(text(f"""
+                    DELETE FROM {self._t('fact_ventas')}
+                    WHERE fecha_id >= :fecha_desde AND fecha_id < :fecha_hasta
+                """), params)
+                if Config.FACT_SCD_ASOF:
+                    df_fact = self._obtener_motor_hechos().agregar(
+                        rango=(params['fecha_desde'], params['fecha_hasta']))
+                    registros = self._motor_hechos.cargar(df_fact, self.etl_id, conn)
+                elif self.staging_separado:
+                    registros = self._obtener_motor_hechos().cargar_en_flujo(
+                        self.etl_id, conn,
+                        filtro="AND r.fecha_id >= :fecha_desde AND r.fecha_id < :fecha_hasta",
+                        params=params)
+                else:
+                    registros = conn.execute(text(f"""
+                        INSERT INTO {self._t('fact_ventas')} 
+                        (fecha_id, film_sk, categoria_sk, tienda_sk, cantidad_rentas, 
+                         monto_total, monto_promedio, dias_renta_promedio, cantidad_devoluciones, etl_id)
+                        {query_select}
+                    """), params).rowcount
+        
+        return {
+            'desde': desde.strftime('%Y-%m-%d'),
+            'hasta': hasta.strftime('%Y-%m-%d'),
+            'registros': registros,
+            'segundos': round(time.perf_counter() - inicio, 3),
+            'intercambio': particion is not None
+        }
+    
+    def _poblar_fact_ventas_por_tramos(self, workers: int = None) -> int:
+        """
+        Carga fact_ventas por tramos de fechas en paralelo
+        
+        Cada tramo es independiente y hace commit por su cuenta, así los
+        bloqueos duran lo que dura un tramo y el servidor puede usar varios
+        hilos. El paralelismo está acotado por workers (cada worker usa una
+        conexión del pool). Con tramos mensuales y fact_ventas particionada,
+        cada mes se publica con EXCHANGE PARTITION.
+        
+        Args:
+            workers: Tramos simultáneos (default: Config.FACT_PARALLEL_WORKERS)
+            
+        Returns:
+            Número de registros insertados
+        """
+        workers = max(1, workers or Config.FACT_PARALLEL_WORKERS)
+        tramos = self.planificar_tramos_fact()
+        self.logger.info(f"   {len(tramos)} tramos ({Config.FACT_SLICE_GRANULARITY}), {workers} en paralelo")
+        
+        self.stats_tramos = []
+        padre = medicion_actual()
+        formato = '%Y-%m' if Config.FACT_SLICE_GRANULARITY == 'mes' else '%Y-%m-%d'
+        
+        def cargar(desde, hasta, particion):
+            with medir(f"fact:{desde.strftime(formato)}", 'transformacion', padre):
+                return self._cargar_tramo_fact_ventas(desde, hasta, particion)
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futuros = {pool.submit(cargar, desde, hasta, particion): desde
+                       for desde, hasta, particion in tramos}
+            for futuro in as_completed(futuros):
+                self._registrar_tramo(futuro.result())
+        
+        self.stats_tramos.sort(key=lambda t: t['desde'])
+        return sum(t['registros'] for t in self.stats_tramos)
+    
+    def planificar_tramos_fact(self) -> List[Tuple[datetime, datetime, Optional[str]]]:
+        """
+        Tramos de fechas de fact_ventas con su partición intercambiable
+        
+        Las particiones se crean aquí, antes de repartir los tramos:
+        REORGANIZE no admite concurrencia.
+        
+        Returns:
+            Lista de (desde, hasta, partición o None)
+        """
+        rangos = self._rangos_fact_ventas()
+        particiones = {}
+        if Config.FACT_SLICE_GRANULARITY == 'mes':
+            particiones = self.asegurar_particiones_mensuales(rangos)
+        return [(desde, hasta, particiones.get(desde)) for desde, hasta in rangos]
+    
+    def _registrar_tramo(self, tramo: Dict) -> None:
+        """Guarda y reporta las estadísticas de un tramo cargado"""
+        self.stats_tramos.append(tramo)
+        self.logger.info(f"   Tramo {tramo['desde']} → {tramo['hasta']}: "
+                        f"{tramo['registros']:,} registros en {tramo['segundos']:.2f}s"
+                        f"{' (intercambio)' if tramo['intercambio'] else ''}")
+    
+    def recargar_periodo(self, anio: int, mes: int) -> Dict:
+        """
+        Recalcula un mes de fact_ventas desde staging
+        
+        Con fact_ventas particionada el mes se reemplaza por intercambio de
+        partición, sin DELETE masivo.
+        
+        Args:
+            anio: Año del periodo
+            mes: Mes del periodo (1-12)
+            
+        Returns:
+            Estadísticas del tramo
+        """
+        desde = datetime(anio, mes, 1)
+        hasta = datetime(anio + mes // 12, mes % 12 + 1, 1)
+        # Con resolución as-of o staging en otro servidor el mes no se calcula con
+        # INSERT ... SELECT cruzado: se carga con DELETE + INSERT
+        particion = None if Config.FACT_SCD_ASOF or self.staging_separado else \
+            self.asegurar_particiones_mensuales([(desde, hasta)]).get(desde)
+        
+        tramo = self._cargar_tramo_fact_ventas(desde, hasta, particion)
+        self.actualizar_agregados([anio * 100 + mes])
+        self.logger.info(f"✅ Periodo {anio}-{mes:02d} recargado: {tramo['registros']:,} registros "
+                        f"({'intercambio de partición' if particion else 'DELETE + INSERT'})")
+        return tramo
+    
+    def _obtener_motor_hechos(self) -> FactEngine:
+        """Motor de agregación en proceso (se crea al primer uso y conserva sus mapas)"""
+        if self._motor_hechos is None:
+            self._motor_hechos = FactEngine(self.engine_staging, self.engine_dm, resolver=self._t)
+        return self._motor_hechos
+    
+    def poblar_fact_ventas(self, incremental: bool = None, motor: str = None,
+                           frames: Dict[str, pd.DataFrame] = None,
+                           carga_masiva: bool = None) -> int:
+        """
+        Puebla fact_ventas con datos agregados
+        
+        Completo: reemplaza todo el contenido de fact_ventas.
+        Incremental: borra y recalcula solo las particiones (día × tienda)
+        tocadas por el etl_id actual, en una sola transacción. Ambos modos
+        son idempotentes: re-ejecutar no duplica hechos.
+        
+        Args:
+            incremental: Modo incremental (default: self.incremental)
+            motor: 'sql' (INSERT ... SELECT en MySQL), 'pandas' (FactEngine) o
+                   'flujo' (pre-agregado en staging transmitido por lotes);
+                   default: Config.FACT_ENGINE ('sql' pasa a 'flujo' si staging
+                   está en otro servidor)
+            frames: DataFrames de staging ya en memoria (solo motor 'pandas')
+            carga_masiva: En carga completa, quitar los índices secundarios antes
+                          de cargar, recrearlos al final y validar la integridad
+                          referencial en una consulta (default: Config.FACT_BULK_LOAD)
+            
+        Returns:
+            Número de registros insertados
+        """
+        incremental = self.incremental if incremental is None else incremental
+        motor = self._resolver_motor(motor)
+        self.logger.info(f"💰 Poblando fact_ventas ({'incremental' if incremental else 'completo'}, "
+                        f"motor {motor})...")
+        
+        if not incremental:
+            masiva = Config.FACT_BULK_LOAD if carga_masiva is None else carga_masiva
+            self._iniciar_carga_completa(masiva)
+            inicio = time.perf_counter()
+            
+            try:
+                if motor == 'pandas':
+                    df_fact = self._obtener_motor_hechos().agregar(frames)
+                    with self.engine_dm.begin() as conn:
+                        registros = self._motor_hechos.cargar(df_fact, self.etl_id, conn)
+                elif motor == 'flujo':
+                    with self.engine_dm.begin() as conn:
+                        registros = self._obtener_motor_hechos().cargar_en_flujo(self.etl_id, conn)
+                else:
+                    registros = self._poblar_fact_ventas_por_tramos()
+            except Exception:
+                self.restaurar_indices_fact()
+                raise
+            
+            self._finalizar_carga_completa(registros, masiva, time.perf_counter() - inicio)
+            return registros
+        
+        if self.detectar_particiones_afectadas() == 0:
+            self.logger.info("✅ fact_ventas: sin particiones afectadas")
+            return 0
+        
+        if motor in ('pandas', 'flujo'):
+            particiones = pd.read_sql(text("""
+                SELECT fecha_id, tienda_id
+                FROM etl_particiones_afectadas
+                WHERE etl_id = :etl_id
+            """), self.engine_staging, params={"etl_id": self.etl_id})
+            
+            if motor == 'pandas':
+                df_fact = self._obtener_motor_hechos().agregar(frames, particiones)
+            
+            with self.engine_dm.begin() as conn:
+                eliminados = self._borrar_particiones(conn, particiones)
+                if motor == 'pandas':
+                    registros = self._motor_hechos.cargar(df_fact, self.etl_id, conn)
+                else:
+                    registros = self._obtener_motor_hechos().cargar_en_flujo(
+                        self.etl_id, conn,
+                        join_particiones="""
+                            INNER JOIN etl_particiones_afectadas pa
+                                ON pa.etl_id = :etl_id
+                               AND pa.fecha_id = r.fecha_id
+                               AND pa.tienda_id = i.store_id
+                        """,
+                        params={"etl_id": self.etl_id})
+        else:
+            query_delete = text(f"""
+                DELETE fv FROM {self._t('fact_ventas')} fv
+                INNER JOIN {self._t('dim_tienda')} dt ON fv.tienda_sk = dt.tienda_sk
+                INNER JOIN sakila_staging.etl_particiones_afectadas pa
+                    ON pa.etl_id = :etl_id
+                   AND pa.fecha_id = fv.fecha_id
+                   AND pa.tienda_id = dt.tienda_id
+            """)
+            
+            join_particiones = """
+                INNER JOIN sakila_staging.etl_particiones_afectadas pa
+                    ON pa.etl_id = :etl_id
+                   AND pa.fecha_id = r.fecha_id
+                   AND pa.tienda_id = i.store_id
+            """
+            
+            query_insert = text(f"""
+                INSERT INTO {self._t('fact_ventas')} 
+                (fecha_id, film_sk, categoria_sk, tienda_sk, cantidad_rentas, 
+                 monto_total, monto_promedio, dias_renta_promedio, cantidad_devoluciones, etl_id)
+                {self._select_fact_ventas(join_particiones)}
+            """)
+            
+            with self.engine_dm.begin() as conn:
+                eliminados = conn.execute(query_delete, {"etl_id": self.etl_id}).rowcount
+                registros = conn.execute(query_insert, {"etl_id": self.etl_id}).rowcount
+        
+        self.logger.info(f"✅ fact_ventas: {eliminados:,} hechos reemplazados por {registros:,} registros")
         return registros
     
-    def ejecutar_transformacion_completa(self) -> Dict[str, int]:
+    def _resolver_motor(self, motor: str = None) -> str:
+        """
+        Motor de agregación de fact_ventas para esta ejecución
+        
+        Args:
+            motor: Motor pedido (default: Config.FACT_ENGINE)
+            
+        Returns:
+            'sql', 'pandas' o 'flujo'
+        """
+        motor = motor or Config.FACT_ENGINE
+        if Config.FACT_SCD_ASOF and motor != 'pandas':
+            # El join por rango de vigencia en MySQL es lento; la resolución as-of es en proceso
+            self.logger.info("   FACT_SCD_ASOF activo: se usa el motor pandas")
+            motor = 'pandas'
+        elif motor == 'sql' and self.staging_separado:
+            # Sin joins entre esquemas: el SELECT cruzado no puede ejecutarse
+            self.logger.info("   Staging en otro servidor: se usa el motor flujo")
+            motor = 'flujo'
+        return motor
+    
+    def _iniciar_carga_completa(self, masiva: bool) -> None:
+        """Vacía fact_ventas y, en carga masiva, quita sus índices secundarios"""
+        with self.engine_dm.connect() as conn:
+            conn.execute(text(f"TRUNCATE TABLE {self._t('fact_ventas')}"))
+            conn.commit()
+        
+        self._indices_suspendidos = self._suspender_indices_fact() if masiva else []
+    
+    def _finalizar_carga_completa(self, registros: int, masiva: bool, segundos_carga: float) -> None:
+        """
+        Cierra una carga completa de fact_ventas: integridad, índices y estadísticas
+        
+        Args:
+            registros: Hechos insertados
+            masiva: Si la carga fue sin índices secundarios
+            segundos_carga: Duración de la carga
+            
+        Raises:
+            ValueError: Si hay hechos con llaves sin dimensión
+        """
+        indices, self._indices_suspendidos = self._indices_suspendidos, []
+        self._ajustar_venta_id()
+        self.stats_carga = {'carga_s': round(segundos_carga, 3)}
+        detalle = f"carga {self.stats_carga['carga_s']:.2f}s"
+        
+        if masiva:
+            inicio = time.perf_counter()
+            huerfanos = self.validar_integridad_fact()
+            self.stats_carga['integridad_s'] = round(time.perf_counter() - inicio, 3)
+            self.stats_carga['indices_s'] = round(self._reconstruir_indices_fact(indices), 3)
+            self.stats_carga['indices'] = len(indices)
+            self.stats_carga['huerfanos'] = huerfanos
+            detalle += f", {len(indices)} índices {self.stats_carga['indices_s']:.2f}s"
+            
+            if any(huerfanos.values()):
+                self.logger.error(f"❌ fact_ventas con llaves sin dimensión: {huerfanos}")
+                raise ValueError(f"Integridad referencial de fact_ventas: {huerfanos}")
+        
+        self.logger.info(f"✅ fact_ventas: {registros:,} registros ({detalle})")
+    
+    def _ajustar_venta_id(self) -> None:
+        """
+        Deja el AUTO_INCREMENT de fact_ventas por encima del mayor venta_id
+        
+        Los meses cargados por intercambio traen venta_id de su propio
+        bloque y el EXCHANGE no mueve el contador; sin este ajuste los
+        INSERT posteriores (incrementales) podrían repetir llaves.
+        """
+        fact = self._t('fact_ventas')
+        with self.engine_dm.connect() as conn:
+            maximo = conn.execute(text(f"SELECT MAX(venta_id) FROM {fact}")).scalar()
+            if maximo is not None:
+                conn.execute(text(f"ALTER TABLE {fact} AUTO_INCREMENT = {int(maximo) + 1}"))
+            conn.commit()
+    
+    def restaurar_indices_fact(self) -> None:
+        """
+        Recrea los índices quitados por una carga completa que falló
+        
+        Una tabla publicada no debe quedar sin índices; si fact_ventas es
+        una sombra no hace falta (las sombras se descartan).
+        """
+        indices, self._indices_suspendidos = self._indices_suspendidos, []
+        if indices and 'fact_ventas' not in self._tablas_activas:
+            self._reconstruir_indices_fact(indices)
+    
+    def _borrar_particiones(self, conn, particiones: pd.DataFrame) -> int:
+        """
+        Borra de fact_ventas los pares (día, tienda) indicados
+        
+        Las particiones se copian a una tabla temporal de la misma conexión
+        del Data Mart, así el DELETE no depende de leer staging (que puede
+        estar en otro servidor).
+        
+        Args:
+            conn: Conexión al Data Mart (dentro de la transacción del llamador)
+            particiones: DataFrame con fecha_id y tienda_id
+            
+        Returns:
+            Número de hechos eliminados
+        """
+        conn.execute(text("DROP TEMPORARY TABLE IF EXISTS tmp_particiones_afectadas"))
+        conn.execute(text("""
+            CREATE TEMPORARY TABLE tmp_particiones_afectadas (
+                fecha_id INT NOT NULL,
+                tienda_id INT NOT NULL,
+                PRIMARY KEY (fecha_id, tienda_id)
+            )
+        """))
+        conn.execute(text("""
+            INSERT INTO tmp_particiones_afectadas (fecha_id, tienda_id) VALUES (:fecha_id, :tienda_id)
+        """), [{"fecha_id": int(f), "tienda_id": int(t)}
+               for f, t in zip(particiones['fecha_id'], particiones['tienda_id'])])
+        
+        return conn.execute(text(f"""
+            DELETE fv FROM {self._t('fact_ventas')} fv
+            INNER JOIN {self._t('dim_tienda')} dt ON fv.tienda_sk = dt.tienda_sk
+            INNER JOIN tmp_particiones_afectadas pa
+                ON pa.fecha_id = fv.fecha_id
+               AND pa.tienda_id = dt.tienda_id
+        """)).rowcount
+    
+    def _suspender_indices_fact(self) -> List[Tuple[str, bool, List[str]]]:
+        """
+        Quita los índices secundarios no únicos de fact_ventas antes de una carga masiva
+        
+        Si fact_ventas es una tabla sombra sus índices ya se quitaron al
+        prepararla; se toman de los pendientes para crearlos al terminar la
+        carga y no al publicar.
+        
+        Returns:
+            Índices quitados (nombre, es_unico, columnas)
+        """
+        if 'fact_ventas' in self._pendientes_sombra:
+            indices, llaves = self._pendientes_sombra['fact_ventas']
+            self._pendientes_sombra['fact_ventas'] = ([i for i in indices if i[1]], llaves)
+            return [i for i in indices if not i[1]]
+        
+        fact = self._t('fact_ventas')
+        with self.engine_dm.connect() as conn:
+            indices = [i for i in self._indices_secundarios(conn, fact) if not i[1]]
+            if indices:
+                conn.execute(text(f"ALTER TABLE {fact} " +
+                                  ", ".join(f"DROP INDEX {nombre}" for nombre, _, _ in indices)))
+            conn.commit()
+        return indices
+    
+    def _reconstruir_indices_fact(self, indices: List[Tuple[str, bool, List[str]]]) -> float:
+        """
+        Crea los índices de fact_ventas después de la carga
+        
+        Todos los índices van en un solo ALTER TABLE (una lectura de la
+        tabla, ordenamiento por índice en lugar de inserciones fila a
+        fila). Dentro del ALTER, InnoDB ordena y construye con
+        innodb_ddl_threads hilos (MySQL 8.0.27+); en versiones sin esa
+        variable el ALTER se ejecuta igual, en un hilo.
+        
+        Args:
+            indices: Índices a crear (de _suspender_indices_fact)
+            
+        Returns:
+            Segundos de construcción
+        """
+        if not indices:
+            return 0.0
+        
+        inicio = time.perf_counter()
+        with self.engine_dm.connect() as conn:
+            try:
+                conn.execute(text(f"SET SESSION innodb_ddl_threads = {Config.FACT_INDEX_BUILD_THREADS}"))
+            except Exception:
+                conn.rollback()
+            conn.execute(text(f"ALTER TABLE {self._t('fact_ventas')} " + ", ".join(
+                f"ADD INDEX {nombre} ({', '.join(columnas)})" for nombre, _, columnas in indices)))
+            conn.commit()
+        return time.perf_counter() - inicio
+    
+    def validar_integridad_fact(self) -> Dict[str, int]:
+        """
+        Verifica la integridad referencial de fact_ventas en una sola consulta
+        
+        fact_ventas no tiene FOREIGN KEY (está particionada), así que la
+        carga no verifica fila a fila; este anti-join contra las cuatro
+        dimensiones lo reemplaza con un solo recorrido de la tabla.
+        
+        Returns:
+            Hechos huérfanos por dimensión
+        """
+        with self.engine_dm.connect() as conn:
+            fila = conn.execute(text(f"""
+                SELECT 
+                    COALESCE(SUM(t.fecha_id IS NULL), 0),
+                    COALESCE(SUM(df.film_sk IS NULL), 0),
+                    COALESCE(SUM(dc.categoria_sk IS NULL), 0),
+                    COALESCE(SUM(dt.tienda_sk IS NULL), 0)
+                FROM {self._t('fact_ventas')} fv
+                LEFT JOIN {self._t('dim_tiempo')} t ON fv.fecha_id = t.fecha_id
+                LEFT JOIN {self._t('dim_film')} df ON fv.film_sk = df.film_sk
+                LEFT JOIN {self._t('dim_categoria')} dc ON fv.categoria_sk = dc.categoria_sk
+                LEFT JOIN {self._t('dim_tienda')} dt ON fv.tienda_sk = dt.tienda_sk
+                WHERE t.fecha_id IS NULL OR df.film_sk IS NULL
+                   OR dc.categoria_sk IS NULL OR dt.tienda_sk IS NULL
+            """)).fetchone()
+        
+        return dict(zip(['dim_tiempo', 'dim_film', 'dim_categoria', 'dim_tienda'],
+                        (int(v) for v in fila)))
+    
+    def _meses_afectados(self) -> List[int]:
+        """
+        Meses (AAAAMM) de fact_ventas tocados por la ejecución incremental actual
+        
+        Returns:
+            Lista de meses ordenada
+        """
+        with self.engine_staging.connect() as conn:
+            filas = conn.execute(text("""
+                SELECT DISTINCT fecha_id DIV 100
+                FROM etl_particiones_afectadas
+                WHERE etl_id = :etl_id
+            """), {"etl_id": self.etl_id}).fetchall()
+        return sorted(int(f[0]) for f in filas)
+    
+    def actualizar_agregados(self, meses: List[int] = None) -> Dict[str, int]:
+        """
+        Actualiza las tablas agg_* a partir de los meses de fact_ventas tocados
+        
+        Cada agregado mensual se borra y se recalcula solo para los meses
+        indicados, leyendo únicamente esas particiones de fact_ventas. Los
+        totales por película se recalculan para las películas presentes en
+        esos meses (antes o después del cambio) y los KPIs globales se
+        derivan de los agregados. Todo en una transacción, así el dashboard
+        nunca ve agregados a medio actualizar.
+        
+        Args:
+            meses: Meses AAAAMM a recalcular (None = reconstruir todo)
+            
+        Returns:
+            Filas escritas por tabla de agregados
+        """
+        if meses is not None and len(meses) == 0:
+            self.logger.info("📊 Agregados: sin meses afectados")
+            return {}
+        
+        self.logger.info(f"📊 Actualizando agregados "
+                        f"({'todos los meses' if meses is None else f'{len(meses)} meses'})...")
+        
+        fact = self._t('fact_ventas')
+        if meses is None:
+            filtro_fact, filtro_mes = "1 = 1", "1 = 1"
+        else:
+            # Rangos de fecha_id (OR de BETWEEN) para que MySQL pode particiones
+            filtro_fact = " OR ".join(f"fv.fecha_id BETWEEN {m * 100 + 1} AND {m * 100 + 31}" for m in meses)
+            filtro_mes = f"anio_mes IN ({', '.join(str(m) for m in meses)})"
+        
+        metricas = """
+            SUM(fv.cantidad_rentas), SUM(fv.monto_total), SUM(fv.monto_promedio),
+            SUM(fv.dias_renta_promedio), COUNT(*), :etl_id
+        """
+        columnas = "total_rentas, ingresos_totales, suma_monto_promedio, suma_dias_promedio, filas_fact, etl_id"
+        
+        # Los conteos de películas y tiendas son por llave natural: cada versión
+        # SCD2 tiene su propia llave surrogada
+        join_film = f"JOIN {self._t('dim_film')} df ON fv.film_sk = df.film_sk"
+        join_tienda = f"JOIN {self._t('dim_tienda')} dt ON fv.tienda_sk = dt.tienda_sk"
+        
+        mensuales = {
+            'agg_ventas_mes_tienda': (
+                f"anio_mes, tienda_sk, {columnas}",
+                f"fv.fecha_id DIV 100, fv.tienda_sk, {metricas}",
+                "", "fv.fecha_id DIV 100, fv.tienda_sk"),
+            'agg_ventas_mes_categoria': (
+                f"anio_mes, categoria_sk, peliculas_rentadas, {columnas}",
+                f"fv.fecha_id DIV 100, fv.categoria_sk, COUNT(DISTINCT df.film_id), {metricas}",
+                join_film, "fv.fecha_id DIV 100, fv.categoria_sk"),
+            'agg_ventas_mes_film': (
+                f"anio_mes, film_sk, categoria_sk, {columnas}",
+                f"fv.fecha_id DIV 100, fv.film_sk, fv.categoria_sk, {metricas}",
+                "", "fv.fecha_id DIV 100, fv.film_sk, fv.categoria_sk"),
+            'agg_kpi_mes': (
+                f"anio_mes, peliculas_rentadas, tiendas_activas, {columnas}",
+                f"fv.fecha_id DIV 100, COUNT(DISTINCT df.film_id), COUNT(DISTINCT dt.tienda_id), {metricas}",
+                f"{join_film} {join_tienda}", "fv.fecha_id DIV 100")
+        }
+        
+        filas = {}
+        params = {"etl_id": self.etl_id}
+        
+        with self.engine_dm.begin() as conn:
+            # Películas con filas en los meses tocados antes del cambio
+            films = set()
+            if meses is not None:
+                films.update(r[0] for r in conn.execute(text(f"""
+                    SELECT DISTINCT film_sk FROM {self._t('agg_ventas_mes_film')} WHERE {filtro_mes}
+                """)))
+            
+            for tabla, (destino, select, joins, grupos) in mensuales.items():
+                conn.execute(text(f"DELETE FROM {self._t(tabla)} WHERE {filtro_mes}"))
+                filas[tabla] = conn.execute(text(f"""
+                    INSERT INTO {self._t(tabla)} ({destino})
+                    SELECT {select}
+                    FROM {fact} fv {joins}
+                    WHERE {filtro_fact}
+                    GROUP BY {grupos}
+                """), params).rowcount
+            
+            # ... y después del cambio
+            if meses is not None:
+                films.update(r[0] for r in conn.execute(text(f"""
+                    SELECT DISTINCT film_sk FROM {self._t('agg_ventas_mes_film')} WHERE {filtro_mes}
+                """)))
+                filtro_film = f"film_sk IN ({', '.join(str(f) for f in films)})" if films else "1 = 0"
+            else:
+                filtro_film = "1 = 1"
+            
+            conn.execute(text(f"DELETE FROM {self._t('agg_ventas_film')} WHERE {filtro_film}"))
+            filas['agg_ventas_film'] = conn.execute(text(f"""
+                INSERT INTO {self._t('agg_ventas_film')} (film_sk, categoria_sk, {columnas})
+                SELECT film_sk, categoria_sk, SUM(total_rentas), SUM(ingresos_totales),
+                       SUM(suma_monto_promedio), SUM(suma_dias_promedio), SUM(filas_fact), :etl_id
+                FROM {self._t('agg_ventas_mes_film')}
+                WHERE {filtro_film}
+                GROUP BY film_sk, categoria_sk
+            """), params).rowcount
+            
+            # KPIs globales: derivados de los agregados, nunca de fact_ventas
+            conn.execute(text(f"""
+                REPLACE INTO {self._t('agg_kpi_global')}
+                (id, total_rentas, total_ventas, suma_monto_promedio, suma_dias_promedio,
+                 filas_fact, total_peliculas_rentadas, total_tiendas, etl_id)
+                SELECT 1,
+                       COALESCE(SUM(k.total_rentas), 0), COALESCE(SUM(k.ingresos_totales), 0),
+                       COALESCE(SUM(k.suma_monto_promedio), 0), COALESCE(SUM(k.suma_dias_promedio), 0),
+                       COALESCE(SUM(k.filas_fact), 0),
+                       (SELECT COUNT(DISTINCT df.film_id) FROM {self._t('agg_ventas_film')} a
+                        JOIN {self._t('dim_film')} df ON a.film_sk = df.film_sk),
+                       (SELECT COUNT(DISTINCT dt.tienda_id) FROM {self._t('agg_ventas_mes_tienda')} a
+                        JOIN {self._t('dim_tienda')} dt ON a.tienda_sk = dt.tienda_sk),
+                       :etl_id
+                FROM {self._t('agg_kpi_mes')} k
+            """), params)
+            filas['agg_kpi_global'] = 1
+        
+        self.logger.info(f"✅ Agregados: " + ", ".join(f"{t} {n:,}" for t, n in filas.items()))
+        return filas
+    
+    def _indices_secundarios(self, conn, tabla: str) -> List[Tuple[str, bool, List[str]]]:
+        """
+        Índices secundarios (no PRIMARY) de una tabla del Data Mart
+        
+        Returns:
+            Lista de (nombre, es_unico, columnas en orden)
+        """
+        filas = conn.execute(text("""
+            SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla AND INDEX_NAME <> 'PRIMARY'
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """), {"tabla": tabla}).fetchall()
+        
+        indices = {}
+        for nombre, no_unico, columna in filas:
+            indices.setdefault(nombre, (nombre, not no_unico, []))[2].append(columna)
+        return list(indices.values())
+    
+    def _llaves_foraneas(self, conn, tabla: str) -> List[Tuple[List[str], str, List[str]]]:
+        """
+        Llaves foráneas de una tabla del Data Mart
+        
+        Returns:
+            Lista de (columnas, tabla_referenciada, columnas_referenciadas)
+        """
+        filas = conn.execute(text("""
+            SELECT CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+            FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla
+              AND REFERENCED_TABLE_NAME IS NOT NULL
+            ORDER BY CONSTRAINT_NAME, ORDINAL_POSITION
+        """), {"tabla": tabla}).fetchall()
+        
+        llaves = {}
+        for nombre, columna, referida, columna_referida in filas:
+            llave = llaves.setdefault(nombre, ([], referida, []))
+            llave[0].append(columna)
+            llave[2].append(columna_referida)
+        return list(llaves.values())
+    
+    def preparar_tablas_sombra(self) -> Dict[str, Tuple[List, List]]:
+        """
+        Crea copias sombra de las tablas del Data Mart para una carga completa
+        
+        Cada tabla de TABLAS_SOMBRA se clona con CREATE TABLE ... LIKE y se
+        le quitan los índices secundarios (se crean después de la carga).
+        Las dimensiones se copian con sus filas para conservar las llaves
+        surrogadas; fact_ventas empieza vacía. A partir de aquí todas las
+        cargas del transformador escriben en las sombras (ver _t).
+        
+        Returns:
+            Tabla -> (índices, llaves foráneas) a crear al publicar
+        """
+        self.logger.info("🌓 Preparando tablas sombra...")
+        self._pendientes_sombra = {}
+        
+        with self.engine_dm.connect() as conn:
+            for tabla in self.TABLAS_SOMBRA:
+                sombra = f"{tabla}{self.SUFIJO_SOMBRA}"
+                conn.execute(text(f"DROP TABLE IF EXISTS {sombra}"))
+                conn.execute(text(f"CREATE TABLE {sombra} LIKE {tabla}"))
+                
+                indices = self._indices_secundarios(conn, sombra)
+                if indices:
+                    conn.execute(text(f"ALTER TABLE {sombra} " +
+                                      ", ".join(f"DROP INDEX {nombre}" for nombre, _, _ in indices)))
+                
+                if tabla != 'fact_ventas':
+                    conn.execute(text(f"INSERT INTO {sombra} SELECT * FROM {tabla}"))
+                
+                self._pendientes_sombra[tabla] = (indices, self._llaves_foraneas(conn, tabla))
+                self._tablas_activas[tabla] = sombra
+            conn.commit()
+        
+        if self._motor_hechos is not None:
+            self._motor_hechos.invalidar_mapas()
+        
+        self.logger.info(f"   {len(self.TABLAS_SOMBRA)} tablas sombra listas")
+        return self._pendientes_sombra
+    
+    def _reanudar_tablas_sombra(self, pendientes: Dict[str, List]) -> None:
+        """
+        Vuelve a cargar sobre las tablas sombra de una ejecución fallida
+        
+        Args:
+            pendientes: Resultado de preparar_tablas_sombra (del checkpoint de 'dm:sombra')
+        """
+        self._pendientes_sombra = {tabla: (indices, llaves)
+                                   for tabla, (indices, llaves) in pendientes.items()}
+        for tabla in self.TABLAS_SOMBRA:
+            self._tablas_activas[tabla] = f"{tabla}{self.SUFIJO_SOMBRA}"
+        
+        if self._motor_hechos is not None:
+            self._motor_hechos.invalidar_mapas()
+    
+    def _huella_sombras(self) -> str:
+        """Tablas sombra existentes (si faltan, 'dm:sombra' no puede reanudarse)"""
+        sombras = ", ".join(f"'{tabla}{self.SUFIJO_SOMBRA}'" for tabla in self.TABLAS_SOMBRA)
+        with self.engine_dm.connect() as conn:
+            filas = conn.execute(text(f"""
+                SELECT TABLE_NAME
+                FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({sombras})
+                ORDER BY TABLE_NAME
+            """)).fetchall()
+        return ",".join(fila[0] for fila in filas)
+    
+    def publicar_tablas_sombra(self) -> None:
+        """
+        Crea los índices de las sombras y las publica con un RENAME TABLE atómico
+        
+        Los lectores ven las tablas anteriores completas hasta el RENAME y
+        las nuevas completas después; nunca un estado parcial. Las llaves
+        foráneas de las sombras apuntan a las dimensiones sombra y siguen
+        a sus tablas al renombrarlas.
+        """
+        self.logger.info("🌓 Publicando tablas sombra...")
+        
+        with self.engine_dm.connect() as conn:
+            for tabla in self.TABLAS_SOMBRA:
+                indices, llaves = self._pendientes_sombra[tabla]
+                clausulas = [f"ADD {'UNIQUE ' if unico else ''}INDEX {nombre} ({', '.join(columnas)})"
+                             for nombre, unico, columnas in indices]
+                clausulas += [f"ADD FOREIGN KEY ({', '.join(columnas)}) "
+                              f"REFERENCES {self._t(referida)} ({', '.join(columnas_referidas)})"
+                              for columnas, referida, columnas_referidas in llaves]
+                if clausulas:
+                    inicio = time.perf_counter()
+                    conn.execute(text(f"ALTER TABLE {self._t(tabla)} " + ", ".join(clausulas)))
+                    self.logger.info(f"   {tabla}: {len(clausulas)} índices/FK en "
+                                    f"{time.perf_counter() - inicio:.2f}s")
+            
+            # Un solo RENAME: primero se apartan las actuales, luego entran las sombras
+            renombres = [f"{tabla} TO {tabla}{self.SUFIJO_ANTERIOR}" for tabla in self.TABLAS_SOMBRA]
+            renombres += [f"{tabla}{self.SUFIJO_SOMBRA} TO {tabla}" for tabla in self.TABLAS_SOMBRA]
+            conn.execute(text("RENAME TABLE " + ", ".join(renombres)))
+            self._tablas_activas.clear()
+            
+            # fact_ventas primero: sus FK apuntan a las dimensiones anteriores
+            for tabla in reversed(self.TABLAS_SOMBRA):
+                conn.execute(text(f"DROP TABLE IF EXISTS {tabla}{self.SUFIJO_ANTERIOR}"))
+            conn.commit()
+        
+        self.logger.info("✅ Tablas sombra publicadas")
+    
+    def descartar_tablas_sombra(self) -> None:
+        """Elimina las tablas sombra sin publicarlas (ej: tras un error)"""
+        self._tablas_activas.clear()
+        with self.engine_dm.connect() as conn:
+            for tabla in reversed(self.TABLAS_SOMBRA):
+                conn.execute(text(f"DROP TABLE IF EXISTS {tabla}{self.SUFIJO_SOMBRA}"))
+            conn.commit()
+        self.logger.warning("🗑️ Tablas sombra descartadas")
+    
+    def ejecutar_transformacion_completa(self, sombra: bool = None) -> Dict[str, int]:
         """
         Ejecuta todo el proceso de transformación
         
+        Args:
+            sombra: Cargar en tablas sombra y publicarlas con RENAME atómico
+                    (default: Config.DM_SHADOW_SWAP en cargas completas; nunca en incrementales)
+            
         Returns:
             Estadísticas de transformación
         """
@@ -311,20 +1387,46 @@ class DataMartTransformer:
                                      "Creando modelo estrella")
         
         estadisticas = {}
+        if sombra is None:
+            sombra = Config.DM_SHADOW_SWAP and not self.incremental
         
         try:
+            if sombra:
+                self.preparar_tablas_sombra()
+            
             # 1. Poblar dimensiones
-            estadisticas['dim_tiempo'] = self.poblar_dim_tiempo()
+            with medir('dim_tiempo', 'transformacion'):
+                estadisticas['dim_tiempo'] = self.poblar_dim_tiempo()
             
-            nuevos, actualizados = self.poblar_dim_film()
+            with medir('dim_film', 'transformacion'):
+                nuevos, actualizados = self.poblar_dim_film()
             estadisticas['dim_film_nuevos'] = nuevos
             estadisticas['dim_film_actualizados'] = actualizados
             
-            estadisticas['dim_categoria'] = self.poblar_dim_categoria()
-            estadisticas['dim_tienda'] = self.poblar_dim_tienda()
+            with medir('dim_categoria', 'transformacion'):
+                nuevos, actualizados = self.poblar_dim_categoria()
+            estadisticas['dim_categoria_nuevos'] = nuevos
+            estadisticas['dim_categoria_actualizados'] = actualizados
+            
+            with medir('dim_tienda', 'transformacion'):
+                nuevos, actualizados = self.poblar_dim_tienda()
+            estadisticas['dim_tienda_nuevos'] = nuevos
+            estadisticas['dim_tienda_actualizados'] = actualizados
             
             # 2. Poblar hechos
-            estadisticas['fact_ventas'] = self.poblar_fact_ventas()
+            with medir('fact_ventas', 'transformacion'):
+                estadisticas['fact_ventas'] = self.poblar_fact_ventas()
+            estadisticas['fact_ventas_tramos'] = self.stats_tramos
+            estadisticas['fact_ventas_carga'] = self.stats_carga
+            
+            # 3. Agregados del dashboard (solo los meses tocados en incremental)
+            with medir('agregados', 'transformacion'):
+                estadisticas['agregados'] = self.actualizar_agregados(
+                    self._meses_afectados() if self.incremental else None)
+            
+            # 4. Publicar (los lectores ven el modelo completo de una vez)
+            if sombra:
+                self.publicar_tablas_sombra()
             
             self.etl_logger.log_etl_end("TRANSFORMACION_DM", exito=True, detalles={
                 'Dimensiones pobladas': 4,
@@ -336,11 +1438,196 @@ class DataMartTransformer:
             return estadisticas
             
         except Exception as e:
+            if self._tablas_activas:
+                self.descartar_tablas_sombra()
             self.etl_logger.log_etl_end("TRANSFORMACION_DM", exito=False, detalles={
                 'Error': str(e)
             })
             raise
     
+    def registrar_tareas(self, scheduler: DAGScheduler, dependencias: Dict[str, List[str]],
+                         estadisticas: Dict, sombra: bool = None) -> str:
+        """
+        Agrega la transformación al planificador DAG como tareas finas
+        
+        Cada dimensión espera solo a las tablas de staging que lee y
+        fact_ventas espera a las cuatro dimensiones. En carga completa con
+        motor SQL hay una tarea por tramo de fechas (ej: 'fact:2005-07'),
+        que se agregan al conocer el rango de staging; con los otros
+        motores o en incremental fact_ventas es una sola tarea.
+        
+        Las dimensiones y los tramos dejan checkpoint con la huella de sus
+        tablas de staging, que se calcula una vez por conjunto de tablas.
+        En modo sombra también 'dm:sombra', con la lista de sombras
+        existentes: si la ejecución falla y las sombras se conservan
+        (recuperar_error), al reanudar se sigue cargando en ellas; si ya
+        no están se preparan de nuevo y se rehace todo el Data Mart.
+        
+        Args:
+            scheduler: Planificador al que se agregan las tareas
+            dependencias: Tabla de staging -> tareas tras las cuales está lista
+            estadisticas: Diccionario donde las tareas dejan sus resultados
+                          (mismas claves que ejecutar_transformacion_completa)
+            sombra: Cargar en tablas sombra (default: Config.DM_SHADOW_SWAP
+                    en cargas completas)
+            
+        Returns:
+            Nombre de la última tarea de la transformación
+        """
+        def despues_de(*tablas) -> List[str]:
+            return sorted(set().union(*(dependencias.get(t, []) for t in tablas))) + previas
+        
+        # Staging no cambia durante la transformación: cada conjunto de tablas
+        # se mide una vez (la de los tramos la calcula 'fact:preparar')
+        huellas = {}
+        
+        def huella(*tablas):
+            def calcular():
+                if tablas not in huellas:
+                    huellas[tablas] = huella_tablas(self.engine_staging, list(tablas))
+                return huellas[tablas]
+            return calcular
+        
+        def guardar(clave: str, poblar):
+            def tarea():
+                estadisticas[clave] = poblar()
+                return estadisticas[clave]
+            return tarea
+        
+        def scd2(nombre: str, poblar):
+            def anotar(resultado):
+                estadisticas[f'{nombre}_nuevos'], estadisticas[f'{nombre}_actualizados'] = resultado
+            
+            def tarea():
+                resultado = list(poblar())
+                anotar(resultado)
+                return resultado
+            return tarea, anotar
+        
+        def dimension(nombre: str, funcion, restaurar, *tablas) -> str:
+            return scheduler.agregar(nombre, funcion, despues_de(*tablas), fase,
+                                     tablas, huella(*tablas), restaurar)
+        
+        fase = 'transformacion'
+        if sombra is None:
+            sombra = Config.DM_SHADOW_SWAP and not self.incremental
+        previas = []
+        if sombra:
+            previas = [scheduler.agregar('dm:sombra', self.preparar_tablas_sombra, fase=fase,
+                                         huella=self._huella_sombras,
+                                         restaurar=self._reanudar_tablas_sombra)]
+        
+        dimensiones = [
+            dimension('dim:tiempo', guardar('dim_tiempo', self.poblar_dim_tiempo),
+                      lambda r: estadisticas.__setitem__('dim_tiempo', r), 'stg_rental'),
+            dimension('dim:film', *scd2('dim_film', self.poblar_dim_film), 'stg_film'),
+            dimension('dim:categoria', *scd2('dim_categoria', self.poblar_dim_categoria), 'stg_category'),
+            dimension('dim:tienda', *scd2('dim_tienda', self.poblar_dim_tienda),
+                      'stg_store', 'stg_address', 'stg_city', 'stg_country')
+        ]
+        tablas_fact = ['stg_rental', 'stg_payment_rental', 'stg_inventory', 'stg_film_category']
+        entradas_fact = despues_de(*tablas_fact) + dimensiones
+        
+        motor = self._resolver_motor()
+        if not self.incremental and motor == 'sql':
+            masiva = Config.FACT_BULK_LOAD
+            inicio = {}
+            
+            def cargar_tramo(desde, hasta, particion):
+                def tarea():
+                    tramo = self._cargar_tramo_fact_ventas(desde, hasta, particion)
+                    self._registrar_tramo(tramo)
+                    return tramo
+                return tarea
+            
+            def preparar():
+                self.logger.info(f"💰 Poblando fact_ventas (completo, motor {motor}, por tramos)...")
+                self._iniciar_carga_completa(masiva)
+                return [list(i) for i in self._indices_suspendidos]
+            
+            def planificar():
+                # Siempre se ejecuta (también al reanudar) para crear las tareas de tramo
+                self.stats_tramos = []
+                inicio['carga'] = time.perf_counter()
+                formato = '%Y-%m' if Config.FACT_SLICE_GRANULARITY == 'mes' else '%Y-%m-%d'
+                for desde, hasta, particion in self.planificar_tramos_fact():
+                    tramo = scheduler.agregar(f"fact:{desde.strftime(formato)}",
+                                              cargar_tramo(desde, hasta, particion),
+                                              ['fact:planificar'], fase, tablas_fact,
+                                              huella(*tablas_fact), self._registrar_tramo)
+                    scheduler.agregar_dependencia('fact:finalizar', tramo)
+            
+            def finalizar():
+                self.stats_tramos.sort(key=lambda t: t['desde'])
+                registros = sum(t['registros'] for t in self.stats_tramos)
+                self._finalizar_carga_completa(registros, masiva, time.perf_counter() - inicio['carga'])
+                estadisticas['fact_ventas'] = registros
+                estadisticas['fact_ventas_tramos'] = self.stats_tramos
+                estadisticas['fact_ventas_carga'] = self.stats_carga
+            
+            scheduler.agregar('fact:preparar', preparar, entradas_fact, fase, tablas_fact,
+                              huella(*tablas_fact), self._reanudar_carga_completa)
+            scheduler.agregar('fact:planificar', planificar, ['fact:preparar'], fase, tablas_fact)
+            ultima = scheduler.agregar('fact:finalizar', finalizar, ['fact:planificar'], fase, tablas_fact)
+        else:
+            def poblar():
+                estadisticas['fact_ventas'] = self.poblar_fact_ventas(motor=motor)
+                estadisticas['fact_ventas_tramos'] = self.stats_tramos
+                estadisticas['fact_ventas_carga'] = self.stats_carga
+                return estadisticas['fact_ventas']
+            
+            ultima = scheduler.agregar('fact:ventas', poblar, entradas_fact, fase, tablas_fact,
+                                       huella(*tablas_fact),
+                                       lambda r: estadisticas.__setitem__('fact_ventas', r))
+        
+        # Agregados del dashboard (solo los meses tocados en incremental)
+        ultima = scheduler.agregar('dm:agregados', lambda: estadisticas.__setitem__(
+            'agregados', self.actualizar_agregados(self._meses_afectados() if self.incremental else None)),
+            [ultima], fase)
+        
+        if sombra:
+            ultima = scheduler.agregar('dm:publicar', self.publicar_tablas_sombra, [ultima], fase)
+        return ultima
+    
+    def _reanudar_carga_completa(self, indices: List[List]) -> None:
+        """
+        Retoma una carga completa de fact_ventas interrumpida
+        
+        Los índices que la carga quitó y que siguen faltando (la ejecución
+        fallida no llegó a recrearlos) se recrean al finalizar la carga. En
+        modo sombra se quitan de los pendientes de publicar, como hace
+        _suspender_indices_fact (el checkpoint de 'dm:sombra' los incluye).
+        
+        Args:
+            indices: Índices quitados, del checkpoint de 'fact:preparar'
+        """
+        if 'fact_ventas' in self._pendientes_sombra:
+            suspendidos = {i[0] for i in indices}
+            pendientes, llaves = self._pendientes_sombra['fact_ventas']
+            self._pendientes_sombra['fact_ventas'] = (
+                [i for i in pendientes if i[0] not in suspendidos], llaves)
+        
+        fact = self._t('fact_ventas')
+        with self.engine_dm.connect() as conn:
+            existentes = {nombre for nombre, _, _ in self._indices_secundarios(conn, fact)}
+        self._indices_suspendidos = [tuple(i) for i in indices if i[0] not in existentes]
+    
+    def recuperar_error(self, conservar_sombras: bool = False) -> None:
+        """
+        Deja el Data Mart consistente tras una transformación fallida (sombras o índices)
+        
+        Args:
+            conservar_sombras: Dejar las tablas sombra sin publicar para
+                               reanudar la carga (en vez de descartarlas)
+        """
+        if self._tablas_activas and conservar_sombras:
+            self._tablas_activas.clear()
+            self.logger.warning("🌓 Tablas sombra conservadas sin publicar (reanudar con --resume)")
+        elif self._tablas_activas:
+            self.descartar_tablas_sombra()
+        else:
+            self.restaurar_indices_fact()
+    
     def cerrar_conexiones(self):
         """Cierra conexiones"""
         self.engine_staging.dispose()
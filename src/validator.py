@@ -3,10 +3,16 @@ Módulo de Validaciones de Calidad de Datos
 RF8: Validaciones de calidad de datos
 """
 
+import hashlib
+import json
+import math
+import threading
+import numpy as np
 import pandas as pd
+from statistics import NormalDist
 from sqlalchemy import create_engine, text
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Tuple
 import sys
 from pathlib import Path
 
@@ -15,25 +21,65 @@ sys.path.insert(0, str(project_root))
 
 from config.config import Config
 from src.logger_config import ETLLogger
+from src.key_sets import KeySetCache
+from src.stream_validator import (StreamValidator, DuplicateCheck, NullCheck,
+                                  RangeCheck, ForeignKeyCheck)
 
 class DataValidator:
     """Validador de calidad de datos en staging"""
     
-    def __init__(self, etl_id: int = None):
+    def __init__(self, etl_id: int = None, modo: str = None,
+                 cache_llaves: KeySetCache = None):
         """
         Inicializa el validador
         
         Args:
             etl_id: ID de la ejecución ETL actual
+            modo: 'exacto' o 'muestreo' (default: Config.VALIDATION_MODE)
+            cache_llaves: Caché de llaves padre compartida (opcional)
         """
         self.etl_logger = ETLLogger('validator', Config.ETL_LOG_PATH, Config.ETL_LOG_LEVEL)
         self.logger = self.etl_logger.get_logger()
         
         self.engine_staging = create_engine(Config.get_staging_connection_string())
+        self.engine_dm = None
         self.etl_id = etl_id
+        self.modo = modo or Config.VALIDATION_MODE
+        self.cache_llaves = cache_llaves or KeySetCache()
+        
+        # Buffer de resultados para audit_calidad (se vacía con un INSERT multi-fila)
+        self.tamano_buffer = Config.AUDIT_BUFFER_SIZE
+        self._buffer_auditoria: List[Dict] = []
+        self._buffer_activo = False
+        
+        # Caché de resultados por huella de las tablas de entrada
+        self._cache = None
+        self._cache_pendiente: List[Dict] = []
+        self._huellas: Dict[str, str] = {}
+        self.validaciones_cacheadas = 0
+        
+        # El planificador DAG ejecuta validaciones en varios hilos: el buffer y
+        # la caché se protegen con un lock y la captura es propia de cada hilo
+        self._lock = threading.RLock()
+        self._local = threading.local()
         
         self.logger.info("✅ Validador inicializado correctamente")
     
+    @property
+    def _captura(self):
+        """Registros de la validación en curso en este hilo (None fuera de una)"""
+        return getattr(self._local, 'captura', None)
+    
+    @_captura.setter
+    def _captura(self, valor):
+        self._local.captura = valor
+    
+    def _obtener_engine_dm(self):
+        """Crea bajo demanda la conexión al Data Mart (solo para reconciliación)"""
+        if self.engine_dm is None:
+            self.engine_dm = create_engine(Config.get_dm_connection_string())
+        return self.engine_dm
+    
     def registrar_validacion(self, tabla_origen: str, tabla_destino: str,
                             validacion: str, resultado: str, 
                             valor_esperado: str = None, valor_obtenido: str = None,
@@ -41,6 +87,9 @@ class DataValidator:
         """
         Registra resultado de validación en audit_calidad
         
+        Durante ejecutar_validaciones_staging el registro se acumula en un
+        buffer en memoria; fuera de esa fase se escribe inmediatamente.
+        
         Args:
             tabla_origen: Tabla origen
             tabla_destino: Tabla destino
@@ -50,16 +99,8 @@ class DataValidator:
             valor_obtenido: Valor obtenido (opcional)
             mensaje: Mensaje adicional (opcional)
         """
-        query = text("""
-            INSERT INTO audit_calidad 
-            (etl_id, tabla_origen, tabla_destino, validacion, resultado,
-             valor_esperado, valor_obtenido, mensaje)
-            VALUES (:etl_id, :tabla_origen, :tabla_destino, :validacion, :resultado,
-                    :esperado, :obtenido, :mensaje)
-        """)
-        
-        with self.engine_staging.connect() as conn:
-            conn.execute(query, {
+        with self._lock:
+            self._buffer_auditoria.append({
                 "etl_id": self.etl_id,
                 "tabla_origen": tabla_origen,
                 "tabla_destino": tabla_destino,
@@ -69,7 +110,53 @@ class DataValidator:
                 "obtenido": str(valor_obtenido) if valor_obtenido else None,
                 "mensaje": mensaje
             })
-            conn.commit()
+        
+        # Registros de la validación en curso, para la caché de resultados
+        if self._captura is not None:
+            self._captura.append({
+                "tabla_origen": tabla_origen,
+                "tabla_destino": tabla_destino,
+                "validacion": validacion,
+                "resultado": resultado,
+                "valor_esperado": str(valor_esperado) if valor_esperado else None,
+                "valor_obtenido": str(valor_obtenido) if valor_obtenido else None,
+                "mensaje": mensaje
+            })
+        
+        if not self._buffer_activo or len(self._buffer_auditoria) >= self.tamano_buffer:
+            self.vaciar_buffer_auditoria()
+    
+    def vaciar_buffer_auditoria(self) -> int:
+        """
+        Escribe en audit_calidad todos los registros pendientes del buffer
+        
+        Returns:
+            Número de registros escritos
+        """
+        query = text("""
+            INSERT INTO audit_calidad 
+            (etl_id, tabla_origen, tabla_destino, validacion, resultado,
+             valor_esperado, valor_obtenido, mensaje)
+            VALUES (:etl_id, :tabla_origen, :tabla_destino, :validacion, :resultado,
+                    :esperado, :obtenido, :mensaje)
+        """)
+        
+        with self._lock:
+            if not self._buffer_auditoria:
+                return 0
+            
+            registros = list(self._buffer_auditoria)
+            
+            # executemany: el driver lo reescribe como un único INSERT multi-fila
+            with self.engine_staging.connect() as conn:
+                conn.execute(query, registros)
+                conn.commit()
+            
+            # Solo se descartan del buffer una vez confirmados
+            del self._buffer_auditoria[:len(registros)]
+        
+        self.logger.debug(f"📝 {len(registros)} resultados escritos en audit_calidad")
+        return len(registros)
     
     def validar_no_duplicados(self, tabla: str, columnas_pk: List[str]) -> bool:
         """
@@ -244,6 +331,107 @@ class DataValidator:
             )
             return True
     
+    def _cargar_llaves(self, tabla: str, columna: str) -> pd.Series:
+        """Lee la columna de llaves de una tabla como enteros"""
+        df = pd.read_sql(f"SELECT {columna} FROM {tabla} WHERE {columna} IS NOT NULL",
+                         self.engine_staging)
+        return df[columna].astype('int64')
+    
+    def validar_integridad_referencial_memoria(self, tabla_hija: str, columna_fk: str,
+                                               tabla_padre: str, columna_pk: str,
+                                               estructura: str = None,
+                                               max_ejemplos: int = 10) -> bool:
+        """
+        Valida integridad referencial sondeando las FK contra llaves en memoria
+        
+        Alternativa a validar_integridad_referencial que no depende de índices
+        en staging: las llaves de la tabla padre se cargan una vez (y se
+        reutilizan entre checks vía self.cache_llaves) y la columna FK de la
+        tabla hija se lee por lotes y se busca de forma vectorizada. Con
+        estructura 'bloom' los aciertos se confirman con una segunda pasada
+        exacta por PK en la tabla padre.
+        
+        Args:
+            tabla_hija: Tabla con FK
+            columna_fk: Columna FK
+            tabla_padre: Tabla con PK
+            columna_pk: Columna PK
+            estructura: 'ordenado' o 'bloom' (default: Config.VALIDATION_FK_STRUCTURE)
+            max_ejemplos: Número máximo de llaves huérfanas de ejemplo a reportar
+            
+        Returns:
+            True si no hay llaves huérfanas
+        """
+        estructura = estructura or Config.VALIDATION_FK_STRUCTURE
+        conjunto = self.cache_llaves.obtener(
+            tabla_padre, columna_pk, estructura,
+            lambda: self._cargar_llaves(tabla_padre, columna_pk)
+        )
+        
+        huerfanas = 0
+        ejemplos = set()
+        candidatos = pd.Series(dtype='int64')
+        
+        query = f"SELECT {columna_fk} FROM {tabla_hija} WHERE {columna_fk} IS NOT NULL"
+        for lote in pd.read_sql(query, self.engine_staging, chunksize=Config.ETL_BATCH_SIZE * 10):
+            valores = lote[columna_fk].astype('int64').to_numpy()
+            encontrados = conjunto.contiene(valores)
+            
+            faltantes = valores[~encontrados]
+            huerfanas += len(faltantes)
+            if len(ejemplos) < max_ejemplos:
+                ejemplos.update(np.unique(faltantes)[:max_ejemplos].tolist())
+            
+            if not conjunto.exacto:
+                # Contar filas por llave para la segunda pasada
+                conteo = pd.Series(valores[encontrados]).value_counts()
+                candidatos = candidatos.add(conteo, fill_value=0)
+        
+        if not conjunto.exacto and len(candidatos) > 0:
+            # Segunda pasada exacta: confirmar aciertos del filtro por PK
+            existentes = set()
+            llaves = candidatos.index.to_numpy()
+            for inicio in range(0, len(llaves), Config.ETL_BATCH_SIZE):
+                lote = ", ".join(str(int(k)) for k in llaves[inicio:inicio + Config.ETL_BATCH_SIZE])
+                with self.engine_staging.connect() as conn:
+                    result = conn.execute(text(
+                        f"SELECT {columna_pk} FROM {tabla_padre} WHERE {columna_pk} IN ({lote})"
+                    ))
+                    existentes.update(int(r[0]) for r in result)
+            
+            falsos_positivos = candidatos[~candidatos.index.isin(existentes)]
+            huerfanas += int(falsos_positivos.sum())
+            ejemplos.update(falsos_positivos.index[:max_ejemplos].tolist())
+        
+        ejemplos = sorted(int(k) for k in ejemplos)[:max_ejemplos]
+        detalle = f"{estructura}, {conjunto.bytes:,} bytes"
+        
+        if huerfanas > 0:
+            self.logger.error(f"❌ {huerfanas} llaves huérfanas: {tabla_hija}.{columna_fk} → {tabla_padre}.{columna_pk}")
+            self.registrar_validacion(
+                tabla_hija, tabla_padre, "Integridad Referencial", "FAIL",
+                "0", str(huerfanas),
+                f"FK {columna_fk} tiene llaves sin correspondencia en {tabla_padre} "
+                f"(en memoria: {detalle}). Ejemplos: {ejemplos}"
+            )
+            return False
+        else:
+            self.logger.info(f"✅ Integridad referencial OK: {tabla_hija}.{columna_fk} → {tabla_padre}.{columna_pk}")
+            self.registrar_validacion(
+                tabla_hija, tabla_padre, "Integridad Referencial", "PASS",
+                "0", "0", f"Todas las FK tienen correspondencia (en memoria: {detalle})"
+            )
+            return True
+    
+    def _validar_fk(self, tabla_hija: str, columna_fk: str,
+                    tabla_padre: str, columna_pk: str) -> bool:
+        """Ejecuta el check de FK con la implementación configurada (SQL o en memoria)"""
+        if Config.VALIDATION_FK_MODE == 'memoria':
+            return self.validar_integridad_referencial_memoria(
+                tabla_hija, columna_fk, tabla_padre, columna_pk)
+        return self.validar_integridad_referencial(
+            tabla_hija, columna_fk, tabla_padre, columna_pk)
+    
     def validar_consistencia_totales(self, tabla_origen: str, tabla_destino: str,
                                     columna_suma: str) -> bool:
         """
@@ -284,60 +472,816 @@ class DataValidator:
             )
             return True
     
-    def ejecutar_validaciones_staging(self) -> Dict[str, bool]:
+    def _totales_staging_por_dia(self, filtro: str = "") -> str:
         """
-        Ejecuta todas las validaciones sobre las tablas de staging
+        Query de totales diarios por tienda desde staging, con la misma
+        semántica que poblar_fact_ventas (rentas válidas, pagos por renta)
+        """
+        return f"""
+            SELECT 
+                r.fecha_id,
+                i.store_id AS tienda_id,
+                COUNT(*) AS rentas,
+                CAST(SUM(COALESCE(pg.monto, 0)) AS DECIMAL(14,2)) AS monto
+            FROM stg_rental r
+            INNER JOIN stg_inventory i ON r.inventory_id = i.inventory_id
+            INNER JOIN stg_film_category fc ON i.film_id = fc.film_id
+            LEFT JOIN (
+                SELECT rental_id, SUM(amount) AS monto
+                FROM stg_payment
+                GROUP BY rental_id
+            ) pg ON r.rental_id = pg.rental_id
+            WHERE (r.es_valido = TRUE OR r.es_valido IS NULL) {filtro}
+            GROUP BY r.fecha_id, i.store_id
+        """
+    
+    def _totales_fact_por_dia(self, filtro: str = "") -> str:
+        """Query de totales diarios por tienda desde fact_ventas"""
+        return f"""
+            SELECT 
+                fv.fecha_id,
+                dt.tienda_id,
+                SUM(fv.cantidad_rentas) AS rentas,
+                CAST(SUM(fv.monto_total) AS DECIMAL(14,2)) AS monto
+            FROM fact_ventas fv
+            INNER JOIN dim_tienda dt ON fv.tienda_sk = dt.tienda_sk
+            WHERE 1 = 1 {filtro}
+            GROUP BY fv.fecha_id, dt.tienda_id
+        """
+    
+    @staticmethod
+    def _checksum_particiones(query_diaria: str) -> str:
+        """
+        Agrega totales diarios a particiones mes × tienda con un checksum
+        de contenido (BIT_XOR de CRC32 por día), que detecta diferencias
+        que se compensan dentro del mes
+        """
+        return f"""
+            SELECT 
+                LEFT(d.fecha_id, 6) AS periodo,
+                d.tienda_id,
+                SUM(d.rentas) AS rentas,
+                SUM(d.monto) AS monto,
+                BIT_XOR(CRC32(CONCAT_WS('|', d.fecha_id, d.rentas, d.monto))) AS checksum
+            FROM ({query_diaria}) d
+            GROUP BY LEFT(d.fecha_id, 6), d.tienda_id
+        """
+    
+    def validar_reconciliacion_particionada(self, max_dias_reportados: int = 10) -> bool:
+        """
+        Reconcilia staging contra fact_ventas por mes y tienda
+        
+        Nivel 1: cada lado calcula por partición (mes × tienda) el total de
+        rentas, el monto y un checksum de sus totales diarios; solo viajan
+        esas filas. Nivel 2: para las particiones que no coinciden se bajan
+        los totales diarios de ambos lados y se reportan los días con
+        diferencias. Cada partición descuadrada queda en audit_calidad.
         
+        Args:
+            max_dias_reportados: Días con diferencia a detallar por partición
+            
         Returns:
-            Diccionario con resultados de validaciones
+            True si todas las particiones coinciden
         """
-        self.etl_logger.log_etl_start("VALIDACIONES", "Validando calidad de datos en staging")
+        self.logger.info("🔍 Reconciliando staging → fact_ventas por mes y tienda...")
+        engine_dm = self._obtener_engine_dm()
         
-        resultados = {}
+        df_origen = pd.read_sql(text(self._checksum_particiones(self._totales_staging_por_dia())),
+                                self.engine_staging)
+        df_destino = pd.read_sql(text(self._checksum_particiones(self._totales_fact_por_dia())),
+                                 engine_dm)
+        
+        for df in (df_origen, df_destino):
+            df['periodo'] = df['periodo'].astype(str)
+            df['tienda_id'] = df['tienda_id'].astype('int64')
+        
+        df_comp = df_origen.merge(
+            df_destino, on=['periodo', 'tienda_id'], how='outer',
+            suffixes=('_origen', '_destino'), indicator=True
+        )
+        for col in ['rentas_origen', 'rentas_destino', 'monto_origen', 'monto_destino']:
+            df_comp[col] = pd.to_numeric(df_comp[col]).fillna(0)
+        
+        descuadre = (
+            (df_comp['_merge'] != 'both') |
+            (df_comp['rentas_origen'] != df_comp['rentas_destino']) |
+            ((df_comp['monto_origen'] - df_comp['monto_destino']).abs() > 0.01) |
+            (df_comp['checksum_origen'] != df_comp['checksum_destino'])
+        )
+        df_descuadre = df_comp[descuadre]
+        
+        self.logger.info(f"   {len(df_comp)} particiones comparadas, {len(df_descuadre)} con diferencias")
+        
+        # Nivel 2: detalle diario solo de las particiones descuadradas
+        for _, part in df_descuadre.iterrows():
+            inicio = int(part['periodo']) * 100
+            rango = f"BETWEEN {inicio + 1} AND {inicio + 31}"
+            tienda = int(part['tienda_id'])
+            
+            df_dia_origen = pd.read_sql(text(self._totales_staging_por_dia(
+                f"AND r.fecha_id {rango} AND i.store_id = {tienda}"
+            )), self.engine_staging)
+            df_dia_destino = pd.read_sql(text(self._totales_fact_por_dia(
+                f"AND fv.fecha_id {rango} AND dt.tienda_id = {tienda}"
+            )), engine_dm)
+            
+            for df in (df_dia_origen, df_dia_destino):
+                df['fecha_id'] = df['fecha_id'].astype('int64')
+            
+            df_dias = df_dia_origen.merge(
+                df_dia_destino, on=['fecha_id', 'tienda_id'], how='outer',
+                suffixes=('_origen', '_destino')
+            ).fillna(0)
+            df_dias = df_dias[
+                (df_dias['rentas_origen'] != df_dias['rentas_destino']) |
+                ((pd.to_numeric(df_dias['monto_origen']) - 
+                  pd.to_numeric(df_dias['monto_destino'])).abs() > 0.01)
+            ]
+            
+            dias = ", ".join(
+                f"{int(d.fecha_id)}: {int(d.rentas_origen)}/{int(d.rentas_destino)} rentas, "
+                f"{float(d.monto_origen):.2f}/{float(d.monto_destino):.2f}"
+                for d in df_dias.head(max_dias_reportados).itertuples()
+            )
+            
+            self.logger.warning(
+                f"⚠️  Partición {part['periodo']} tienda {tienda}: "
+                f"{len(df_dias)} días con diferencias"
+            )
+            self.registrar_validacion(
+                'stg_rental', 'fact_ventas', f"Reconciliación {part['periodo']} tienda {tienda}",
+                "FAIL",
+                f"{int(part['rentas_origen'])} / {part['monto_origen']:.2f}",
+                f"{int(part['rentas_destino'])} / {part['monto_destino']:.2f}",
+                f"{len(df_dias)} días con diferencias (origen/destino): {dias}"
+            )
+        
+        if len(df_descuadre) == 0:
+            self.logger.info("✅ fact_ventas reconcilia con staging en todas las particiones")
+            self.registrar_validacion(
+                'stg_rental', 'fact_ventas', "Reconciliación por partición", "PASS",
+                f"{len(df_comp)} particiones", f"{len(df_comp)} coinciden",
+                f"Rentas {int(df_comp['rentas_origen'].sum()):,}, "
+                f"monto {df_comp['monto_origen'].sum():,.2f}"
+            )
+        
+        self.vaciar_buffer_auditoria()
+        return len(df_descuadre) == 0
+    
+    @staticmethod
+    def calcular_tamano_muestra(poblacion: int, confianza: float, margen_error: float) -> int:
+        """
+        Calcula el tamaño de muestra para estimar una proporción
+        
+        Usa la fórmula de Cochran con p = 0.5 (caso más conservador) y
+        corrección por población finita.
+        
+        Args:
+            poblacion: Número de filas de la tabla
+            confianza: Nivel de confianza (ej: 0.95)
+            margen_error: Error máximo admitido en la tasa estimada (ej: 0.01)
+            
+        Returns:
+            Número de filas a muestrear
+        """
+        if poblacion <= 0:
+            return 0
+        
+        z = NormalDist().inv_cdf(1 - (1 - confianza) / 2)
+        n0 = (z ** 2) * 0.25 / (margen_error ** 2)
+        n = n0 / (1 + (n0 - 1) / poblacion)
+        
+        return min(poblacion, math.ceil(n))
+    
+    @staticmethod
+    def intervalo_confianza(violaciones: int, n: int, 
+                            confianza: float) -> Tuple[float, float, float]:
+        """
+        Estima la tasa de violaciones con intervalo de confianza de Wilson
+        
+        Args:
+            violaciones: Filas de la muestra que violan la regla
+            n: Tamaño de la muestra
+            confianza: Nivel de confianza
+            
+        Returns:
+            (tasa_estimada, limite_inferior, limite_superior)
+        """
+        if n == 0:
+            return 0.0, 0.0, 1.0
+        
+        z = NormalDist().inv_cdf(1 - (1 - confianza) / 2)
+        p = violaciones / n
+        denominador = 1 + z ** 2 / n
+        centro = (p + z ** 2 / (2 * n)) / denominador
+        amplitud = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominador
+        
+        return p, max(0.0, centro - amplitud), min(1.0, centro + amplitud)
+    
+    def obtener_muestra(self, tabla: str, columna_pk: str, columnas: List[str],
+                        confianza: float = None, margen_error: float = None,
+                        estrategia: str = None) -> pd.DataFrame:
+        """
+        Obtiene una muestra aleatoria de una tabla leyendo solo por PK
+        
+        Se generan PKs aleatorias dentro de [MIN, MAX] y se leen con IN (...),
+        de modo que el costo es proporcional al tamaño de la muestra y no al
+        de la tabla. Con estrategia 'estratificado' el rango de PK se divide
+        en estratos del mismo ancho y cada uno aporta la misma cuota.
+        
+        Args:
+            tabla: Nombre de la tabla
+            columna_pk: PK entera de la tabla
+            columnas: Columnas a leer
+            confianza: Nivel de confianza (default: Config)
+            margen_error: Margen de error (default: Config)
+            estrategia: 'uniforme' o 'estratificado' (default: Config)
+            
+        Returns:
+            DataFrame con la muestra
+        """
+        confianza = confianza or Config.VALIDATION_CONFIDENCE
+        margen_error = margen_error or Config.VALIDATION_ERROR_MARGIN
+        estrategia = estrategia or Config.VALIDATION_SAMPLING_STRATEGY
+        
+        query_rango = text(f"SELECT MIN({columna_pk}), MAX({columna_pk}) FROM {tabla}")
+        query_filas = text("""
+            SELECT TABLE_ROWS FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla
+        """)
+        
+        with self.engine_staging.connect() as conn:
+            pk_min, pk_max = conn.execute(query_rango).fetchone()
+            fila = conn.execute(query_filas, {"tabla": tabla}).fetchone()
+            poblacion = fila[0] if fila and fila[0] else None
+            if not poblacion:
+                poblacion = conn.execute(text(f"SELECT COUNT(*) FROM {tabla}")).fetchone()[0]
+        
+        campos = ", ".join(dict.fromkeys([columna_pk] + columnas))
+        
+        if pk_min is None:
+            return pd.DataFrame(columns=list(dict.fromkeys([columna_pk] + columnas)))
+        
+        n = self.calcular_tamano_muestra(poblacion, confianza, margen_error)
+        rango = int(pk_max) - int(pk_min) + 1
+        
+        # Sobremuestrear según la densidad de PKs para compensar huecos
+        densidad = min(1.0, poblacion / rango)
+        n_candidatos = min(rango, math.ceil(n / densidad * 1.1))
+        
+        rng = np.random.default_rng(self.etl_id)
+        if estrategia == 'estratificado':
+            n_estratos = max(1, min(20, n_candidatos))
+            limites = np.linspace(int(pk_min), int(pk_max) + 1, n_estratos + 1).astype(np.int64)
+            cuota = math.ceil(n_candidatos / n_estratos)
+            candidatos = np.concatenate([
+                rng.integers(limites[i], max(limites[i] + 1, limites[i + 1]), size=cuota)
+                for i in range(n_estratos)
+            ])
+        else:
+            candidatos = rng.integers(int(pk_min), int(pk_max) + 1, size=n_candidatos)
+        candidatos = np.unique(candidatos)
+        
+        partes = []
+        for inicio in range(0, len(candidatos), Config.ETL_BATCH_SIZE):
+            lote = ", ".join(str(int(pk)) for pk in candidatos[inicio:inicio + Config.ETL_BATCH_SIZE])
+            partes.append(pd.read_sql(
+                f"SELECT {campos} FROM {tabla} WHERE {columna_pk} IN ({lote})",
+                self.engine_staging
+            ))
+        df_muestra = pd.concat(partes, ignore_index=True)
+        
+        if len(df_muestra) > n:
+            df_muestra = df_muestra.sample(n=n, random_state=rng.integers(2 ** 31))
+        
+        self.logger.info(f"🎲 Muestra {estrategia} de {tabla}: {len(df_muestra):,} de ~{poblacion:,} filas")
+        return df_muestra
+    
+    def _evaluar_muestra(self, tabla_origen: str, tabla_destino: str, validacion: str,
+                         violaciones: pd.Series, verificacion_exhaustiva,
+                         confianza: float = None) -> bool:
+        """
+        Evalúa una regla sobre una muestra y registra la tasa estimada
+        
+        Regla de escalamiento: si el límite superior del intervalo de
+        confianza supera VALIDATION_ESCALATION_THRESHOLD se descarta el
+        resultado muestral y se ejecuta la validación exhaustiva.
+        
+        Args:
+            tabla_origen: Tabla evaluada
+            tabla_destino: Tabla destino (o padre en integridad referencial)
+            validacion: Nombre de la validación
+            violaciones: Serie booleana, True si la fila viola la regla
+            verificacion_exhaustiva: Función sin argumentos que ejecuta el check exacto
+            confianza: Nivel de confianza (default: Config)
+            
+        Returns:
+            True si la validación pasa
+        """
+        confianza = confianza or Config.VALIDATION_CONFIDENCE
+        n = len(violaciones)
+        total_violaciones = int(violaciones.sum())
+        tasa, ic_inf, ic_sup = self.intervalo_confianza(total_violaciones, n, confianza)
+        
+        if ic_sup > Config.VALIDATION_ESCALATION_THRESHOLD:
+            self.logger.warning(
+                f"⚠️  {validacion} en {tabla_origen}: tasa estimada {tasa:.2%} "
+                f"(IC sup. {ic_sup:.2%}) supera umbral, escalando a validación exhaustiva"
+            )
+            return verificacion_exhaustiva()
+        
+        intervalo = f"{tasa:.4%} [{ic_inf:.4%}, {ic_sup:.4%}]"
+        detalle = f"Muestreo n={n:,}, confianza {confianza:.0%}: {total_violaciones} violaciones"
+        
+        if total_violaciones > 0:
+            self.logger.warning(f"⚠️  {validacion} en {tabla_origen}: tasa estimada {intervalo}")
+            self.registrar_validacion(
+                tabla_origen, tabla_destino, f"{validacion} (muestreo)", "FAIL",
+                "0", intervalo, detalle
+            )
+            return False
+        else:
+            self.logger.info(f"✅ {validacion} en {tabla_origen}: tasa estimada {intervalo}")
+            self.registrar_validacion(
+                tabla_origen, tabla_destino, f"{validacion} (muestreo)", "PASS",
+                "0", intervalo, detalle
+            )
+            return True
+    
+    def validar_valores_nulos_muestreo(self, tabla: str, columna_pk: str,
+                                       columnas_requeridas: List[str]) -> bool:
+        """
+        Versión por muestreo de validar_valores_nulos
+        
+        Args:
+            tabla: Nombre de la tabla
+            columna_pk: PK entera usada para muestrear
+            columnas_requeridas: Columnas que no deben ser NULL
+            
+        Returns:
+            True si ninguna columna tiene nulos estimados
+        """
+        df_muestra = self.obtener_muestra(tabla, columna_pk, columnas_requeridas)
+        
+        resultados = [
+            self._evaluar_muestra(
+                tabla, tabla, f"Nulos en {columna}",
+                df_muestra[columna].isna(),
+                lambda columna=columna: self.validar_valores_nulos(tabla, [columna])
+            )
+            for columna in columnas_requeridas
+        ]
+        return all(resultados)
+    
+    def validar_rangos_numericos_muestreo(self, tabla: str, columna_pk: str, columna: str,
+                                          min_val: float = None, max_val: float = None) -> bool:
+        """
+        Versión por muestreo de validar_rangos_numericos
+        
+        Args:
+            tabla: Nombre de la tabla
+            columna_pk: PK entera usada para muestrear
+            columna: Columna a validar
+            min_val: Valor mínimo permitido
+            max_val: Valor máximo permitido
+            
+        Returns:
+            True si no se estiman valores fuera de rango
+        """
+        if min_val is None and max_val is None:
+            return True
+        
+        df_muestra = self.obtener_muestra(tabla, columna_pk, [columna])
+        valores = pd.to_numeric(df_muestra[columna], errors='coerce')
+        
+        fuera_rango = pd.Series(False, index=valores.index)
+        if min_val is not None:
+            fuera_rango |= valores < min_val
+        if max_val is not None:
+            fuera_rango |= valores > max_val
+        
+        return self._evaluar_muestra(
+            tabla, tabla, f"Rango {columna}", fuera_rango,
+            lambda: self.validar_rangos_numericos(tabla, columna, min_val, max_val)
+        )
+    
+    def validar_integridad_referencial_muestreo(self, tabla_hija: str, columna_pk_hija: str,
+                                                columna_fk: str, tabla_padre: str,
+                                                columna_pk: str) -> bool:
+        """
+        Versión por muestreo de validar_integridad_referencial
+        
+        Las FK de la muestra se buscan en la tabla padre por PK, sin JOIN
+        sobre la tabla hija completa.
+        
+        Args:
+            tabla_hija: Tabla con FK
+            columna_pk_hija: PK entera de la tabla hija usada para muestrear
+            columna_fk: Columna FK
+            tabla_padre: Tabla con PK
+            columna_pk: Columna PK
+            
+        Returns:
+            True si no se estiman llaves huérfanas
+        """
+        df_muestra = self.obtener_muestra(tabla_hija, columna_pk_hija, [columna_fk])
+        llaves = df_muestra[columna_fk].dropna().astype('int64').unique()
+        
+        existentes = set()
+        for inicio in range(0, len(llaves), Config.ETL_BATCH_SIZE):
+            lote = ", ".join(str(int(k)) for k in llaves[inicio:inicio + Config.ETL_BATCH_SIZE])
+            with self.engine_staging.connect() as conn:
+                result = conn.execute(text(
+                    f"SELECT {columna_pk} FROM {tabla_padre} WHERE {columna_pk} IN ({lote})"
+                ))
+                existentes.update(int(r[0]) for r in result)
+        
+        huerfanas = df_muestra[columna_fk].notna() & ~df_muestra[columna_fk].isin(existentes)
+        
+        return self._evaluar_muestra(
+            tabla_hija, tabla_padre, "Integridad Referencial", huerfanas,
+            lambda: self.validar_integridad_referencial(
+                tabla_hija, columna_fk, tabla_padre, columna_pk)
+        )
+    
+    def definir_validaciones_staging(self) -> List[Tuple[str, List[str], Callable[[], bool]]]:
+        """
+        Define las validaciones de staging con las tablas que leen
+        
+        Returns:
+            Lista de (clave, tablas de entrada, función de validación)
+        """
+        muestreo = self.modo == 'muestreo'
+        validaciones = []
         
         # Validar rental
-        self.logger.info("🔍 Validando stg_rental...")
-        resultados['rental_no_dup'] = self.validar_no_duplicados('stg_rental', ['rental_id'])
-        resultados['rental_no_null'] = self.validar_valores_nulos('stg_rental', 
-            ['rental_id', 'rental_date', 'inventory_id', 'customer_id'])
+        validaciones.append(('rental_no_dup', ['stg_rental'],
+            lambda: self.validar_no_duplicados('stg_rental', ['rental_id'])))
+        if muestreo:
+            validaciones.append(('rental_no_null', ['stg_rental'],
+                lambda: self.validar_valores_nulos_muestreo('stg_rental',
+                    'rental_id', ['rental_date', 'inventory_id', 'customer_id'])))
+        else:
+            validaciones.append(('rental_no_null', ['stg_rental'],
+                lambda: self.validar_valores_nulos('stg_rental',
+                    ['rental_id', 'rental_date', 'inventory_id', 'customer_id'])))
         
         # Validar payment
-        self.logger.info("🔍 Validando stg_payment...")
-        resultados['payment_no_dup'] = self.validar_no_duplicados('stg_payment', ['payment_id'])
-        resultados['payment_no_null'] = self.validar_valores_nulos('stg_payment',
-            ['payment_id', 'customer_id', 'amount', 'payment_date'])
-        resultados['payment_montos'] = self.validar_rangos_numericos('stg_payment', 'amount', 
-            min_val=0, max_val=100)
+        validaciones.append(('payment_no_dup', ['stg_payment'],
+            lambda: self.validar_no_duplicados('stg_payment', ['payment_id'])))
+        if muestreo:
+            validaciones.append(('payment_no_null', ['stg_payment'],
+                lambda: self.validar_valores_nulos_muestreo('stg_payment',
+                    'payment_id', ['customer_id', 'amount', 'payment_date'])))
+            validaciones.append(('payment_montos', ['stg_payment'],
+                lambda: self.validar_rangos_numericos_muestreo('stg_payment',
+                    'payment_id', 'amount', min_val=0, max_val=100)))
+        else:
+            validaciones.append(('payment_no_null', ['stg_payment'],
+                lambda: self.validar_valores_nulos('stg_payment',
+                    ['payment_id', 'customer_id', 'amount', 'payment_date'])))
+            validaciones.append(('payment_montos', ['stg_payment'],
+                lambda: self.validar_rangos_numericos('stg_payment', 'amount',
+                    min_val=0, max_val=100)))
         
         # Validar film
-        self.logger.info("🔍 Validando stg_film...")
-        resultados['film_no_dup'] = self.validar_no_duplicados('stg_film', ['film_id'])
-        resultados['film_rates'] = self.validar_rangos_numericos('stg_film', 'rental_rate',
-            min_val=0, max_val=10)
+        validaciones.append(('film_no_dup', ['stg_film'],
+            lambda: self.validar_no_duplicados('stg_film', ['film_id'])))
+        validaciones.append(('film_rates', ['stg_film'],
+            lambda: self.validar_rangos_numericos('stg_film', 'rental_rate',
+                min_val=0, max_val=10)))
         
         # Validar integridad referencial
-        self.logger.info("🔍 Validando integridad referencial...")
-        resultados['rental_inventory_fk'] = self.validar_integridad_referencial(
-            'stg_rental', 'inventory_id', 'stg_inventory', 'inventory_id')
-        resultados['inventory_film_fk'] = self.validar_integridad_referencial(
-            'stg_inventory', 'film_id', 'stg_film', 'film_id')
-        resultados['store_address_fk'] = self.validar_integridad_referencial(
-            'stg_store', 'address_id', 'stg_address', 'address_id')
+        if muestreo:
+            validaciones.append(('rental_inventory_fk', ['stg_rental', 'stg_inventory'],
+                lambda: self.validar_integridad_referencial_muestreo(
+                    'stg_rental', 'rental_id', 'inventory_id', 'stg_inventory', 'inventory_id')))
+        else:
+            validaciones.append(('rental_inventory_fk', ['stg_rental', 'stg_inventory'],
+                lambda: self._validar_fk(
+                    'stg_rental', 'inventory_id', 'stg_inventory', 'inventory_id')))
+        validaciones.append(('inventory_film_fk', ['stg_inventory', 'stg_film'],
+            lambda: self._validar_fk('stg_inventory', 'film_id', 'stg_film', 'film_id')))
+        validaciones.append(('store_address_fk', ['stg_store', 'stg_address'],
+            lambda: self._validar_fk('stg_store', 'address_id', 'stg_address', 'address_id')))
+        
+        return validaciones
+    
+    @staticmethod
+    def calcular_huella(engine, tabla: str) -> str:
+        """
+        Calcula la huella de contenido de una tabla
+        
+        Combina número de filas y CHECKSUM TABLE (que incluye etl_id en
+        staging), de modo que detecta tanto cargas nuevas como UPDATE/DELETE
+        de la limpieza. Sirve también para las tablas de Sakila.
+        
+        Args:
+            engine: Engine de la base de datos de la tabla
+            tabla: Nombre de la tabla
+            
+        Returns:
+            Huella como texto
+        """
+        with engine.connect() as conn:
+            filas = conn.execute(text(f"SELECT COUNT(*) FROM {tabla}")).fetchone()[0]
+            checksum = conn.execute(text(f"CHECKSUM TABLE {tabla}")).fetchone()[1]
+        return f"{filas}:{checksum}"
+    
+    def huella_tabla(self, tabla: str) -> str:
+        """
+        Huella de contenido de una tabla de staging (ver calcular_huella)
+        
+        Se memoriza durante la fase (las validaciones no modifican datos).
+        
+        Args:
+            tabla: Nombre de la tabla
+            
+        Returns:
+            Huella como texto
+        """
+        if tabla not in self._huellas:
+            self._huellas[tabla] = self.calcular_huella(self.engine_staging, tabla)
+        return self._huellas[tabla]
+    
+    def _huella_validacion(self, clave: str, tablas: List[str]) -> str:
+        """Huella de una validación: definición + huellas de sus tablas de entrada"""
+        partes = [clave, self.modo, Config.VALIDATION_FK_MODE] + [
+            f"{tabla}={self.huella_tabla(tabla)}" for tabla in tablas
+        ]
+        return hashlib.sha256("|".join(partes).encode('utf-8')).hexdigest()
+    
+    def _cargar_cache_validaciones(self) -> None:
+        """Lee la caché de resultados (cache_validaciones) al inicio de la fase"""
+        try:
+            df = pd.read_sql(
+                "SELECT clave, huella, resultado, etl_id, registros FROM cache_validaciones",
+                self.engine_staging
+            )
+            self._cache = {fila.clave: fila for fila in df.itertuples()}
+        except Exception as e:
+            self.logger.warning(f"⚠️  Caché de validaciones no disponible, se ejecutará todo: {e}")
+            self._cache = None
+    
+    def _guardar_cache_validaciones(self) -> None:
+        """Escribe las entradas nuevas de la caché con un único upsert multi-fila"""
+        with self._lock:
+            pendientes, self._cache_pendiente = self._cache_pendiente, []
+        if not pendientes or self._cache is None:
+            return
+        
+        query = text("""
+            INSERT INTO cache_validaciones (clave, huella, resultado, etl_id, registros, fecha)
+            VALUES (:clave, :huella, :resultado, :etl_id, :registros, :fecha)
+            ON DUPLICATE KEY UPDATE
+                huella = VALUES(huella),
+                resultado = VALUES(resultado),
+                etl_id = VALUES(etl_id),
+                registros = VALUES(registros),
+                fecha = VALUES(fecha)
+        """)
+        
+        with self.engine_staging.connect() as conn:
+            conn.execute(query, pendientes)
+            conn.commit()
+    
+    def _ejecutar_con_cache(self, clave: str, tablas: List[str],
+                            validacion: Callable[[], bool]) -> bool:
+        """
+        Ejecuta una validación salvo que sus tablas de entrada no hayan cambiado
+        
+        En un acierto de caché se re-registran en audit_calidad los mismos
+        resultados de la ejecución original, marcados como [cache].
+        
+        Args:
+            clave: Clave de la validación
+            tablas: Tablas que lee la validación
+            validacion: Función que ejecuta la validación
+            
+        Returns:
+            Resultado de la validación
+        """
+        if self._cache is None:
+            return validacion()
+        
+        huella = self._huella_validacion(clave, tablas)
+        entrada = self._cache.get(clave)
+        
+        if entrada is not None and entrada.huella == huella:
+            self.logger.info(f"♻️  {clave}: sin cambios en {', '.join(tablas)} (resultado de ETL {entrada.etl_id})")
+            registros = json.loads(entrada.registros) if isinstance(entrada.registros, str) else []
+            for registro in registros:
+                registro['mensaje'] = f"[cache ETL {entrada.etl_id}] {registro['mensaje'] or ''}"
+                self.registrar_validacion(**registro)
+            with self._lock:
+                self.validaciones_cacheadas += 1
+            return bool(entrada.resultado)
+        
+        self._captura = []
+        try:
+            resultado = validacion()
+            registros = self._captura
+        finally:
+            self._captura = None
+        
+        with self._lock:
+            self._cache_pendiente.append({
+                "clave": clave,
+                "huella": huella,
+                "resultado": bool(resultado),
+                "etl_id": self.etl_id,
+                "registros": json.dumps(registros, ensure_ascii=False),
+                "fecha": datetime.now()
+            })
+        return resultado
+    
+    def ejecutar_validaciones_staging(self) -> Dict[str, bool]:
+        """
+        Ejecuta todas las validaciones sobre las tablas de staging
+        
+        Los resultados de auditoría se acumulan en memoria y se escriben en
+        audit_calidad con un INSERT multi-fila al final de la fase (o al
+        alcanzar AUDIT_BUFFER_SIZE), incluso si alguna validación falla.
+        Con VALIDATION_CACHE activo solo se ejecutan las validaciones cuyas
+        tablas de entrada cambiaron desde la última ejecución registrada.
+        
+        Returns:
+            Diccionario con resultados de validaciones
+        """
+        resultados = {}
+        self.iniciar_validaciones()
+        
+        try:
+            tabla_actual = None
+            for clave, tablas, validacion in self.definir_validaciones_staging():
+                if tablas[0] != tabla_actual:
+                    tabla_actual = tablas[0]
+                    self.logger.info(f"🔍 Validando {tabla_actual}...")
+                resultados[clave] = self.ejecutar_validacion(clave, tablas, validacion)
+        except Exception:
+            # Vaciar siempre el buffer, también si la fase falla
+            self._cerrar_fase_validaciones()
+            raise
+        
+        return self.finalizar_validaciones(resultados)
+    
+    def iniciar_validaciones(self) -> None:
+        """Abre la fase de validaciones: buffer de auditoría, huellas y caché"""
+        self.etl_logger.log_etl_start("VALIDACIONES", "Validando calidad de datos en staging")
+        
+        self._buffer_activo = True
+        self._huellas = {}
+        self.validaciones_cacheadas = 0
+        
+        if Config.VALIDATION_CACHE:
+            self._cargar_cache_validaciones()
+    
+    def ejecutar_validacion(self, clave: str, tablas: List[str],
+                            validacion: Callable[[], bool]) -> bool:
+        """
+        Ejecuta una validación de definir_validaciones_staging dentro de la fase
+        
+        Puede llamarse desde varios hilos entre iniciar_validaciones y
+        finalizar_validaciones (planificador DAG).
+        
+        Args:
+            clave: Clave de la validación
+            tablas: Tablas que lee la validación
+            validacion: Función que ejecuta la validación
+            
+        Returns:
+            Resultado de la validación
+        """
+        return self._ejecutar_con_cache(clave, tablas, validacion)
+    
+    def _cerrar_fase_validaciones(self) -> None:
+        """Vacía el buffer de auditoría y guarda la caché de resultados"""
+        self._buffer_activo = False
+        self.vaciar_buffer_auditoria()
+        self._guardar_cache_validaciones()
+        self._cache = None
+    
+    def finalizar_validaciones(self, resultados: Dict[str, bool]) -> Dict[str, bool]:
+        """
+        Cierra la fase de validaciones y registra el resumen
+        
+        Args:
+            resultados: Resultado por clave de validación
+            
+        Returns:
+            Los mismos resultados
+        """
+        self._cerrar_fase_validaciones()
+        
+        total_validaciones = len(resultados)
+        validaciones_exitosas = sum(resultados.values())
+        tasa_exito = (validaciones_exitosas / total_validaciones * 100) if total_validaciones > 0 else 0
+        
+        self.etl_logger.log_etl_end("VALIDACIONES", exito=True, detalles={
+            'Total validaciones': total_validaciones,
+            'Exitosas': validaciones_exitosas,
+            'Fallidas': total_validaciones - validaciones_exitosas,
+            'Tasa de éxito': f"{tasa_exito:.1f}%",
+            'Reutilizadas de caché': self.validaciones_cacheadas
+        })
+        
+        return resultados
+    
+    @staticmethod
+    def crear_validador_stream() -> StreamValidator:
+        """
+        Crea el validador en flujo con los mismos checks que ejecutar_validaciones_staging
+        
+        Se conecta al extractor (SakilaExtractor.extraer_todas_las_tablas)
+        para que la validación PRE se calcule sobre los lotes extraídos.
+        Solo es equivalente a la validación sobre staging en extracción
+        completa: en incremental las tablas padre no se releen enteras.
+        
+        Returns:
+            StreamValidator configurado
+        """
+        return StreamValidator([
+            DuplicateCheck('rental_no_dup', 'stg_rental', ['rental_id']),
+            NullCheck('rental_no_null', 'stg_rental',
+                      ['rental_id', 'rental_date', 'inventory_id', 'customer_id']),
+            DuplicateCheck('payment_no_dup', 'stg_payment', ['payment_id']),
+            NullCheck('payment_no_null', 'stg_payment',
+                      ['payment_id', 'customer_id', 'amount', 'payment_date']),
+            RangeCheck('payment_montos', 'stg_payment', 'amount', min_val=0, max_val=100),
+            DuplicateCheck('film_no_dup', 'stg_film', ['film_id']),
+            RangeCheck('film_rates', 'stg_film', 'rental_rate', min_val=0, max_val=10),
+            ForeignKeyCheck('rental_inventory_fk', 'stg_rental', 'inventory_id',
+                            'stg_inventory', 'inventory_id'),
+            ForeignKeyCheck('inventory_film_fk', 'stg_inventory', 'film_id',
+                            'stg_film', 'film_id'),
+            ForeignKeyCheck('store_address_fk', 'stg_store', 'address_id',
+                            'stg_address', 'address_id'),
+        ])
+    
+    def ejecutar_validaciones_stream(self, validador_stream: StreamValidator) -> Dict[str, bool]:
+        """
+        Registra en audit_calidad los resultados acumulados durante la extracción
+        
+        Evalúa los contadores del validador en flujo y escribe el buffer de
+        auditoría. Solo consulta staging para confirmar con el conteo exacto
+        (validar_no_duplicados) las tablas cuyos duplicados estimados por
+        HLL superan la cota de error del estimador.
+        
+        Args:
+            validador_stream: Validador alimentado por el extractor
+            
+        Returns:
+            Diccionario con resultados de validaciones
+        """
+        self.etl_logger.log_etl_start("VALIDACIONES", "Evaluando validaciones en flujo de la extracción")
+        
+        resultados = {}
+        self._buffer_activo = True
+        exactos = {}
+        for check in validador_stream.checks:
+            if isinstance(check, DuplicateCheck):
+                duplicados, cota = check.estimar()
+                if duplicados > cota:
+                    exactos[check.clave] = check
+        
+        try:
+            for clave, registros in validador_stream.finalizar().items():
+                if clave in exactos:
+                    check = exactos[clave]
+                    self.logger.info(f"🔎 {check.tabla}: duplicados estimados {registros[0]['valor_obtenido']}, "
+                                   f"se cuentan sobre staging")
+                    resultados[clave] = self.validar_no_duplicados(check.tabla, check.columnas_pk)
+                    continue
+                for registro in registros:
+                    self.etl_logger.log_validation(
+                        f"{registro['validacion']} ({registro['tabla_origen']})",
+                        registro['resultado'] == 'PASS',
+                        registro['mensaje']
+                    )
+                    self.registrar_validacion(**registro)
+                resultados[clave] = all(r['resultado'] == 'PASS' for r in registros)
+        finally:
+            self._buffer_activo = False
+            self.vaciar_buffer_auditoria()
         
         total_validaciones = len(resultados)
         validaciones_exitosas = sum(resultados.values())
-        tasa_exito = (validaciones_exitosas / total_validaciones * 100)
+        tasa_exito = (validaciones_exitosas / total_validaciones * 100) if total_validaciones > 0 else 0
         
         self.etl_logger.log_etl_end("VALIDACIONES", exito=True, detalles={
             'Total validaciones': total_validaciones,
             'Exitosas': validaciones_exitosas,
             'Fallidas': total_validaciones - validaciones_exitosas,
-            'Tasa de éxito': f"{tasa_exito:.1f}%"
+            'Tasa de éxito': f"{tasa_exito:.1f}%",
+            'Lotes procesados': validador_stream.lotes_procesados
         })
         
         return resultados
     
     def cerrar_conexion(self):
         """Cierra conexión a staging"""
+        self.vaciar_buffer_auditoria()
         self.engine_staging.dispose()
+        if self.engine_dm is not None:
+            self.engine_dm.dispose()
         self.logger.info("🔌 Conexión cerrada")
\ No newline at end of file
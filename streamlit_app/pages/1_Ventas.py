@@ -44,7 +44,8 @@ with st.sidebar:
 # Cargar datos
 with st.spinner("📊 Cargando datos de ventas..."):
     df_ventas_mensuales = db.execute_query(Queries.VENTAS_MENSUALES_TIENDA)
-    df_ventas_periodo = db.execute_query(Queries.VENTAS_POR_PERIODO)
+    df_ventas_periodo = db.execute_query(Queries.ventas_por_periodo(
+        filters.get('fecha_inicio'), filters.get('fecha_fin')))
     df_ventas_tienda = db.execute_query(Queries.VENTAS_POR_TIENDA)
     df_ventas_categoria = db.execute_query(Queries.VENTAS_POR_CATEGORIA)
 
@@ -1,6 +1,7 @@
 """
 Queries SQL predefinidas para el dashboard
-Aprovecha las vistas analíticas ya creadas en sakila_dw
+Aprovecha las vistas analíticas y los agregados (agg_*) de sakila_dw;
+solo las consultas a nivel de día leen fact_ventas
 """
 
 class Queries:
@@ -14,13 +15,14 @@ class Queries:
     
     KPI_TOTALES = """
         SELECT 
-            SUM(cantidad_rentas) as total_rentas,
-            SUM(monto_total) as total_ventas,
-            AVG(monto_promedio) as ticket_promedio,
-            AVG(dias_renta_promedio) as dias_promedio_renta,
-            COUNT(DISTINCT film_sk) as total_peliculas_rentadas,
-            COUNT(DISTINCT tienda_sk) as total_tiendas
-        FROM fact_ventas
+            total_rentas,
+            total_ventas,
+            suma_monto_promedio / filas_fact as ticket_promedio,
+            suma_dias_promedio / filas_fact as dias_promedio_renta,
+            total_peliculas_rentadas,
+            total_tiendas
+        FROM agg_kpi_global
+        WHERE id = 1
     """
     
     # ========== VENTAS ==========
@@ -35,27 +37,66 @@ class Queries:
             dt.anio,
             dt.mes,
             dt.mes_nombre,
-            SUM(fv.cantidad_rentas) as total_rentas,
-            SUM(fv.monto_total) as total_ventas,
-            AVG(fv.monto_promedio) as ticket_promedio
-        FROM fact_ventas fv
-        JOIN dim_tiempo dt ON fv.fecha_id = dt.fecha_id
-        GROUP BY dt.anio, dt.mes, dt.mes_nombre
+            a.total_rentas,
+            a.ingresos_totales as total_ventas,
+            a.suma_monto_promedio / a.filas_fact as ticket_promedio
+        FROM agg_kpi_mes a
+        JOIN dim_tiempo dt ON dt.fecha_id = a.anio_mes * 100 + 1
         ORDER BY dt.anio, dt.mes
     """
     
+    @staticmethod
+    def ventas_por_periodo(fecha_inicio=None, fecha_fin=None) -> str:
+        """
+        VENTAS_POR_PERIODO filtrada por rango de fechas
+        
+        El filtro va sobre fv.fecha_id (llave de partición) para que MySQL
+        pode las particiones fuera del rango. Sin filtro se usa el agregado
+        mensual.
+        
+        Args:
+            fecha_inicio: Fecha inicial (date, opcional)
+            fecha_fin: Fecha final (date, opcional)
+        
+        Returns:
+            Query SQL
+        """
+        condiciones = []
+        if fecha_inicio is not None:
+            condiciones.append(f"fv.fecha_id >= {int(fecha_inicio.strftime('%Y%m%d'))}")
+        if fecha_fin is not None:
+            condiciones.append(f"fv.fecha_id <= {int(fecha_fin.strftime('%Y%m%d'))}")
+        
+        if not condiciones:
+            return Queries.VENTAS_POR_PERIODO
+        
+        return f"""
+            SELECT 
+                dt.anio,
+                dt.mes,
+                dt.mes_nombre,
+                SUM(fv.cantidad_rentas) as total_rentas,
+                SUM(fv.monto_total) as total_ventas,
+                AVG(fv.monto_promedio) as ticket_promedio
+            FROM fact_ventas fv
+            JOIN dim_tiempo dt ON fv.fecha_id = dt.fecha_id
+            WHERE {' AND '.join(condiciones)}
+            GROUP BY dt.anio, dt.mes, dt.mes_nombre
+            ORDER BY dt.anio, dt.mes
+        """
+    
     VENTAS_POR_TIENDA = """
         SELECT 
             ds.tienda_sk,
             ds.nombre_tienda,
             ds.ciudad,
             ds.pais,
-            SUM(fv.cantidad_rentas) as total_rentas,
-            SUM(fv.monto_total) as total_ventas,
-            AVG(fv.monto_promedio) as ticket_promedio,
-            AVG(fv.dias_renta_promedio) as dias_promedio
-        FROM fact_ventas fv
-        JOIN dim_tienda ds ON fv.tienda_sk = ds.tienda_sk AND ds.activo = TRUE
+            SUM(a.total_rentas) as total_rentas,
+            SUM(a.ingresos_totales) as total_ventas,
+            SUM(a.suma_monto_promedio) / SUM(a.filas_fact) as ticket_promedio,
+            SUM(a.suma_dias_promedio) / SUM(a.filas_fact) as dias_promedio
+        FROM agg_ventas_mes_tienda a
+        JOIN dim_tienda ds ON a.tienda_sk = ds.tienda_sk
         GROUP BY ds.tienda_sk, ds.nombre_tienda, ds.ciudad, ds.pais
         ORDER BY total_ventas DESC
     """
@@ -67,6 +108,7 @@ class Queries:
         LIMIT 20
     """
     
+    # Ventas de todas las versiones SCD2 de cada película, atributos de la activa
     TOP_PELICULAS = """
         SELECT 
             df.film_sk,
@@ -76,13 +118,20 @@ class Queries:
             df.duracion,
             df.costo_reemplazo,
             df.tarifa_renta,
-            SUM(fv.cantidad_rentas) as total_rentas,
-            SUM(fv.monto_total) as revenue_total,
-            AVG(fv.dias_renta_promedio) as dias_promedio
-        FROM fact_ventas fv
-        JOIN dim_film df ON fv.film_sk = df.film_sk AND df.activo = TRUE
-        GROUP BY df.film_sk, df.film_id, df.titulo, df.clasificacion, 
-                 df.duracion, df.costo_reemplazo, df.tarifa_renta
+            v.total_rentas,
+            v.revenue_total,
+            v.dias_promedio
+        FROM (
+            SELECT 
+                h.film_id,
+                SUM(a.total_rentas) as total_rentas,
+                SUM(a.ingresos_totales) as revenue_total,
+                SUM(a.suma_dias_promedio) / SUM(a.filas_fact) as dias_promedio
+            FROM agg_ventas_film a
+            JOIN dim_film h ON a.film_sk = h.film_sk
+            GROUP BY h.film_id
+        ) v
+        JOIN dim_film df ON df.film_id = v.film_id AND df.activo = TRUE
         ORDER BY total_rentas DESC
         LIMIT 20
     """
@@ -91,12 +140,12 @@ class Queries:
         SELECT 
             df.clasificacion,
             COUNT(DISTINCT df.film_id) as total_peliculas,
-            SUM(fv.cantidad_rentas) as total_rentas,
-            SUM(fv.monto_total) as revenue_total,
-            AVG(df.duracion) as duracion_promedio,
-            AVG(df.tarifa_renta) as tarifa_promedio
-        FROM fact_ventas fv
-        JOIN dim_film df ON fv.film_sk = df.film_sk AND df.activo = TRUE
+            SUM(a.total_rentas) as total_rentas,
+            SUM(a.ingresos_totales) as revenue_total,
+            SUM(df.duracion * a.filas_fact) / SUM(a.filas_fact) as duracion_promedio,
+            SUM(df.tarifa_renta * a.filas_fact) / SUM(a.filas_fact) as tarifa_promedio
+        FROM agg_ventas_film a
+        JOIN dim_film df ON a.film_sk = df.film_sk
         GROUP BY df.clasificacion
         ORDER BY total_rentas DESC
     """
@@ -111,13 +160,14 @@ class Queries:
         SELECT 
             dc.categoria_sk,
             dc.nombre_categoria,
-            COUNT(DISTINCT fv.film_sk) as total_peliculas,
-            SUM(fv.cantidad_rentas) as total_rentas,
-            SUM(fv.monto_total) as revenue_total,
-            AVG(fv.monto_promedio) as ticket_promedio,
-            AVG(fv.dias_renta_promedio) as dias_promedio
-        FROM fact_ventas fv
-        JOIN dim_categoria dc ON fv.categoria_sk = dc.categoria_sk AND dc.activo = TRUE
+            COUNT(DISTINCT df.film_id) as total_peliculas,
+            SUM(a.total_rentas) as total_rentas,
+            SUM(a.ingresos_totales) as revenue_total,
+            SUM(a.suma_monto_promedio) / SUM(a.filas_fact) as ticket_promedio,
+            SUM(a.suma_dias_promedio) / SUM(a.filas_fact) as dias_promedio
+        FROM agg_ventas_film a
+        JOIN dim_categoria dc ON a.categoria_sk = dc.categoria_sk
+        JOIN dim_film df ON a.film_sk = df.film_sk
         GROUP BY dc.categoria_sk, dc.nombre_categoria
         ORDER BY revenue_total DESC
     """
@@ -128,11 +178,11 @@ class Queries:
             dt.mes,
             dt.mes_nombre,
             dc.nombre_categoria,
-            SUM(fv.cantidad_rentas) as total_rentas,
-            SUM(fv.monto_total) as revenue
-        FROM fact_ventas fv
-        JOIN dim_tiempo dt ON fv.fecha_id = dt.fecha_id
-        JOIN dim_categoria dc ON fv.categoria_sk = dc.categoria_sk AND dc.activo = TRUE
+            SUM(a.total_rentas) as total_rentas,
+            SUM(a.ingresos_totales) as revenue
+        FROM agg_ventas_mes_categoria a
+        JOIN dim_tiempo dt ON dt.fecha_id = a.anio_mes * 100 + 1
+        JOIN dim_categoria dc ON a.categoria_sk = dc.categoria_sk
         GROUP BY dt.anio, dt.mes, dt.mes_nombre, dc.nombre_categoria
         ORDER BY dt.anio, dt.mes, dc.nombre_categoria
     """
@@ -144,7 +194,8 @@ class Queries:
             MIN(fecha) as fecha_min,
             MAX(fecha) as fecha_max
         FROM dim_tiempo
-        WHERE fecha_id IN (SELECT DISTINCT fecha_id FROM fact_ventas)
+        WHERE fecha_id IN ((SELECT MIN(fecha_id) FROM fact_ventas),
+                           (SELECT MAX(fecha_id) FROM fact_ventas))
     """
     
     GET_CATEGORIAS = """
@@ -173,14 +224,20 @@ class Queries:
             df.duracion,
             df.tarifa_renta,
             df.costo_reemplazo,
-            COALESCE(SUM(fv.cantidad_rentas), 0) as total_rentas,
-            COALESCE(SUM(fv.monto_total), 0) as revenue_total
+            COALESCE(v.total_rentas, 0) as total_rentas,
+            COALESCE(v.revenue_total, 0) as revenue_total
         FROM dim_film df
-        LEFT JOIN fact_ventas fv ON df.film_sk = fv.film_sk
+        LEFT JOIN (
+            SELECT 
+                h.film_id,
+                SUM(a.total_rentas) as total_rentas,
+                SUM(a.ingresos_totales) as revenue_total
+            FROM agg_ventas_film a
+            JOIN dim_film h ON a.film_sk = h.film_sk
+            GROUP BY h.film_id
+        ) v ON v.film_id = df.film_id
         WHERE df.activo = TRUE 
         AND df.titulo LIKE %s
-        GROUP BY df.film_sk, df.film_id, df.titulo, df.descripcion, 
-                 df.clasificacion, df.duracion, df.tarifa_renta, df.costo_reemplazo
         ORDER BY total_rentas DESC
     """
     
@@ -191,10 +248,10 @@ class Queries:
             df.duracion,
             df.clasificacion,
             df.tarifa_renta,
-            SUM(fv.cantidad_rentas) as total_rentas,
-            SUM(fv.monto_total) as revenue
-        FROM fact_ventas fv
-        JOIN dim_film df ON fv.film_sk = df.film_sk AND df.activo = TRUE
+            SUM(a.total_rentas) as total_rentas,
+            SUM(a.ingresos_totales) as revenue
+        FROM agg_ventas_film a
+        JOIN dim_film df ON a.film_sk = df.film_sk
         GROUP BY df.duracion, df.clasificacion, df.tarifa_renta
         HAVING total_rentas > 0
         ORDER BY duracion
@@ -232,9 +289,9 @@ class Queries:
             fv.dias_renta_promedio
         FROM fact_ventas fv
         JOIN dim_tiempo dt ON fv.fecha_id = dt.fecha_id
-        JOIN dim_film df ON fv.film_sk = df.film_sk AND df.activo = TRUE
-        JOIN dim_categoria dc ON fv.categoria_sk = dc.categoria_sk AND dc.activo = TRUE
-        JOIN dim_tienda ds ON fv.tienda_sk = ds.tienda_sk AND ds.activo = TRUE
+        JOIN dim_film df ON fv.film_sk = df.film_sk
+        JOIN dim_categoria dc ON fv.categoria_sk = dc.categoria_sk
+        JOIN dim_tienda ds ON fv.tienda_sk = ds.tienda_sk
         ORDER BY dt.fecha DESC
         LIMIT 1000
     """
\ No newline at end of file